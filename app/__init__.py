@@ -3,44 +3,120 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from .compression import Compression
 from .config import Config
+from .database import DatabasePool
+from .autocomplete import CatalogAutocomplete
+from .cache import CatalogCache, DiagramCache, IdentityCache
+from .instrumentation import DBInstrumentation
+from .jobs import JobQueue
+from .logs import StructuredLogging
+from .metrics import Metrics
+from .passwords import LoginThrottle, PasswordHasher
+from .push import DiagramPush
+from .thumbnails import ThumbnailStore
 
 db = SQLAlchemy()
+db_pool = DatabasePool()
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
+catalog_cache = CatalogCache()
+catalog_autocomplete = CatalogAutocomplete()
+identity_cache = IdentityCache()
+diagram_cache = DiagramCache()
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
+thumbnail_store = ThumbnailStore()
+diagram_push = DiagramPush()
+job_queue = JobQueue()
+compression = Compression()
+metrics = Metrics()
+db_instrumentation = DBInstrumentation()
+structured_logging = StructuredLogging()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config:
+        # Before any extension reads it (engines are built in db.init_app)
+        app.config.update(config)
 
     # Initialize extensions
+    metrics.init_app(app)
+    db_pool.init_app(app)  # engine options, so before db
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    catalog_cache.init_app(app)
+    catalog_autocomplete.init_app(app)
+    identity_cache.init_app(app)
+    diagram_cache.init_app(app)
+    password_hasher.init_app(app)
+    login_throttle.init_app(app)
+    thumbnail_store.init_app(app)
+    diagram_push.init_app(app)
+    job_queue.init_app(app)
+    compression.init_app(app)
+    db_instrumentation.init_app(app)
+    structured_logging.init_app(app)
 
     from app.controllers.super_admin import super_admin_bp
     app.register_blueprint(super_admin_bp)
     
     from app.controllers.auth import auth_bp
     app.register_blueprint(auth_bp)
+
+    from app.controllers.api import api_bp
+    app.register_blueprint(api_bp)
+
+    from app.controllers.diagrams import diagrams_bp
+    app.register_blueprint(diagrams_bp)
+
+    from app.controllers.thumbnails import thumbnails_bp
+    app.register_blueprint(thumbnails_bp)
+
+    from app.controllers.ops import ops_bp
+    app.register_blueprint(ops_bp)
+
+    from app.controllers.jobs import jobs_bp
+    app.register_blueprint(jobs_bp)
+
+    from app.cli import catalog_cli, frontend_cli, history_cli, jobs_cli
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(frontend_cli)
+    app.cli.add_command(history_cli)
+    app.cli.add_command(jobs_cli)
     
     from app.models.master import DeviceType
-    # Temporary test route (returns 200 instead of 404)
-    @app.route('/')
-    def hello():
-        return "<h1>Hello from Flask! Sprint 0 complete.</h1>"
+    if app.config.get('FRONTEND_DIST'):
+        # Production: the built app, so no Vite server is needed (its routes come last)
+        from app.controllers.frontend import frontend_bp
+        app.register_blueprint(frontend_bp)
+    else:
+        # Temporary test route (returns 200 instead of 404)
+        @app.route('/')
+        def hello():
+            return "<h1>Hello from Flask! Sprint 0 complete.</h1>"
 
     # Register blueprints (we'll add them soon)
     # from .controllers.auth import auth_bp
     # app.register_blueprint(auth_bp)
 
     # Lazy load user_loader (avoids circular import)
-    from app.models.user import User
+    from app.models.user import UserIdentity
 
     @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    def load_user(session_id):
+        # "<id>:<session token>"; sessions from before a password change are rejected
+        user_id, _, token = session_id.partition(':')
+        try:
+            identity = identity_cache.get_or_load(int(user_id), UserIdentity.load)
+        except ValueError:
+            return None
+        if identity is None or token != identity.session_token:
+            return None
+        return identity
 
     return app
 
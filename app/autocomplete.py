@@ -0,0 +1,203 @@
+# app/autocomplete.py
+"""In-memory prefix index over catalog names for palette autocomplete.
+
+``PrefixIndex`` keeps a sorted list of ``(token, catalog, id)`` entries, where
+the tokens of a name are the name itself and every suffix starting at a word
+boundary ("atem constellation 2 m/e", "constellation 2 m/e", "2 m/e", "m/e").
+A lookup is a ``bisect`` to the first entry with the prefix and a bounded scan.
+
+``CatalogAutocomplete`` is the Flask extension holding one index per process.
+When the shared catalog version moves (see app/cache.py) it fetches only the
+rows whose ``updated_at`` moved, and reloads a catalog wholesale only when its
+row count or id checksum shows rows were deleted.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from heapq import merge
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+_EPOCH = datetime(1970, 1, 1)
+_WORD_START = re.compile(r'(?:^|(?<=[\s\-_/(),.]))(?=\w)')
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def name_tokens(name):
+    """The whole normalized name plus each suffix that starts a word."""
+    norm = normalize(name)
+    return {norm[m.start():] for m in _WORD_START.finditer(norm)} | {norm}
+
+
+class PrefixIndex:
+    """Sorted token list with bisect lookups; guarded by a lock for updates."""
+
+    def __init__(self):
+        self._entries = []  # sorted (token, catalog, id)
+        self._rows = {}     # (catalog, id) -> name
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def upsert(self, catalog, rows):
+        """Add or rename ``(id, name)`` rows of one catalog.
+
+        The new entries are sorted and merged into the list in one pass, so
+        a refresh touching many rows costs no more than a full rebuild.
+        """
+        with self._lock:
+            stale, added = set(), []
+            for row_id, name in rows:
+                key = (catalog, row_id)
+                old = self._rows.get(key)
+                if old == name:
+                    continue
+                if old is not None:
+                    stale.update((token, *key) for token in name_tokens(old))
+                self._rows[key] = name
+                added.extend((token, *key) for token in name_tokens(name))
+            if not added:
+                return
+            kept = [e for e in self._entries if e not in stale] if stale else self._entries
+            added.sort()
+            self._entries = list(merge(kept, added))
+
+    def replace(self, catalog, rows):
+        """Swap in the complete row set of one catalog with a single sort."""
+        with self._lock:
+            self._entries = [e for e in self._entries if e[1] != catalog]
+            self._rows = {k: v for k, v in self._rows.items() if k[0] != catalog}
+            for row_id, name in rows:
+                self._rows[catalog, row_id] = name
+                self._entries.extend((token, catalog, row_id) for token in name_tokens(name))
+            self._entries.sort()
+
+    def checksum(self, catalog):
+        """``(count, sum of ids)`` of the rows held for ``catalog``."""
+        ids = [row_id for c, row_id in self._rows if c == catalog]
+        return len(ids), sum(ids)
+
+    def search(self, prefix, limit, scan_limit=1000, catalogs=None):
+        """Up to ``limit`` rows whose name or a word in it starts with ``prefix``.
+
+        Ranked by whole-name match first, then shorter names, then name.
+        At most ``scan_limit`` index entries are inspected.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        best = {}
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (prefix,))
+            end = min(len(entries), i + scan_limit)
+            while i < end and entries[i][0].startswith(prefix):
+                token, catalog, row_id = entries[i]
+                i += 1
+                if catalogs and catalog not in catalogs:
+                    continue
+                name = self._rows[catalog, row_id]
+                rank = (0 if token == normalize(name) else 1, len(name), name.lower())
+                key = (catalog, row_id)
+                if key not in best or rank < best[key][0]:
+                    best[key] = (rank, name)
+        ranked = sorted(best.items(), key=lambda item: item[1][0])[:limit]
+        return [{'catalog': catalog, 'id': row_id, 'name': name}
+                for (catalog, row_id), (_, name) in ranked]
+
+
+class _AutocompleteState:
+    def __init__(self, skew):
+        self.index = PrefixIndex()
+        self.version = None
+        self.synced = {}  # catalog slug -> newest updated_at applied
+        self.skew = skew
+        self.refresh_lock = threading.Lock()
+        self.full_reloads = 0
+        self.incremental_refreshes = 0
+
+
+class CatalogAutocomplete:
+    """Flask extension serving prefix autocomplete from a per-process index."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTOCOMPLETE_MAX_RESULTS', 25)
+        app.config.setdefault('AUTOCOMPLETE_SCAN_LIMIT', 1000)
+        # Rows are re-read from this far before the newest updated_at seen, to
+        # cover app servers whose clocks disagree.
+        app.config.setdefault('AUTOCOMPLETE_CLOCK_SKEW', 300)
+        app.extensions['catalog_autocomplete'] = _AutocompleteState(
+            skew=timedelta(seconds=app.config['AUTOCOMPLETE_CLOCK_SKEW']),
+        )
+
+    @property
+    def _state(self):
+        return current_app.extensions['catalog_autocomplete']
+
+    def _refresh_catalog(self, state, slug, model):
+        from app import db
+
+        table = model.__table__
+        since = state.synced.get(slug)
+        if since is None:
+            rows = db.session.execute(select(table.c.id, table.c.name, table.c.updated_at)).all()
+            state.index.replace(slug, [(r.id, r.name) for r in rows])
+            state.full_reloads += 1
+        else:
+            rows = db.session.execute(
+                select(table.c.id, table.c.name, table.c.updated_at)
+                .where(table.c.updated_at >= since - state.skew)).all()
+            state.index.upsert(slug, [(r.id, r.name) for r in rows])
+            count, id_sum = db.session.execute(
+                select(func.count(table.c.id), func.coalesce(func.sum(table.c.id), 0))).one()
+            if (count, id_sum) != state.index.checksum(slug):
+                # Deletions leave no updated_at behind; reload this catalog.
+                state.synced.pop(slug)
+                return self._refresh_catalog(state, slug, model)
+            state.incremental_refreshes += 1
+        stamps = [r.updated_at for r in rows if r.updated_at] + ([since] if since else [])
+        state.synced[slug] = max(stamps, default=_EPOCH)
+
+    def sync(self):
+        """Bring the index up to the current catalog version."""
+        from app import catalog_cache
+        from app.services.catalog import CATALOGS
+
+        state = self._state
+        version = catalog_cache.version()
+        if state.version == version and state.synced:
+            return
+        with state.refresh_lock:
+            if state.version == version and state.synced:
+                return
+            for slug, model in CATALOGS.items():
+                self._refresh_catalog(state, slug, model)
+            state.version = version
+
+    def search(self, prefix, limit=None, catalogs=None):
+        config = current_app.config
+        cap = config['AUTOCOMPLETE_MAX_RESULTS']
+        limit = cap if limit is None else max(1, min(limit, cap))
+        self.sync()
+        return self._state.index.search(prefix, limit, scan_limit=config['AUTOCOMPLETE_SCAN_LIMIT'],
+                                        catalogs=catalogs)
+
+    def stats(self):
+        state = self._state
+        return {
+            'rows': len(state.index),
+            'version': state.version,
+            'full_reloads': state.full_reloads,
+            'incremental_refreshes': state.incremental_refreshes,
+        }
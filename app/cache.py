@@ -0,0 +1,379 @@
+# app/cache.py
+"""In-process caches that live alongside the Flask app.
+
+``TTLCache`` is a small thread-safe LRU with expiry. ``CatalogCache`` is a Flask
+extension built on it for the master catalog tables: entries are dropped when a
+catalog write commits in this process (SQLAlchemy session events) and when the
+shared ``catalog_version`` row moves, which is how other workers find out.
+``IdentityCache`` keeps the compact user records Flask-Login loads on every
+request; it is invalidated the same way locally and relies on a short TTL
+across workers. ``DiagramCache`` holds per-version diagram indexes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect as sa_inspect, select
+from sqlalchemy.orm import Session
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize=256, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+class _CatalogStore:
+    """Per-app cache state kept in ``app.extensions['catalog_cache']``."""
+
+    def __init__(self, maxsize, ttl, poll_interval):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.poll_interval = poll_interval
+        self.version = None
+        self.last_poll = 0.0
+        self.generation = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def invalidate(self, version=None):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+            if version is not None:
+                self.version = version
+
+
+def _catalog_models():
+    from app.models.master import DeviceModel, DeviceType, Manufacturer
+    return (DeviceModel, DeviceType, Manufacturer)
+
+
+def _bump_version(connection):
+    """Increment the shared catalog version inside the caller's transaction."""
+    from sqlalchemy.dialects.postgresql import insert
+    from app.models.master import CatalogVersion
+
+    table = CatalogVersion.__table__
+    stmt = insert(table).values(id=1, version=1).on_conflict_do_update(
+        index_elements=['id'], set_={'version': table.c.version + 1}
+    ).returning(table.c.version)
+    return connection.execute(stmt).scalar()
+
+
+def mark_catalog_changed(session):
+    """Record a catalog write on ``session``; the cache is dropped when it commits.
+
+    The version row is bumped once per transaction so other workers notice the
+    change on their next poll.
+    """
+    if 'catalog_version' not in session.info:
+        session.info['catalog_version'] = _bump_version(session.connection())
+
+
+def _after_flush(session, flush_context):
+    models = _catalog_models()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models):
+            mark_catalog_changed(session)
+            return
+
+
+def _do_orm_execute(orm_execute_state):
+    # Bulk statements such as insert(DeviceType) or
+    # DeviceType.query.delete() never reach after_flush.
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update
+            or orm_execute_state.is_delete):
+        return
+    models = _catalog_models()
+    if any(m.class_ in models for m in orm_execute_state.all_mappers):
+        mark_catalog_changed(orm_execute_state.session)
+
+
+def _after_commit(session):
+    version = session.info.pop('catalog_version', None)
+    if version is not None and has_app_context():
+        store = current_app.extensions.get('catalog_cache')
+        if store is not None:
+            store.invalidate(version)
+
+
+def _after_rollback(session):
+    session.info.pop('catalog_version', None)
+
+
+def _identity_after_flush(session, flush_context):
+    from app.models.user import User
+
+    for obj in (*session.dirty, *session.deleted):
+        if not isinstance(obj, User):
+            continue
+        attrs = sa_inspect(obj).attrs
+        if (obj in session.deleted or attrs.role.history.has_changes()
+                or attrs.session_token.history.has_changes()):
+            session.info.setdefault('identity_ids', set()).add(obj.id)
+
+
+def _identity_do_orm_execute(orm_execute_state):
+    from app.models.user import User
+
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if any(m.class_ is User for m in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['identity_clear'] = True
+
+
+def _identity_after_commit(session):
+    ids = session.info.pop('identity_ids', None)
+    clear = session.info.pop('identity_clear', False)
+    if not (ids or clear) or not has_app_context():
+        return
+    cache = current_app.extensions.get('identity_cache')
+    if cache is None:
+        return
+    if clear:
+        cache.clear()
+    else:
+        for user_id in ids:
+            cache.pop(user_id)
+
+
+def _identity_after_rollback(session):
+    session.info.pop('identity_ids', None)
+    session.info.pop('identity_clear', None)
+
+
+def _register_session_events():
+    for name, fn in (('after_flush', _after_flush),
+                     ('do_orm_execute', _do_orm_execute),
+                     ('after_commit', _after_commit),
+                     ('after_rollback', _after_rollback),
+                     ('after_flush', _identity_after_flush),
+                     ('do_orm_execute', _identity_do_orm_execute),
+                     ('after_commit', _identity_after_commit),
+                     ('after_rollback', _identity_after_rollback)):
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
+
+
+class CatalogCache:
+    """Process-local cache for catalog reads with write-through invalidation."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_CACHE_MAX_ENTRIES', 512)
+        app.config.setdefault('CATALOG_CACHE_TTL', 300)
+        app.config.setdefault('CATALOG_CACHE_POLL_INTERVAL', 2.0)
+        app.extensions['catalog_cache'] = _CatalogStore(
+            maxsize=app.config['CATALOG_CACHE_MAX_ENTRIES'],
+            ttl=app.config['CATALOG_CACHE_TTL'],
+            poll_interval=app.config['CATALOG_CACHE_POLL_INTERVAL'],
+        )
+        _register_session_events()
+
+    @property
+    def _store(self):
+        return current_app.extensions['catalog_cache']
+
+    def _poll_version(self, store):
+        """Drop local entries if another worker bumped the catalog version."""
+        now = time.monotonic()
+        if now - store.last_poll < store.poll_interval:
+            return
+        from app import db
+        from app.models.master import CatalogVersion
+
+        version = db.session.execute(
+            select(CatalogVersion.version).where(CatalogVersion.id == 1)
+        ).scalar() or 0
+        store.last_poll = now
+        if version != store.version:
+            store.invalidate(version)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        Loaders must return plain data (dicts, tuples), never ORM instances,
+        since entries outlive the session that produced them.
+        """
+        store = self._store
+        self._poll_version(store)
+        value = store.entries.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = store.generation
+        value = loader()
+        # Skip the store if a commit invalidated the cache while we were loading.
+        if generation == store.generation:
+            store.entries.set(key, value)
+        return value
+
+    def invalidate(self):
+        self._store.invalidate()
+
+    def version(self):
+        """The catalog version this process has seen (polled like ``get_or_load``)."""
+        store = self._store
+        self._poll_version(store)
+        return store.version
+
+    def stats(self):
+        store = self._store
+        stats = store.entries.stats()
+        stats.update(version=store.version, invalidations=store.invalidations)
+        return stats
+
+
+class IdentityCache:
+    """Short-lived cache of compact user identities keyed by user id."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', 4096)
+        app.config.setdefault('IDENTITY_CACHE_TTL', 30)
+        app.extensions['identity_cache'] = TTLCache(
+            maxsize=app.config['IDENTITY_CACHE_MAX_ENTRIES'],
+            ttl=app.config['IDENTITY_CACHE_TTL'],
+        )
+        _register_session_events()
+
+    @property
+    def _entries(self):
+        return current_app.extensions['identity_cache']
+
+    def get_or_load(self, user_id, loader):
+        """Cached identity for ``user_id``; ``loader(user_id)`` on a miss.
+
+        Unknown users (loader returns None) are not cached.
+        """
+        entries = self._entries
+        identity = entries.get(user_id)
+        if identity is None:
+            identity = loader(user_id)
+            if identity is not None:
+                entries.set(user_id, identity)
+        return identity
+
+    def discard(self, user_id):
+        self._entries.pop(user_id)
+
+    def stats(self):
+        return self._entries.stats()
+
+
+class _DiagramStore:
+    def __init__(self, entries):
+        self.entries = entries
+        self.catalog_version = None
+
+
+class DiagramCache:
+    """Structures derived from one diagram version (indexes, graphs).
+
+    Keys include the diagram version, and a version's contents only change
+    when a device model's pin template does, so the whole cache is dropped
+    when the catalog version moves; otherwise the TTL and LRU bound only
+    limit memory.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DIAGRAM_CACHE_MAX_ENTRIES', 64)
+        app.config.setdefault('DIAGRAM_CACHE_TTL', 600)
+        app.extensions['diagram_cache'] = _DiagramStore(TTLCache(
+            maxsize=app.config['DIAGRAM_CACHE_MAX_ENTRIES'],
+            ttl=app.config['DIAGRAM_CACHE_TTL'],
+        ))
+
+    @property
+    def _entries(self):
+        from app import catalog_cache
+
+        store = current_app.extensions['diagram_cache']
+        version = catalog_cache.version()
+        if store.catalog_version != version:
+            store.entries.clear()
+            store.catalog_version = version
+        return store.entries
+
+    def get_or_load(self, key, loader):
+        """Cached value for ``key`` (``(kind, diagram_id, version)``), else ``loader()``."""
+        entries = self._entries
+        value = entries.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            entries.set(key, value)
+        return value
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value):
+        self._entries.set(key, value)
+
+    def stats(self):
+        return self._entries.stats()
@@ -0,0 +1,95 @@
+# app/cli.py
+"""``flask`` CLI commands."""
+
+import gzip
+import json
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.services.catalog import CATALOGS
+from app.services.catalog_import import (
+    DEFAULT_CHUNK_SIZE, FORMATS, UnreadableUpload, detect_format, import_catalog, open_text,
+)
+
+catalog_cli = AppGroup('catalog', help='Master catalog maintenance.')
+frontend_cli = AppGroup('frontend', help='Built frontend assets.')
+history_cli = AppGroup('history', help='Diagram history maintenance.')
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+
+@catalog_cli.command('import')
+@click.argument('catalog', type=click.Choice(sorted(CATALOGS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Input format (default: from the file extension).')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Rows per upsert statement / transaction.')
+def import_command(catalog, path, fmt, chunk_size):
+    """Stream a CSV or NDJSON file into CATALOG, upserting on name."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot guess the format; pass --format.')
+
+    try:
+        if path == '-':
+            report = import_catalog(CATALOGS[catalog], open_text(sys.stdin.buffer), fmt, chunk_size)
+        else:
+            with open(path, 'rb') as f:
+                report = import_catalog(CATALOGS[catalog], open_text(f), fmt, chunk_size)
+    except UnreadableUpload as e:
+        click.echo(json.dumps(e.report.to_dict(), indent=2))
+        raise click.ClickException(str(e))
+
+    click.echo(json.dumps(report.to_dict(), indent=2))
+    if report.failed:
+        raise SystemExit(1)
+
+
+@history_cli.command('prune')
+@click.option('--older-than', 'days', required=True, type=click.IntRange(min=0),
+              help='Keep history from the newest snapshot older than this many days on.')
+@click.option('--archive', type=click.Path(dir_okay=False, writable=True),
+              help='Append the deleted rows to this JSON lines file first (.gz to compress).')
+def prune_command(days, archive):
+    """Delete diagram history that no longer needs to be rebuildable."""
+    from app.services.history import prune_history
+
+    before = datetime.utcnow() - timedelta(days=days)
+    if archive is None:
+        counts = prune_history(before)
+    else:
+        opener = gzip.open if archive.endswith('.gz') else open
+        with opener(archive, 'at') as f:
+            counts = prune_history(before, archive=f)
+    click.echo(json.dumps(counts, indent=2))
+
+
+@jobs_cli.command('worker')
+@click.option('--processes', type=click.IntRange(min=1),
+              help='Forked worker processes, for CPU-bound jobs (default: JOBS_PROCESSES).')
+@click.option('--threads', type=click.IntRange(min=1),
+              help='Worker threads per process (default: JOBS_THREADS).')
+def worker_command(processes, threads):
+    """Run queued background jobs until SIGTERM; jobs in progress are finished first."""
+    from app.jobs import run_workers
+
+    app = current_app._get_current_object()
+    run_workers(app, processes or app.config['JOBS_PROCESSES'], threads or app.config['JOBS_THREADS'])
+
+
+@frontend_cli.command('compress')
+@click.option('--dist', type=click.Path(exists=True, file_okay=False),
+              help='Build output to compress (default: FRONTEND_DIST).')
+def compress_command(dist):
+    """Write .br / .gz siblings of the built assets, once, at maximum compression."""
+    from app.compression import precompress_tree
+
+    dist = dist or current_app.config['FRONTEND_DIST']
+    if not dist:
+        raise click.UsageError('Pass --dist or set FRONTEND_DIST.')
+    written = precompress_tree(dist, current_app.config['COMPRESS_MIN_BYTES'])
+    click.echo(f'{len(written)} compressed files written under {dist}')
@@ -0,0 +1,243 @@
+# app/compression.py
+"""gzip / Brotli response compression, and files served with pre-compressed siblings.
+
+Responses built in memory (JSON, HTML, CSV) are compressed in ``after_request``
+when the client accepts it, the type is in ``COMPRESS_MIMETYPES`` and the body
+is at least ``COMPRESS_MIN_BYTES``. Brotli is preferred over gzip at equal
+client preference, at a fast quality (``COMPRESS_BR_QUALITY``) since the work
+is repeated per request. Streamed bodies (diagram documents, generated CSV)
+are compressed chunk by chunk as they are sent, never buffered whole; their
+size is unknown, so the threshold does not apply. Server-sent events and file
+responses are left alone: an event must reach the client as soon as it is
+written, and files are better compressed once, ahead of time.
+
+``send_precompressed`` serves a file from disk, or its ``.br`` / ``.gz``
+sibling when one exists and the client accepts it, still through
+``send_file`` (sendfile(2), ranges, conditional requests). The siblings are
+written by ``flask frontend compress`` at maximum quality at build time.
+Flask's ``/static`` route uses it too.
+
+A compressed body is a different representation, so a strong ETag gets a
+``-br`` / ``-gzip`` suffix. The suffix is dropped from ``If-None-Match``
+before the view sees it, so a view compares the ETag it computes as usual
+and its 304 echoes the tag the client holds. (``If-Match`` checks already
+accept ``<etag>-<anything>``, see app/controllers/diagrams.py.)
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import zlib
+
+from flask import current_app, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+log = logging.getLogger('app.compression')
+
+# Preferred first when the client rates them equally.
+ENCODINGS = ('br', 'gzip')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/manifest+json', 'application/xml', 'image/svg+xml',
+)
+
+
+def available_encodings():
+    return ENCODINGS if brotli is not None else tuple(e for e in ENCODINGS if e != 'br')
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_stream(chunks, encoding, level, state):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip framing
+        process, finish = compressor.compress, compressor.flush
+    size_in = size_out = 0
+    for chunk in chunks:
+        size_in += len(chunk)
+        data = process(chunk)
+        if data:
+            size_out += len(data)
+            yield data
+    data = finish()
+    size_out += len(data)
+    yield data
+    state.bytes_in.inc(amount=size_in)
+    state.bytes_out.inc(amount=size_out)
+
+
+def negotiate(offered):
+    """The best of ``offered`` encodings that the request accepts, or None."""
+    return request.accept_encodings.best_match(offered) if offered else None
+
+
+def _strip_suffixes():
+    # Before anything reads request.if_none_match, which is cached from the environ.
+    header = request.environ.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return
+    tags = [tag.strip() for tag in header.split(',')]
+    stripped = [tag[:-len(f'-{e}"')] + '"' for tag in tags for e in ENCODINGS
+                if tag.endswith(f'-{e}"') and not tag.startswith('W/')]
+    if stripped:
+        request.environ['HTTP_IF_NONE_MATCH'] = ', '.join(tags + stripped)
+
+
+def _tag_representation(response, encoding):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def _compress_response(response):
+    state = current_app.extensions['compression']
+    config = current_app.config
+    if response.status_code == 304:
+        # Echo the tag the client validated: its stored copy is the compressed one.
+        etag, weak = response.get_etag()
+        encoding = negotiate(state.encodings)
+        if etag and not weak and encoding and request.if_none_match.contains(f'{etag}-{encoding}'):
+            _tag_representation(response, encoding)
+        return response
+    if (response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES'] or response.mimetype == 'text/event-stream'
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+    _add_vary(response)
+    encoding = negotiate(state.encodings)
+    if encoding is None or not 200 <= response.status_code < 300 or response.status_code in (204, 206):
+        return response
+    level = config['COMPRESS_BR_QUALITY'] if encoding == 'br' else config['COMPRESS_GZIP_LEVEL']
+    if response.is_streamed:
+        # Still closing the original body (e.g. ending a stream_with_context), even if never read
+        close = getattr(response.response, 'close', None)
+        response.response = ClosingIterator(_compress_stream(response.iter_encoded(), encoding, level, state),
+                                            [close] if close else None)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        _tag_representation(response, encoding)
+        state.responses.inc(encoding)
+        return response
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_BYTES']:
+        return response
+    body = compress(data, encoding, level)
+    if len(body) >= len(data):
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    _tag_representation(response, encoding)
+    state.responses.inc(encoding)
+    state.bytes_in.inc(amount=len(data))
+    state.bytes_out.inc(amount=len(body))
+    return response
+
+
+def send_precompressed(directory, filename, **options):
+    """``send_file`` of ``directory/filename``, or of its accepted ``.br`` / ``.gz`` sibling."""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    offered = [e for e in available_encodings() if os.path.isfile(path + SUFFIXES[e])]
+    encoding = negotiate(offered)
+    response = send_file(path + SUFFIXES[encoding] if encoding else path, mimetype=mimetype,
+                         conditional=True, **options)
+    if offered:
+        _add_vary(response)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def precompress_file(path, min_bytes=0):
+    """Write ``path``'s ``.br`` / ``.gz`` siblings if missing or stale; return the ones written.
+
+    A sibling that would not be smaller is not kept.
+    """
+    mimetype = mimetypes.guess_type(path)[0]
+    if mimetype not in MIMETYPES or os.path.getsize(path) < min_bytes:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    for encoding in available_encodings():
+        target = path + SUFFIXES[encoding]
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            continue
+        body = compress(data, encoding, 11 if encoding == 'br' else 9)
+        if len(body) >= len(data):
+            continue
+        tmp = f'{target}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, target)
+        written.append(target)
+    return written
+
+
+def precompress_tree(root, min_bytes=0):
+    """Pre-compress every compressible file under ``root``; return the siblings written."""
+    written = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(tuple(SUFFIXES.values())):
+                written += precompress_file(os.path.join(folder, name), min_bytes)
+    return written
+
+
+class _CompressionState:
+    def __init__(self, encodings, registry):
+        self.encodings = encodings
+        self.responses = registry.counter(
+            'http_compressed_responses_total', 'Responses compressed on the fly.', ('encoding',))
+        self.bytes_in = registry.counter(
+            'http_compression_input_bytes_total', 'Bytes of responses compressed on the fly.')
+        self.bytes_out = registry.counter(
+            'http_compression_output_bytes_total', 'Bytes they were compressed to.')
+
+
+class Compression:
+    """Flask extension compressing responses and serving pre-compressed static files."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_BYTES', 1024)  # below this the headers outweigh the gain
+        app.config.setdefault('COMPRESS_MIMETYPES', MIMETYPES)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+        encodings = available_encodings()
+        if brotli is None:
+            log.warning("Brotli is not installed: responses are compressed with gzip only")
+        app.extensions['compression'] = _CompressionState(encodings, app.extensions['metrics'])
+        if not app.config['COMPRESS_ENABLED']:
+            return
+        app.before_request(_strip_suffixes)
+        app.after_request(_compress_response)
+        if app.has_static_folder:
+            # Same route, same caching; a .br / .gz sibling is sent when there is one.
+            app.view_functions['static'] = lambda filename: send_precompressed(app.static_folder, filename)
@@ -0,0 +1,105 @@
+# app/controllers/api.py
+"""Read-only JSON API consumed by the React canvas."""
+
+from flask import Blueprint, abort, jsonify, make_response, request
+from flask_login import login_required
+from app import catalog_autocomplete, catalog_cache
+from app.services.catalog import (
+    CATALOGS, DEFAULT_SEARCH_RESULTS, CatalogQueryError, fetch_page, fingerprint, make_etag,
+    parse_fields, parse_limit, search_catalogs,
+)
+from app.services.device_models import list_models, load_model
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _catalog_filter():
+    """``?catalog=a,b`` as a list of slugs, or None for all catalogs."""
+    raw = request.args.get('catalog')
+    return [c.strip() for c in raw.split(',') if c.strip()] if raw else None
+
+
+@api_bp.route('/catalog/search')
+@login_required
+def catalog_search():
+    """Typo-tolerant search over catalog names: ``?q=&catalog=&limit=``."""
+    try:
+        limit = parse_limit(request.args.get('limit') or str(DEFAULT_SEARCH_RESULTS))
+        items = search_catalogs(request.args.get('q'), _catalog_filter(), limit)
+    except CatalogQueryError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(items=items)
+
+
+@api_bp.route('/catalog/autocomplete')
+@login_required
+def catalog_autocomplete_list():
+    """Prefix completions from the in-memory index: ``?q=&catalog=&limit=``."""
+    catalogs = _catalog_filter()
+    if catalogs and any(c not in CATALOGS for c in catalogs):
+        return jsonify(error="Unknown catalog."), 400
+    items = catalog_autocomplete.search(request.args.get('q', ''),
+                                        request.args.get('limit', type=int), catalogs)
+    response = jsonify(items=items)
+    response.headers['Cache-Control'] = 'private, max-age=5'
+    return response
+
+
+@api_bp.route('/catalog/<catalog>')
+@login_required
+def catalog_list(catalog):
+    """Keyset-paginated listing of a master catalog.
+
+    Query parameters: ``fields`` (comma-separated projection), ``limit`` and
+    ``after`` (the ``next`` cursor of the previous page). The ETag only depends
+    on the catalog fingerprint and those parameters, so a matching
+    ``If-None-Match`` is answered with 304 before any rows are read.
+    """
+    model = CATALOGS.get(catalog)
+    if model is None:
+        abort(404)
+
+    try:
+        fields = parse_fields(model, request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit'))
+        after = request.args.get('after') or None
+        table = model.__tablename__
+        count, latest = catalog_cache.get_or_load(
+            ('fingerprint', table), lambda: fingerprint(model))
+        etag = make_etag(model, count, latest, ','.join(fields), limit, after)
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            items, next_cursor = catalog_cache.get_or_load(
+                ('page', table, tuple(fields), limit, after),
+                lambda: fetch_page(model, fields, after=after, limit=limit))
+            response = jsonify(items=items, next=next_cursor, total=count)
+    except CatalogQueryError as e:
+        return jsonify(error=str(e)), 400
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_bp.route('/device-models')
+@login_required
+def device_model_list():
+    """Device models without their pins: ``?manufacturer_id=&device_type_id=``."""
+    manufacturer_id = request.args.get('manufacturer_id', type=int)
+    device_type_id = request.args.get('device_type_id', type=int)
+    items = catalog_cache.get_or_load(
+        ('device-models', manufacturer_id, device_type_id),
+        lambda: list_models(manufacturer_id, device_type_id))
+    return jsonify(items=items)
+
+
+@api_bp.route('/device-models/<int:model_id>')
+@login_required
+def device_model_detail(model_id):
+    """One device model with its expanded pin template."""
+    data = catalog_cache.get_or_load(('device-model', model_id), lambda: load_model(model_id))
+    if data is None:
+        abort(404)
+    return jsonify(data)
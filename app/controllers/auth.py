@@ -1,34 +1,53 @@
 # app/controllers/auth.py
+import logging
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db
+from app import db, login_throttle
 from app.models.user import User
+from app.passwords import HasherBusy
 from app.forms import LoginForm
 
 auth_bp = Blueprint('auth', __name__)
+log = logging.getLogger('app.auth')
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
-    print("Login route hit")
     if current_user.is_authenticated:
-        print("Already authenticated, redirecting to dashboard")
         return redirect(url_for('super_admin.dashboard'))
 
     form = LoginForm()
     if form.validate_on_submit():
         username = form.username.data
-        print(f"Form submitted with username: {username}")
+        # Throttled usernames are turned away before any hash work is done
+        retry_after = login_throttle.retry_after(username)
+        if retry_after:
+            log.warning("Login throttled", extra={'username': username, 'retry_after': retry_after})
+            flash('Too many failed attempts. Try again later.', 'error')
+            return render_template('auth/login.html', form=form), 429, {'Retry-After': str(retry_after)}
+
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(form.password.data):
-            print(f"Login success for {username}")
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HasherBusy:
+            log.warning("Login rejected: password hasher busy", extra={'username': username})
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/login.html', form=form), 503, {'Retry-After': '1'}
+
+        if valid:
+            if user.password_needs_rehash():
+                try:
+                    user.rehash_password(form.password.data)
+                except HasherBusy:
+                    pass  # upgrade on a later login
+            login_throttle.reset(username)
             login_user(user, remember=True)
             db.session.commit()
-            print(f"After login_user: current_user = {current_user.username if current_user.is_authenticated else 'None'}")
+            log.info("Login succeeded", extra={'username': username, 'user_id': user.id})
             return redirect(url_for('super_admin.dashboard'))
-        print("Login failed - invalid credentials")
+        log.info("Login failed", extra={'username': username})
+        login_throttle.record_failure(username)
         flash('Invalid username or password.', 'error')
 
-    print("Showing login form")
     return render_template('auth/login.html', form=form)
     
 @auth_bp.route('/logout')
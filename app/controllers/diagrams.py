@@ -0,0 +1,446 @@
+# app/controllers/diagrams.py
+"""JSON API for saving and loading diagrams."""
+
+import json
+
+from flask import Blueprint, Response, abort, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+from app import catalog_cache, db, diagram_push
+from app.models.diagram import Diagram
+from app.services.cables import ROUTINGS, load_schedule, schedule_csv
+from app.services.connections import (
+    InvalidConnection, diagram_index, validate_edges, validate_persisted_edges,
+)
+from app.services.diagrams import (
+    DiagramError, diagram_summary, iter_chunks, load_document_json, load_node_pins_json, save_document,
+    validate_document,
+)
+from app.controllers.jobs import accepted, wants_async
+from app.jobs import enqueue
+from app.push import load_frame
+from app.services.graph import DOWNSTREAM, UPSTREAM, diagram_graph
+from app.services.history import (
+    MAX_HISTORY_PAGE, HistoryUnavailable, change_log, document_at, earliest_version, node_at,
+)
+from app.services.sync import CHANGE_FEED_LIMIT, SyncConflict, apply_patch, changes_since, record_changes
+
+diagrams_bp = Blueprint('diagrams', __name__, url_prefix='/api/diagrams')
+
+
+def get_diagram_or_404(diagram_id, for_update=False):
+    """Load a diagram the current user may access (owner or super admin)."""
+    stmt = select(Diagram).where(Diagram.id == diagram_id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    diagram = db.session.execute(stmt).scalar_one_or_none()
+    if diagram is None or (diagram.owner_id != current_user.id
+                           and current_user.role != 'super_admin'):
+        abort(404)
+    return diagram
+
+
+# Most node ids one batched pin request may ask for.
+MAX_PIN_NODES = 500
+
+
+def _etag(diagram):
+    return f'd{diagram.id}v{diagram.version}'
+
+
+def _pins_etag(diagram):
+    # Pins follow device model templates too, which move the catalog version.
+    return f'{_etag(diagram)}-pins-c{catalog_cache.version()}'
+
+
+def _summary_etag(diagram):
+    # So do the summaries' pin_count values.
+    return f'{_etag(diagram)}-c{catalog_cache.version()}'
+
+
+def _is_current(etags, diagram):
+    """True if an ``If-Match`` names the diagram's version (in any representation)."""
+    base = _etag(diagram)
+    return etags.star_tag or any(tag == base or tag.startswith(base + '-') for tag in etags)
+
+
+def _cached_json(etag, build):
+    """A private JSON response revalidated by ``etag``; ``build()`` yields the body."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(build(), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _save(diagram, status, doc=None):
+    """Save ``doc``, by default the request body, as the diagram's new version."""
+    raw = None
+    if doc is None:
+        doc = request.get_json(silent=True)
+        raw = request.get_data(as_text=True) if doc else None
+    try:
+        save_document(diagram, doc, raw=raw)
+        # A full save resets every client: the feed tells them to reload.
+        record_changes(diagram.id, diagram.version, [{'op': 'replace'}], current_user.id)
+        db.session.commit()
+    except DiagramError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    except (DataError, IntegrityError) as e:
+        db.session.rollback()
+        return jsonify(error="Diagram rejected by the database.", detail=str(e.orig).strip()), 400
+    response = jsonify(diagram_summary(diagram))
+    response.status_code = status
+    response.set_etag(_etag(diagram))
+    return response
+
+
+@diagrams_bp.route('', methods=['GET'])
+@login_required
+def list_diagrams():
+    diagrams = db.session.execute(
+        select(Diagram).where(Diagram.owner_id == current_user.id).order_by(Diagram.name)
+    ).scalars()
+    return jsonify(items=[diagram_summary(d) for d in diagrams])
+
+
+@diagrams_bp.route('', methods=['POST'])
+@login_required
+def create_diagram():
+    """Create a diagram; the body may already carry ``nodes`` and ``edges``."""
+    doc = request.get_json(silent=True)
+    if not isinstance(doc, dict) or not doc.get('name'):
+        return jsonify(error="name is required."), 400
+    diagram = Diagram(name=doc['name'], owner_id=current_user.id, version=0)
+    db.session.add(diagram)
+    return _save(diagram, 201)
+
+
+@diagrams_bp.route('/<int:diagram_id>', methods=['GET'])
+@login_required
+def load_diagram(diagram_id):
+    """Stream the whole diagram as one JSON document assembled by Postgres.
+
+    Nodes come with ``pin_count`` only; ``?include=pins`` inlines every pin
+    list, otherwise the canvas fetches them per node from ``/pins``.
+    """
+    diagram = get_diagram_or_404(diagram_id)
+    pins = request.args.get('include') == 'pins'
+    return _cached_json(_pins_etag(diagram) if pins else _summary_etag(diagram),
+                        lambda: iter_chunks(load_document_json(diagram.id, pins=pins)))
+
+
+@diagrams_bp.route('/<int:diagram_id>', methods=['PUT'])
+@login_required
+def replace_diagram(diagram_id):
+    """Replace the diagram's contents. ``If-Match`` guards against lost updates."""
+    diagram = get_diagram_or_404(diagram_id, for_update=True)
+    if request.if_match and not _is_current(request.if_match, diagram):
+        db.session.rollback()
+        return jsonify(error="Diagram changed since it was loaded.", version=diagram.version), 412
+    return _save(diagram, 200)
+
+
+@diagrams_bp.route('/<int:diagram_id>', methods=['DELETE'])
+@login_required
+def delete_diagram(diagram_id):
+    diagram = get_diagram_or_404(diagram_id)
+    db.session.delete(diagram)
+    db.session.commit()
+    return '', 204
+
+
+@diagrams_bp.route('/<int:diagram_id>/nodes/<node_key>/pins', methods=['GET'])
+@login_required
+def node_pins(diagram_id, node_key):
+    """The effective pin list of one node (device model template plus overrides)."""
+    diagram = get_diagram_or_404(diagram_id)
+    if node_key not in diagram_index(diagram).nodes:
+        return jsonify(error="Unknown node."), 404
+    return _cached_json(_pins_etag(diagram),
+                        lambda: load_node_pins_json(diagram.id, [node_key]).get(node_key, '[]'))
+
+
+@diagrams_bp.route('/<int:diagram_id>/pins', methods=['GET'])
+@login_required
+def batch_node_pins(diagram_id):
+    """Pins of several nodes at once: ``?nodes=a,b,c`` -> ``{"pins": {"a": [...], ...}}``.
+
+    Unknown node ids are left out of the result.
+    """
+    keys = [k for k in (request.args.get('nodes') or '').split(',') if k]
+    if not keys or len(keys) > MAX_PIN_NODES:
+        return jsonify(error=f"nodes must list 1-{MAX_PIN_NODES} node ids."), 400
+    diagram = get_diagram_or_404(diagram_id)
+    nodes = diagram_index(diagram).nodes
+    keys = [k for k in dict.fromkeys(keys) if k in nodes]
+
+    def build():
+        # Pin lists arrive as JSON text from Postgres and are spliced in unparsed.
+        pins = load_node_pins_json(diagram.id, keys)
+        body = ','.join(f'{json.dumps(k)}:{pins.get(k, "[]")}' for k in keys)
+        return f'{{"version":{diagram.version},"pins":{{{body}}}}}'
+    return _cached_json(_pins_etag(diagram), build)
+
+
+@diagrams_bp.route('/<int:diagram_id>/changes', methods=['POST'])
+@login_required
+def patch_diagram(diagram_id):
+    """Apply ``{"base_version": N, "ops": [...]}`` atomically.
+
+    409 means the patch conflicts with changes made since ``base_version``;
+    the client should fetch them and retry.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify(error="Expected a JSON object."), 400
+    diagram = get_diagram_or_404(diagram_id, for_update=True)
+    try:
+        version = apply_patch(diagram, body.get('base_version'), body.get('ops'), current_user.id)
+        db.session.commit()
+    except InvalidConnection as e:
+        db.session.rollback()
+        return jsonify(error=str(e), edge=e.edge_key, reason=e.reason), 400
+    except DiagramError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    except SyncConflict as e:
+        db.session.rollback()
+        return jsonify(error=str(e), version=e.version), 409
+    except DataError as e:
+        db.session.rollback()
+        return jsonify(error="Patch rejected by the database.", detail=str(e.orig).strip()), 400
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify(error="Patch conflicts with the diagram.", detail=str(e.orig).strip()), 409
+    response = jsonify(version=version)
+    response.set_etag(_etag(diagram))
+    return response
+
+
+@diagrams_bp.route('/<int:diagram_id>/changes', methods=['GET'])
+@login_required
+def list_changes(diagram_id):
+    """Ops applied after ``?since=N``; ``more`` is true when the page was cut at the limit."""
+    since = request.args.get('since', 0, type=int)
+    diagram = get_diagram_or_404(diagram_id)
+    changes = changes_since(diagram.id, since, limit=CHANGE_FEED_LIMIT + 1)
+    if since < diagram.version and (not changes or changes[0]['version'] != since + 1):
+        return jsonify(error="Changes since this version were pruned; reload the diagram.",
+                       version=diagram.version), 410
+    more = len(changes) > CHANGE_FEED_LIMIT
+    if more:
+        # Never end a page halfway through a version; ``since`` resumes after whole versions.
+        last = changes[CHANGE_FEED_LIMIT]['version']
+        whole = [c for c in changes[:CHANGE_FEED_LIMIT] if c['version'] != last]
+        changes = whole or [c for c in changes if c['version'] == last]
+    return jsonify(version=diagram.version, changes=changes, more=more)
+
+
+@diagrams_bp.route('/<int:diagram_id>/history', methods=['GET'])
+@login_required
+def diagram_history(diagram_id):
+    """Who changed what, newest first. Page with ``?before=`` (the ``next`` cursor) and ``?limit=``.
+
+    ``restorable_from`` is the oldest version ``/versions/<n>`` can rebuild.
+    """
+    limit = request.args.get('limit', 100, type=int)
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        return jsonify(error=f"limit must be 1-{MAX_HISTORY_PAGE}."), 400
+    diagram = get_diagram_or_404(diagram_id)
+    items, next_cursor = change_log(diagram.id, before=request.args.get('before', type=int), limit=limit)
+    return jsonify(items=items, next=next_cursor, version=diagram.version,
+                   restorable_from=earliest_version(diagram.id))
+
+
+@diagrams_bp.route('/<int:diagram_id>/versions/<int:version>', methods=['GET'])
+@login_required
+def diagram_version(diagram_id, version):
+    """The diagram as it was at ``version``: the nearest snapshot plus a short replay."""
+    diagram = get_diagram_or_404(diagram_id)
+    if not 1 <= version <= diagram.version:
+        return jsonify(error="Unknown version.", version=diagram.version), 404
+    try:
+        doc = document_at(diagram.id, version)
+    except HistoryUnavailable as e:
+        return jsonify(error=str(e), restorable_from=earliest_version(diagram.id)), 410
+    return jsonify(doc)
+
+
+@diagrams_bp.route('/<int:diagram_id>/versions/<int:version>/nodes/<node_key>', methods=['GET'])
+@login_required
+def diagram_version_node(diagram_id, version, node_key):
+    """One node as it was at ``version``, without rebuilding the rest of the document."""
+    diagram = get_diagram_or_404(diagram_id)
+    if not 1 <= version <= diagram.version:
+        return jsonify(error="Unknown version.", version=diagram.version), 404
+    try:
+        node = node_at(diagram.id, version, node_key)
+    except HistoryUnavailable as e:
+        return jsonify(error=str(e), restorable_from=earliest_version(diagram.id)), 410
+    if node is None:
+        return jsonify(error="No such node at this version."), 404
+    return jsonify(node)
+
+
+@diagrams_bp.route('/<int:diagram_id>/versions/<int:version>/restore', methods=['POST'])
+@login_required
+def restore_version(diagram_id, version):
+    """Save the contents of ``version`` as a new version. ``If-Match`` as for PUT."""
+    diagram = get_diagram_or_404(diagram_id, for_update=True)
+    if request.if_match and not _is_current(request.if_match, diagram):
+        db.session.rollback()
+        return jsonify(error="Diagram changed since it was loaded.", version=diagram.version), 412
+    if not 1 <= version <= diagram.version:
+        db.session.rollback()
+        return jsonify(error="Unknown version.", version=diagram.version), 404
+    try:
+        doc = document_at(diagram.id, version)
+    except HistoryUnavailable as e:
+        db.session.rollback()
+        return jsonify(error=str(e), restorable_from=earliest_version(diagram.id)), 410
+    return _save(diagram, 200, doc=doc)
+
+
+@diagrams_bp.route('/<int:diagram_id>/events', methods=['GET'])
+@login_required
+def diagram_events(diagram_id):
+    """Server-sent events with the diagram's changes as they are committed (see app/push.py).
+
+    Starts after ``Last-Event-ID`` (an EventSource reconnecting) or
+    ``?since=N``, else at the current version.
+    """
+    diagram = get_diagram_or_404(diagram_id)
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', diagram.version, type=int)
+    if not 0 <= since <= diagram.version:
+        return jsonify(error="since must be a known diagram version.", version=diagram.version), 400
+    hub = diagram_push.hub
+    subscriber = hub.subscribe(diagram.id, since, diagram.version)
+    if subscriber is None:
+        response = jsonify(error="Too many live streams; poll /changes instead.")
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    first = None
+    if since < subscriber.start:
+        version, changes = load_frame(diagram.id, since, until=subscriber.start)
+        if version is not None:
+            first = ('changes' if changes is not None else 'resync', version, changes)
+    # The stream holds no database connection: the session goes with the request.
+    response = Response(hub.stream(subscriber, first), mimetype='text/event-stream')
+    response.call_on_close(lambda: hub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass frames straight through
+    return response
+
+
+@diagrams_bp.route('/<int:diagram_id>/connections/check', methods=['GET'])
+@login_required
+def check_connection(diagram_id):
+    """O(1) check of one prospective edge: ``?source=&sourceHandle=&target=&targetHandle=``."""
+    diagram = get_diagram_or_404(diagram_id)
+    args = request.args
+    reason = diagram_index(diagram).check(args.get('source'), args.get('sourceHandle'),
+                                          args.get('target'), args.get('targetHandle'))
+    response = jsonify(valid=reason is None, reason=reason, version=diagram.version)
+    response.set_etag(_etag(diagram))
+    return response
+
+
+@diagrams_bp.route('/<int:diagram_id>/validation', methods=['GET'])
+@login_required
+def validate_diagram(diagram_id):
+    """Check every saved edge against the connection rules.
+
+    With ``Prefer: respond-async`` (large diagrams) a job worker does the
+    check; the response is 202 and the report is the job's result.
+    """
+    diagram = get_diagram_or_404(diagram_id)
+    if wants_async():
+        return accepted(enqueue('diagram.validate', {'diagram_id': diagram.id}, priority=10,
+                                user_id=current_user.id))
+    errors = validate_persisted_edges(diagram)
+    return jsonify(valid=not errors, errors=errors, version=diagram.version)
+
+
+@diagrams_bp.route('/validate', methods=['POST'])
+@login_required
+def validate_document_connections():
+    """Validate all edges of a ``{nodes, edges}`` document (e.g. before an import) in one pass."""
+    try:
+        nodes, edges = validate_document(request.get_json(silent=True), check_endpoints=False)
+    except DiagramError as e:
+        return jsonify(error=str(e)), 400
+    errors = validate_edges(nodes, edges)
+    return jsonify(valid=not errors, errors=errors, edges=len(edges))
+
+
+@diagrams_bp.route('/<int:diagram_id>/trace', methods=['GET'])
+@login_required
+def trace_signal(diagram_id):
+    """``?node=&pin=&direction=upstream|downstream&max_depth=``: what feeds / is fed by a pin."""
+    direction = request.args.get('direction', UPSTREAM)
+    if direction not in (UPSTREAM, DOWNSTREAM):
+        return jsonify(error="direction must be 'upstream' or 'downstream'."), 400
+    diagram = get_diagram_or_404(diagram_id)
+    try:
+        trace = diagram_graph(diagram).trace(
+            request.args.get('node'), request.args.get('pin'), direction,
+            max_depth=request.args.get('max_depth', type=int))
+    except KeyError:
+        return jsonify(error="Unknown node."), 404
+    return jsonify(dict(trace, direction=direction, version=diagram.version))
+
+
+@diagrams_bp.route('/<int:diagram_id>/loops', methods=['GET'])
+@login_required
+def signal_loops(diagram_id):
+    """Feedback loops in the signal flow."""
+    diagram = get_diagram_or_404(diagram_id)
+    return jsonify(loops=diagram_graph(diagram).loops(), version=diagram.version)
+
+
+@diagrams_bp.route('/<int:diagram_id>/systems', methods=['GET'])
+@login_required
+def systems(diagram_id):
+    """Isolated systems (connected groups of devices); ``?node=`` for one device's system."""
+    diagram = get_diagram_or_404(diagram_id)
+    graph = diagram_graph(diagram)
+    node = request.args.get('node')
+    if node is not None:
+        if node not in graph.parent:
+            return jsonify(error="Unknown node."), 404
+        return jsonify(system=graph.system_of(node), version=diagram.version)
+    return jsonify(systems=graph.systems(), version=diagram.version)
+
+
+@diagrams_bp.route('/<int:diagram_id>/cables', methods=['GET'])
+@login_required
+def cable_bom(diagram_id):
+    """Bill of materials per spec and per system (``?routing=manhattan|direct``)."""
+    routing = request.args.get('routing', 'manhattan')
+    if routing not in ROUTINGS:
+        return jsonify(error=f"routing must be one of: {', '.join(ROUTINGS)}"), 400
+    diagram = get_diagram_or_404(diagram_id)
+    schedule = load_schedule(diagram, routing)
+    return jsonify(totals=schedule.totals(), bom=schedule.bom(), systems=schedule.by_system(),
+                   version=diagram.version)
+
+
+@diagrams_bp.route('/<int:diagram_id>/cables.csv', methods=['GET'])
+@login_required
+def cable_schedule(diagram_id):
+    """The per-run cable schedule as CSV."""
+    routing = request.args.get('routing', 'manhattan')
+    if routing not in ROUTINGS:
+        return jsonify(error=f"routing must be one of: {', '.join(ROUTINGS)}"), 400
+    diagram = get_diagram_or_404(diagram_id)
+    response = Response(schedule_csv(load_schedule(diagram, routing)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="diagram-{diagram.id}-cables.csv"'
+    return response
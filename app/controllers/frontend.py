@@ -0,0 +1,25 @@
+# app/controllers/frontend.py
+"""The built React app (``npm run build``), served by Flask when ``FRONTEND_DIST`` is set.
+
+Vite names everything under ``assets/`` after a hash of its content, so those
+files are cached for a year without revalidation; ``index.html`` and the
+copies of ``public/`` keep their names and are revalidated on every use.
+``flask frontend compress`` writes the ``.br`` / ``.gz`` siblings sent here.
+"""
+
+from flask import Blueprint, current_app
+from app.compression import send_precompressed
+from app.controllers.thumbnails import IMMUTABLE
+
+frontend_bp = Blueprint('frontend', __name__)
+
+
+@frontend_bp.route('/', defaults={'filename': 'index.html'})
+@frontend_bp.route('/<path:filename>')
+def asset(filename):
+    response = send_precompressed(current_app.config['FRONTEND_DIST'], filename)
+    if filename.startswith('assets/'):
+        response.headers['Cache-Control'] = IMMUTABLE
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,42 @@
+# app/controllers/jobs.py
+"""Status of background jobs (see app/jobs.py)."""
+
+from flask import Blueprint, abort, jsonify, request, url_for
+from flask_login import current_user, login_required
+from app import db
+from app.jobs import job_status
+from app.models.job import Job
+from app.services import tasks  # noqa: F401 -- registers the job handlers, so kinds can be queued
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+def wants_async():
+    """True if the client sent ``Prefer: respond-async`` (RFC 7240)."""
+    return 'respond-async' in request.headers.get('Prefer', '').replace(' ', '').split(',')
+
+
+def accepted(job):
+    """202 pointing at the job's status; commits the session so workers can claim it."""
+    db.session.commit()
+    response = jsonify(job_status(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.job_detail', job_id=job.id)
+    response.headers['Preference-Applied'] = 'respond-async'
+    return response
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def job_detail(job_id):
+    """Status, progress and (when finished) result of a job queued by the current user.
+
+    Poll while ``status`` is ``queued`` or ``running``; ``Retry-After`` suggests how soon.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None or (job.created_by != current_user.id and current_user.role != 'super_admin'):
+        abort(404)
+    response = jsonify(job_status(job))
+    if job.status in ('queued', 'running'):
+        response.headers['Retry-After'] = '1' if job.status == 'running' else '2'
+    return response
@@ -0,0 +1,45 @@
+# app/controllers/ops.py
+"""Operational endpoints for the machines that run the app (metrics scrapers, probes)."""
+
+import time
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from app import db, metrics
+from app.metrics import CONTENT_TYPE
+from app.server import check_database
+
+ops_bp = Blueprint('ops', __name__)
+
+
+@ops_bp.route('/metrics')
+def prometheus_metrics():
+    """This process's metrics in the Prometheus text format; local scrapers only."""
+    if request.remote_addr not in current_app.config['METRICS_ALLOWED_IPS']:
+        abort(404)
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+
+@ops_bp.route('/healthz')
+def liveness():
+    """The worker is up and answering; touches nothing else."""
+    return jsonify(status='ok')
+
+
+def _database_error():
+    # One real check per READINESS_CACHE_SECONDS per worker, however often probed.
+    state = current_app.extensions.setdefault('readiness', {'checked_at': None, 'error': None})
+    now = time.monotonic()
+    checked_at = state['checked_at']
+    if checked_at is None or now - checked_at >= current_app.config['READINESS_CACHE_SECONDS']:
+        state['error'] = check_database(db.engine, current_app.config['READINESS_DB_TIMEOUT_MS'])
+        state['checked_at'] = now
+    return state['error']
+
+
+@ops_bp.route('/readyz')
+def readiness():
+    """Ready for traffic: the database answers ``SELECT 1`` quickly."""
+    error = _database_error()
+    if error is not None:
+        return jsonify(status='unavailable', database=error), 503, {'Retry-After': '1'}
+    return jsonify(status='ok', database='ok')
@@ -1,14 +1,34 @@
 # app/controllers/super_admin.py
 """Super admin routes for managing master data."""
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required
-from app import db
-from app.models.master import DeviceType, Manufacturer
+import os
+import shutil
+import uuid
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+from app import db, catalog_cache, db_instrumentation, db_pool, thumbnail_store
+from app.models.master import DeviceModel, DeviceType, Manufacturer
+from app.services.catalog import CATALOGS, catalog_rows
+from app.services.catalog_batch import BatchValidationError, apply_batch
+from app.services.device_models import DeviceModelError, create_model, model_summary, update_model
+from app.services.catalog_import import (
+    DEFAULT_CHUNK_SIZE, FORMATS, UnreadableUpload, detect_format, import_catalog, open_text,
+)
+from app.controllers.jobs import accepted, wants_async
+from app.jobs import enqueue
+from app.thumbnails import SIZES as THUMBNAIL_SIZES, ThumbnailError, ThumbnailTooLarge
 from app.decorators.role import requires_super_admin  # Correct import
 
 super_admin_bp = Blueprint('super_admin', __name__, url_prefix='/super_admin')
 
+FOREIGN_KEY_VIOLATION = '23503'
+
+def _sqlstate(error):
+    """Postgres SQLSTATE of an ``IntegrityError`` (psycopg2 or psycopg 3)."""
+    return getattr(error.orig, 'pgcode', None) or getattr(error.orig, 'sqlstate', None)
+
 @super_admin_bp.route('/super_admin/', methods=['GET', 'POST'])
 @login_required
 @requires_super_admin
@@ -69,8 +89,14 @@ def dashboard():
                 if manufacturer:
                     name = manufacturer.name
                     db.session.delete(manufacturer)
-                    db.session.commit()
-                    flash(f"manufacturer '{name}' deleted.", "success")
+                    try:
+                        db.session.commit()
+                    except IntegrityError:
+                        # Its device models go with it, and diagram nodes still use one of them
+                        db.session.rollback()
+                        flash(f"Manufacturer '{name}' is in use by diagrams and cannot be deleted.", "error")
+                    else:
+                        flash(f"manufacturer '{name}' deleted.", "success")
                 else:
                     flash("manufacturer not found.", "error")
             else:
@@ -78,6 +104,166 @@ def dashboard():
 
         return redirect(url_for('super_admin.dashboard'))
 
-    device_types = DeviceType.query.order_by(DeviceType.name).all()
-    manufacturers = Manufacturer.query.order_by(Manufacturer.name).all()
-    return render_template('super_admin/dashboard.html', device_types=device_types, manufacturers=manufacturers)
\ No newline at end of file
+    # Plain dicts from the catalog cache; writes above invalidate it on commit
+    device_types = catalog_cache.get_or_load(
+        'dashboard:device_types', lambda: catalog_rows(DeviceType, 'id', 'name', 'color'))
+    manufacturers = catalog_cache.get_or_load(
+        'dashboard:manufacturers', lambda: catalog_rows(Manufacturer, 'id', 'name'))
+    return render_template('super_admin/dashboard.html', device_types=device_types, manufacturers=manufacturers)
+
+@super_admin_bp.route('/cache-stats')
+@login_required
+@requires_super_admin
+def cache_stats():
+    """Hit/miss counters of this worker's catalog cache."""
+    return jsonify(catalog_cache.stats())
+
+@super_admin_bp.route('/db-stats')
+@login_required
+@requires_super_admin
+def db_stats():
+    """This worker's slowest statement per endpoint and its connection pool occupancy."""
+    return jsonify(slowest=db_instrumentation.slowest(), pool=db_pool.stats())
+
+@super_admin_bp.route('/import/<catalog>', methods=['POST'])
+@login_required
+@requires_super_admin
+def catalog_import(catalog):
+    """Bulk upsert a CSV or NDJSON upload into a catalog and report per-row errors.
+
+    Accepts a multipart ``file`` field or the raw request body. The format comes
+    from ``?format=`` or is guessed from the filename / content type. With
+    ``Prefer: respond-async`` the upload is staged and imported by a job
+    worker instead (202; the report is the job's result).
+    """
+    model = CATALOGS.get(catalog)
+    if model is None:
+        abort(404)
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify(error="No file uploaded."), 400
+        stream, guessed = upload.stream, detect_format(upload.filename, upload.mimetype)
+    else:
+        stream, guessed = request.stream, detect_format(content_type=request.mimetype)
+
+    fmt = request.args.get('format') or guessed
+    if fmt not in FORMATS:
+        return jsonify(error=f"format must be one of: {', '.join(FORMATS)}"), 400
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    if chunk_size < 1:
+        return jsonify(error="chunk_size must be positive"), 400
+
+    if wants_async():
+        folder = current_app.config['JOBS_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'import-{uuid.uuid4().hex}.{fmt}')
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        job = enqueue('catalog.import', {'catalog': catalog, 'path': path, 'format': fmt,
+                                         'chunk_size': chunk_size}, user_id=current_user.id)
+        return accepted(job)
+
+    try:
+        report = import_catalog(model, open_text(stream), fmt, chunk_size=chunk_size)
+    except UnreadableUpload as e:
+        return jsonify(error=str(e), **e.report.to_dict()), 400
+    return jsonify(report.to_dict())
+
+@super_admin_bp.route('/batch', methods=['POST'])
+@login_required
+@requires_super_admin
+def catalog_batch():
+    """Apply many catalog add/update/delete operations in one transaction.
+
+    Body: ``{"operations": [{"op": "add", "catalog": "device-types", "name": ...}, ...]}``.
+    Returns one result per operation. Nothing is applied if any operation is
+    invalid (400), an update collides with an existing name, or a delete hits
+    an entry that is still referenced (both 409).
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error="Expected a JSON object with an operations list."), 400
+    try:
+        results = apply_batch(payload.get('operations'))
+        db.session.commit()
+    except BatchValidationError as e:
+        db.session.rollback()
+        return jsonify(results=e.results), 400
+    except IntegrityError as e:
+        db.session.rollback()
+        if _sqlstate(e) == FOREIGN_KEY_VIOLATION:
+            error = "Batch deletes an entry that is still referenced; nothing was applied."
+        else:
+            error = "Batch conflicts with an existing name; nothing was applied."
+        return jsonify(error=error, detail=str(e.orig).strip()), 409
+    return jsonify(results=results)
+
+
+@super_admin_bp.route('/device-models', methods=['POST'])
+@login_required
+@requires_super_admin
+def device_model_create():
+    """Add a device model: ``{"name", "manufacturer_id", "device_type_id", "pins": [...]}``."""
+    try:
+        model = create_model(request.get_json(silent=True))
+        db.session.commit()
+    except DeviceModelError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify(error="This manufacturer already has a model with that name.",
+                       detail=str(e.orig).strip()), 409
+    return jsonify(model_summary(model, pins=True)), 201
+
+@super_admin_bp.route('/device-models/<int:model_id>', methods=['PUT'])
+@login_required
+@requires_super_admin
+def device_model_update(model_id):
+    """Change a device model; nodes placed from it see a new pin template at once."""
+    model = db.session.get(DeviceModel, model_id)
+    if model is None:
+        abort(404)
+    try:
+        update_model(model, request.get_json(silent=True))
+        db.session.commit()
+    except DeviceModelError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify(error="This manufacturer already has a model with that name.",
+                       detail=str(e.orig).strip()), 409
+    return jsonify(model_summary(model, pins=True))
+
+@super_admin_bp.route('/thumbnails', methods=['POST'])
+@login_required
+@requires_super_admin
+def thumbnail_upload():
+    """Store a device image (multipart ``file`` or raw body) and return its digest.
+
+    The digest goes into a catalog's ``thumbnail`` column; the same bytes
+    uploaded twice yield the same digest (200 instead of 201). With
+    ``THUMBNAIL_RENDER_JOBS`` the sizes are rendered by a job worker.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify(error="No file uploaded."), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+    try:
+        digest, created = thumbnail_store.save(stream)
+    except ThumbnailTooLarge as e:
+        return jsonify(error=str(e)), 413
+    except ThumbnailError as e:
+        return jsonify(error=str(e)), 400
+    if created and current_app.config['THUMBNAIL_RENDER_JOBS']:
+        # Low priority: a size that is not rendered yet is rendered on first request.
+        enqueue('thumbnails.render', {'digest': digest}, priority=-10, user_id=current_user.id)
+        db.session.commit()
+    urls = {size: url_for('thumbnails.thumbnail', digest=digest, size=size) for size in THUMBNAIL_SIZES}
+    return jsonify(digest=digest, urls=urls), 201 if created else 200
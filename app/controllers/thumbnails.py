@@ -0,0 +1,28 @@
+# app/controllers/thumbnails.py
+"""Immutable, content-addressed thumbnail files for the palette and canvas."""
+
+from flask import Blueprint, abort, send_file
+from app import thumbnail_store
+from app.thumbnails import RENDITION_MIMETYPE
+
+thumbnails_bp = Blueprint('thumbnails', __name__, url_prefix='/thumbnails')
+
+# A digest names one image forever, so clients and proxies never revalidate.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@thumbnails_bp.route('/<digest>/<size>.webp')
+def thumbnail(digest, size):
+    """One rendition (``palette``, ``canvas``, ...) of a stored image.
+
+    ``send_file`` with a path hands the open file to the server's
+    ``wsgi.file_wrapper`` (sendfile(2) under gunicorn), or to the front proxy
+    when ``USE_X_SENDFILE`` is on, so the bytes never pass through Python.
+    """
+    path = thumbnail_store.path(digest, size)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=RENDITION_MIMETYPE, etag=f'{digest}-{size}',
+                         conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
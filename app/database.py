@@ -0,0 +1,188 @@
+# app/database.py
+"""Engine and connection pool settings, plus pool metrics.
+
+``DatabasePool`` turns the ``DB_*`` settings into
+``SQLALCHEMY_ENGINE_OPTIONS`` before Flask-SQLAlchemy builds its engines,
+so it must be initialised first. Pooled connections are pre-pinged on
+checkout and recycled after ``DB_POOL_RECYCLE`` seconds, so a Postgres
+restart or an idle-connection reaper costs a reconnect instead of a failed
+request. ``DB_POOL_TIMEOUT`` bounds how long a request waits for a free
+connection.
+
+``DB_STATEMENT_TIMEOUT_MS`` is normally sent in the connection startup
+packet. With ``DB_PGBOUNCER`` (pgbouncer in transaction pooling mode) a
+client connection does not own a server session, so startup options are
+refused and session state does not stick. The timeout is set with ``SET
+LOCAL`` as each transaction begins instead: it then holds on whichever
+server connection pgbouncer assigns to that transaction, and ends with it
+rather than leaking to the next client. psycopg 3 URLs get
+``prepare_threshold=None`` so no server-side prepared statements are
+created. (psycopg2 never prepares statements server-side.)
+
+Checkout waits, pool timeouts, new connections and invalidations are
+counted by ``InstrumentedQueuePool``; pool occupancy is read into gauges
+at scrape time.
+"""
+
+import logging
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import DURATION_BUCKETS
+
+CHECKOUT_BUCKETS = (0.0001, 0.0005) + DURATION_BUCKETS
+
+
+def _state():
+    return current_app.extensions.get('db_pool') if has_app_context() else None
+
+
+class InstrumentedQueuePool(QueuePool):
+    """``QueuePool`` that times how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeout:
+            state = _state()
+            if state is not None:
+                state.timeouts.inc()
+                state.checkout.observe(value=time.perf_counter() - started)
+            raise
+        state = _state()
+        if state is not None:
+            state.checkout.observe(value=time.perf_counter() - started)
+        return record
+
+
+# SQLAlchemy names pool loggers after the pool class's module, which puts this
+# one under ``app``; keep it as quiet as the stock pool's.
+logging.getLogger(f'{__name__}.{InstrumentedQueuePool.__name__}').setLevel(logging.WARNING)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    state = _state()
+    if state is not None:
+        state.opened.inc()
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    state = _state()
+    if state is not None:
+        state.invalidated.inc()
+
+
+def _on_begin(conn):
+    if not has_app_context():
+        return
+    config = current_app.config
+    if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(config['DB_STATEMENT_TIMEOUT_MS'])}")
+        finally:
+            cursor.close()
+
+
+def _register_pool_events():
+    for name, fn in (('connect', _on_connect), ('invalidate', _on_invalidate)):
+        if not event.contains(InstrumentedQueuePool, name, fn):
+            event.listen(InstrumentedQueuePool, name, fn)
+    if not event.contains(Engine, 'begin', _on_begin):
+        event.listen(Engine, 'begin', _on_begin)
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the ``DB_*`` settings in ``config``."""
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    connect_args = {}
+    timeout_ms = config['DB_STATEMENT_TIMEOUT_MS']
+    if config['DB_PGBOUNCER']:
+        if make_url(config['SQLALCHEMY_DATABASE_URI']).get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = None
+    elif timeout_ms:
+        connect_args['options'] = f'-c statement_timeout={int(timeout_ms)}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+class _PoolState:
+    def __init__(self, registry):
+        self.checkout = registry.histogram(
+            'db_pool_checkout_seconds', 'Time to get a connection from the pool, including any wait.',
+            buckets=CHECKOUT_BUCKETS)
+        self.timeouts = registry.counter(
+            'db_pool_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT.')
+        self.opened = registry.counter('db_pool_connections_opened_total', 'New database connections.')
+        self.invalidated = registry.counter(
+            'db_pool_invalidated_total', 'Connections discarded as broken (failed pre-ping or query).')
+        self.size = registry.gauge('db_pool_size', 'Configured pool size.', ('bind',))
+        self.checked_out = registry.gauge('db_pool_checked_out', 'Connections in use.', ('bind',))
+        self.overflow = registry.gauge('db_pool_overflow', 'Connections open beyond the pool size.', ('bind',))
+        self.idle = registry.gauge('db_pool_idle', 'Open connections waiting in the pool.', ('bind',))
+
+
+def pool_stats():
+    """``{bind: {size, checked_out, overflow, idle}}`` for this process's engines."""
+    from app import db
+
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            stats[key or 'default'] = {
+                'size': pool.size(), 'checked_out': pool.checkedout(),
+                'overflow': max(0, pool.overflow()), 'idle': pool.checkedin(),
+            }
+    return stats
+
+
+class DatabasePool:
+    """Flask extension configuring the SQLAlchemy engine pool; init before ``db``."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DB_POOL_SIZE', 5)
+        app.config.setdefault('DB_MAX_OVERFLOW', 10)
+        app.config.setdefault('DB_POOL_TIMEOUT', 10)  # seconds waiting for a free connection
+        app.config.setdefault('DB_POOL_RECYCLE', 1800)  # seconds; below any server/LB idle cutoff
+        app.config.setdefault('DB_POOL_PRE_PING', True)
+        app.config.setdefault('DB_STATEMENT_TIMEOUT_MS', 0)  # 0: no limit
+        app.config.setdefault('DB_PGBOUNCER', False)
+        options = engine_options(app.config)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+        state = _PoolState(app.extensions['metrics'])
+        app.extensions['db_pool'] = state
+        _register_pool_events()
+
+        def collect():
+            with app.app_context():
+                stats = pool_stats()
+            for bind, values in stats.items():
+                state.size.set(bind, value=values['size'])
+                state.checked_out.set(bind, value=values['checked_out'])
+                state.overflow.set(bind, value=values['overflow'])
+                state.idle.set(bind, value=values['idle'])
+        app.extensions['metrics'].add_collector(collect)
+
+    def stats(self):
+        return pool_stats()
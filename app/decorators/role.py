@@ -1,17 +1,21 @@
 # app/decorators/role.py
+import logging
 from flask import abort
 from flask_login import current_user
 from functools import wraps
 
+log = logging.getLogger('app.auth')
+# Every super-admin request passes through here; sampled via LOG_SAMPLE_RATES.
+granted_log = logging.getLogger('app.auth.granted')
+
 def requires_super_admin(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        #print("requires_super_admin decorator called")
-        #print("current_user authenticated:", current_user.is_authenticated)
-        #print("current_user.role:", current_user.role if current_user.is_authenticated else "None")
         if not current_user.is_authenticated or current_user.role != 'super_admin':
-            print("Access denied - aborting 403")
+            log.warning("Access denied to %s", f.__name__,
+                        extra={'user_id': getattr(current_user, 'id', None), 'view': f.__name__})
             abort(403)
-        print("Access granted")
+        granted_log.info("Access granted to %s", f.__name__,
+                         extra={'user_id': current_user.id, 'view': f.__name__})
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -0,0 +1,192 @@
+# app/instrumentation.py
+"""Per-request database instrumentation.
+
+SQLAlchemy ``before/after_cursor_execute`` events time every statement run
+inside a request and add it to a small tally on ``flask.g``. When the
+request finishes (Flask's ``request_finished`` signal) the tally feeds
+per-endpoint histograms in the metrics registry (app/metrics.py): request
+duration, statements per request and DB time per request, plus the slowest
+statement seen per endpoint.
+
+Statements are grouped by *shape*: the SQL text with bound parameters,
+literals and ``IN``/``VALUES`` lists collapsed. The same shape run
+``DB_N_PLUS_ONE_THRESHOLD`` or more times in one request is reported as a
+likely N+1 pattern (a counter plus a warning in the ``app.db`` log). With
+``SLOW_REQUEST_THRESHOLD`` set, requests slower than that many seconds are
+logged to ``app.slow_requests`` with their query summary.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter as Tally
+
+from flask import current_app, g, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import COUNT_BUCKETS
+
+db_log = logging.getLogger('app.db')
+slow_log = logging.getLogger('app.slow_requests')
+
+# Requests that matched no route share one label instead of one per URL.
+UNMATCHED = '<unmatched>'
+
+_PARAM = re.compile(r"%\(\w+\)s|%s|\?|:\w+|\$\d+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(?:\(\?\)\s*,\s*)+\(\?\)")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """``statement`` with parameters and literals replaced by ``?`` and lists collapsed."""
+    shape = _PARAM.sub('?', statement)
+    shape = _LITERAL.sub('?', shape)
+    shape = _LIST.sub('(?)', shape)
+    shape = _ROWS.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class RequestQueries:
+    """What one request did to the database."""
+
+    __slots__ = ('count', 'seconds', 'slowest', 'slowest_statement', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.statements = Tally()  # statement text -> runs; shaped once at the end
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if seconds > self.slowest:
+            self.slowest = seconds
+            self.slowest_statement = statement
+
+    def repeated(self, threshold):
+        """``[(shape, runs)]`` for shapes run at least ``threshold`` times, most first."""
+        shapes = Tally()
+        for statement, runs in self.statements.items():
+            shapes[statement_shape(statement)] += runs
+        return [(shape, runs) for shape, runs in shapes.most_common() if runs >= threshold]
+
+
+class _InstrumentationState:
+    def __init__(self, registry):
+        self.slowest = {}  # endpoint -> (seconds, statement shape)
+        self.lock = threading.Lock()
+        self.requests = registry.counter(
+            'http_requests_total', 'Requests handled, by endpoint, method and status.',
+            ('endpoint', 'method', 'status'))
+        self.duration = registry.histogram(
+            'http_request_duration_seconds', 'Time from request start to response.', ('endpoint',))
+        self.queries = registry.histogram(
+            'db_queries_per_request', 'SQL statements executed per request.', ('endpoint',),
+            buckets=COUNT_BUCKETS)
+        self.db_time = registry.histogram(
+            'db_time_per_request_seconds', 'Time spent in SQL statements per request.', ('endpoint',))
+        self.slowest_gauge = registry.gauge(
+            'db_slowest_statement_seconds', 'Slowest single statement seen, per endpoint.', ('endpoint',))
+        self.n_plus_one = registry.counter(
+            'db_n_plus_one_total', 'Requests that repeated one statement shape past the threshold.',
+            ('endpoint',))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'db_queries' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started or not has_request_context() or 'db_queries' not in g:
+        return
+    g.db_queries.record(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get('query_started') \
+        if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _register_engine_events():
+    for name, fn in (('before_cursor_execute', _before_cursor_execute),
+                     ('after_cursor_execute', _after_cursor_execute),
+                     ('handle_error', _handle_error)):
+        if not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+
+
+def _request_started(sender, **extra):
+    g.db_queries = RequestQueries()
+    g.request_started_at = time.perf_counter()
+
+
+def _request_finished(sender, response, **extra):
+    queries = g.pop('db_queries', None)
+    started = g.pop('request_started_at', None)
+    if queries is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    state = current_app.extensions['db_instrumentation']
+    config = current_app.config
+    endpoint = request.endpoint or UNMATCHED
+
+    state.requests.inc(endpoint, request.method, response.status_code)
+    state.duration.observe(endpoint, value=elapsed)
+    state.queries.observe(endpoint, value=queries.count)
+    state.db_time.observe(endpoint, value=queries.seconds)
+    if queries.slowest_statement is not None:
+        with state.lock:
+            if queries.slowest > state.slowest.get(endpoint, (0.0, None))[0]:
+                state.slowest[endpoint] = (queries.slowest, statement_shape(queries.slowest_statement))
+        state.slowest_gauge.set_max(endpoint, value=queries.slowest)
+
+    repeated = queries.repeated(config['DB_N_PLUS_ONE_THRESHOLD'])
+    if repeated:
+        state.n_plus_one.inc(endpoint)
+        shape, times = repeated[0]
+        db_log.warning("Possible N+1 in %s: %d runs of %s", endpoint, times, shape[:500])
+
+    threshold = config['SLOW_REQUEST_THRESHOLD']
+    if threshold is not None and elapsed >= threshold:
+        slow_log.warning("Slow request %s %s (%s): %.3fs, %d queries, %.3fs in DB",
+                         request.method, request.path, endpoint, elapsed, queries.count, queries.seconds)
+
+    if config['DB_QUERY_HEADERS']:
+        response.headers['X-DB-Queries'] = str(queries.count)
+        response.headers['X-DB-Time'] = f'{queries.seconds:.6f}'
+
+
+class DBInstrumentation:
+    """Flask extension wiring engine events and request signals to the metrics registry."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DB_N_PLUS_ONE_THRESHOLD', 10)
+        app.config.setdefault('SLOW_REQUEST_THRESHOLD', None)  # seconds; None disables the log
+        app.config.setdefault('DB_QUERY_HEADERS', False)  # X-DB-Queries / X-DB-Time on responses
+        app.extensions['db_instrumentation'] = _InstrumentationState(app.extensions['metrics'])
+        request_started.connect(_request_started, app)
+        request_finished.connect(_request_finished, app)
+        _register_engine_events()
+
+    def slowest(self):
+        """``{endpoint: {'seconds', 'statement'}}`` for the slowest statement per endpoint."""
+        state = current_app.extensions['db_instrumentation']
+        with state.lock:
+            items = sorted(state.slowest.items(), key=lambda item: -item[1][0])
+        return {endpoint: {'seconds': round(seconds, 6), 'statement': shape}
+                for endpoint, (seconds, shape) in items}
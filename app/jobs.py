@@ -0,0 +1,410 @@
+# app/jobs.py
+"""Background jobs queued in Postgres and run by ``flask jobs worker``.
+
+Heavy work (bulk imports, thumbnail rendering, validating large diagrams)
+is queued as a row in ``job`` instead of running inside the request that
+asked for it. The request answers 202 with ``Location: /api/jobs/<id>``;
+the client polls that for progress and the result.
+
+Workers claim the next due job, highest ``priority`` first, with
+``UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED LIMIT 1)``, so
+any number of worker threads and processes, on any number of hosts, share
+the queue without handing out a job twice or waiting on each other's locks.
+There is no broker: an idle worker polls every ``JOBS_POLL_SECONDS``.
+
+A claim is a lease of ``JOBS_LEASE_SECONDS``, renewed by a heartbeat thread
+in the worker process and on every progress report. A worker that dies stops
+renewing; once its leases expire any worker puts those jobs back in the
+queue (or fails them if they are out of attempts). Every later write checks
+that the lease is still held, so a worker that was merely stalled cannot
+overwrite the result of the worker that took over.
+
+A handler that raises is retried with exponential backoff
+(``JOBS_BACKOFF_SECONDS`` doubling per attempt, capped at
+``JOBS_BACKOFF_MAX_SECONDS``) until ``max_attempts``; raising ``JobFailed``
+fails the job at once. Handlers should be idempotent: a job whose worker
+died mid-run is run again from the start. Job bookkeeping uses its own
+short transactions, separate from ``db.session``, so reporting progress
+never commits half of a handler's work.
+
+Handlers are registered with ``@handler('kind')`` (see
+app/services/tasks.py) and called as ``fn(payload, job)``. An ``on_failure``
+hook runs once a job has failed for good, whether its handler gave up or
+its last worker died, e.g. to remove files staged for it.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+log = logging.getLogger('app.jobs')
+
+HANDLERS = {}
+FAILURE_HOOKS = {}
+MAX_PRIORITY = 100
+
+_NOW = "timezone('utc', now())"
+
+_CLAIM = text(f"""
+    UPDATE job
+    SET status = 'running', attempts = attempts + 1, locked_by = :worker,
+        lease_until = {_NOW} + make_interval(secs => :lease), started_at = {_NOW}
+    WHERE id = (
+        SELECT id FROM job
+        WHERE status = 'queued' AND run_after <= {_NOW} AND kind = ANY(:kinds)
+        ORDER BY priority DESC, run_after, id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+""")
+_HEARTBEAT = text(f"""
+    UPDATE job SET lease_until = {_NOW} + make_interval(secs => :lease)
+    WHERE id = ANY(:ids) AND locked_by = :worker AND status = 'running'
+""")
+_PROGRESS = text(f"""
+    UPDATE job
+    SET progress = COALESCE(:progress, progress), message = COALESCE(:message, message),
+        lease_until = {_NOW} + make_interval(secs => :lease)
+    WHERE id = :id AND locked_by = :worker AND status = 'running'
+""")
+_SUCCEED = text(f"""
+    UPDATE job
+    SET status = 'succeeded', result = CAST(:result AS jsonb), progress = 1, error = NULL,
+        locked_by = NULL, lease_until = NULL, finished_at = {_NOW}
+    WHERE id = :id AND locked_by = :worker AND status = 'running'
+""")
+# Retried after backoff * 2^(attempt - 1) seconds, capped, with +-25% jitter against retry storms.
+_RETRY_OR_FAIL = """
+    status = CASE WHEN {retry} AND attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+    run_after = {now} + make_interval(secs => least(:backoff * 2 ^ (attempts - 1), :backoff_max)
+                                             * (0.75 + random() / 2)),
+    finished_at = CASE WHEN {retry} AND attempts < max_attempts THEN NULL ELSE {now} END,
+    locked_by = NULL, lease_until = NULL
+"""
+_FAIL = text(f"""
+    UPDATE job
+    SET error = :error, {_RETRY_OR_FAIL.format(retry=':retry', now=_NOW)}
+    WHERE id = :id AND locked_by = :worker AND status = 'running'
+    RETURNING status
+""")
+_EXPIRE = text(f"""
+    UPDATE job
+    SET error = 'Lease of worker ' || locked_by || ' expired.', {_RETRY_OR_FAIL.format(retry='true', now=_NOW)}
+    WHERE id IN (
+        SELECT id FROM job
+        WHERE status = 'running' AND lease_until < {_NOW}
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, status
+""")
+
+
+class JobError(ValueError):
+    """A job cannot be queued as asked."""
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job without retrying."""
+
+
+class LeaseLost(Exception):
+    """This worker's lease expired and the job may be running elsewhere."""
+
+
+def handler(kind, on_failure=None):
+    """Register ``fn(payload, job)`` as the handler of ``kind`` jobs.
+
+    ``on_failure(payload)`` is called once a job of this kind has finally failed.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        if on_failure is not None:
+            FAILURE_HOOKS[kind] = on_failure
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, priority=0, user_id=None, max_attempts=None, delay=0):
+    """Add a job to the session; it is claimable once the caller commits."""
+    from app import db
+    from app.models.job import Job
+
+    if kind not in HANDLERS:
+        raise JobError(f"Unknown job kind {kind!r}.")
+    if not isinstance(priority, int) or not -MAX_PRIORITY <= priority <= MAX_PRIORITY:
+        raise JobError(f"priority must be an integer from -{MAX_PRIORITY} to {MAX_PRIORITY}.")
+    job = Job(kind=kind, payload=payload or {}, priority=priority, created_by=user_id,
+              max_attempts=max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+              # The database clock, like every lease and backoff comparison.
+              run_after=db.func.timezone('utc', db.func.now()) + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.flush()
+    current_app.extensions['jobs'].enqueued.inc(kind)
+    return job
+
+
+def job_status(job):
+    """The JSON shape of a job for ``/api/jobs/<id>``."""
+    iso = lambda value: value.isoformat() if value else None
+    return {
+        'id': job.id, 'kind': job.kind, 'status': job.status, 'priority': job.priority,
+        'progress': job.progress, 'message': job.message, 'result': job.result, 'error': job.error,
+        'attempts': job.attempts, 'max_attempts': job.max_attempts,
+        'created_at': iso(job.created_at), 'started_at': iso(job.started_at),
+        'finished_at': iso(job.finished_at),
+        'retry_at': iso(job.run_after) if job.status == 'queued' and job.attempts else None,
+    }
+
+
+class JobContext:
+    """What a handler gets besides its payload: the job's identity and progress reporting."""
+
+    def __init__(self, worker, row):
+        self.worker = worker
+        self.id = row.id
+        self.kind = row.kind
+        self.attempt = row.attempts
+        self.max_attempts = row.max_attempts
+
+    def progress(self, fraction=None, message=None):
+        """Record progress (0-1) and/or a status line; renews the lease.
+
+        Raises LeaseLost if another worker has taken the job over.
+        """
+        if fraction is not None:
+            fraction = min(max(float(fraction), 0.0), 1.0)
+        if not self.worker.write(_PROGRESS, id=self.id, progress=fraction, message=message):
+            raise LeaseLost(f"Job {self.id} was taken over by another worker.")
+
+
+class Worker:
+    """Runs jobs from the queue on ``threads`` threads of this process."""
+
+    def __init__(self, app, threads=1, name=None):
+        self.app = app
+        self.threads = threads
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.running = set()
+        self.finished = app.extensions['jobs'].finished
+
+    @property
+    def config(self):
+        return self.app.config
+
+    def write(self, stmt, **params):
+        """Run a bookkeeping statement in its own transaction; the number of rows it matched."""
+        from app import db
+
+        params.update(worker=self.name, lease=self.config['JOBS_LEASE_SECONDS'])
+        with db.engine.begin() as conn:
+            return conn.execute(stmt, params).rowcount
+
+    def expire_leases(self):
+        """Requeue (or fail) jobs whose worker stopped renewing its lease."""
+        from app import db
+
+        with db.engine.begin() as conn:
+            rows = conn.execute(_EXPIRE, {'backoff': self.config['JOBS_BACKOFF_SECONDS'],
+                                          'backoff_max': self.config['JOBS_BACKOFF_MAX_SECONDS']}).all()
+        for row in rows:
+            log.warning("Job %s lease expired; now %s", row.id, row.status)
+            if row.status == 'failed':
+                self._failed(row.id, row.kind, row.payload)
+        return len(rows)
+
+    def _failed(self, job_id, kind, payload):
+        hook = FAILURE_HOOKS.get(kind)
+        if hook is None:
+            return
+        try:
+            hook(payload)
+        except Exception:
+            log.exception("Job %s (%s) failure hook raised", job_id, kind)
+
+    def claim(self):
+        from app import db
+
+        with db.engine.begin() as conn:
+            return conn.execute(_CLAIM, {'worker': self.name, 'lease': self.config['JOBS_LEASE_SECONDS'],
+                                         'kinds': sorted(HANDLERS)}).first()
+
+    def run_one(self):
+        """Claim and run one due job in this thread; False if none was due."""
+        with self.app.app_context():
+            row = self.claim()
+            if row is None:
+                return False
+            with self.lock:
+                self.running.add(row.id)
+            try:
+                self._run(row)
+            finally:
+                with self.lock:
+                    self.running.discard(row.id)
+            return True
+
+    def _run(self, row):
+        from app import db
+
+        log.info("Job %s (%s) attempt %s/%s started", row.id, row.kind, row.attempts, row.max_attempts)
+        backoff = {'backoff': self.config['JOBS_BACKOFF_SECONDS'],
+                   'backoff_max': self.config['JOBS_BACKOFF_MAX_SECONDS']}
+        try:
+            result = HANDLERS[row.kind](row.payload, JobContext(self, row))
+            db.session.commit()
+        except LeaseLost:
+            db.session.rollback()
+            log.warning("Job %s: lease lost, abandoning this run", row.id)
+            return
+        except JobFailed as e:
+            db.session.rollback()
+            if self.write(_FAIL, id=row.id, error=str(e), retry=False, **backoff):
+                self._failed(row.id, row.kind, row.payload)
+            self.finished.inc(row.kind, 'failed')
+            log.info("Job %s failed: %s", row.id, e)
+            return
+        except Exception as e:
+            db.session.rollback()
+            log.exception("Job %s (%s) raised", row.id, row.kind)
+            error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+            if self.write(_FAIL, id=row.id, error=error, retry=True, **backoff) \
+                    and row.attempts >= row.max_attempts:
+                self._failed(row.id, row.kind, row.payload)
+            self.finished.inc(row.kind, 'error')
+            return
+        finally:
+            db.session.remove()
+        if self.write(_SUCCEED, id=row.id, result=json.dumps(result)):
+            self.finished.inc(row.kind, 'succeeded')
+            log.info("Job %s succeeded", row.id)
+        else:
+            log.warning("Job %s finished after its lease was lost; result dropped", row.id)
+
+    def _loop(self):
+        poll = self.config['JOBS_POLL_SECONDS']
+        while not self.stopping.is_set():
+            try:
+                if self.run_one():
+                    continue
+            except Exception:
+                log.exception("Job worker %s could not reach the queue", self.name)
+            self.stopping.wait(poll)
+
+    def _heartbeat(self):
+        # Renew at a third of the lease, so one missed beat is survivable.
+        interval = self.config['JOBS_LEASE_SECONDS'] / 3
+        while not self.stopping.wait(interval):
+            try:
+                with self.app.app_context():
+                    with self.lock:
+                        ids = list(self.running)
+                    if ids:
+                        self.write(_HEARTBEAT, ids=ids)
+                    self.expire_leases()
+            except Exception:
+                log.exception("Job worker %s heartbeat failed", self.name)
+
+    def run(self):
+        """Run until ``stop()``; jobs in progress are finished first."""
+        log.info("Job worker %s running %s thread(s) for: %s",
+                 self.name, self.threads, ', '.join(sorted(HANDLERS)))
+        with self.app.app_context():
+            self.expire_leases()
+        threads = [threading.Thread(target=self._heartbeat, name='jobs-heartbeat', daemon=True)]
+        threads += [threading.Thread(target=self._loop, name=f'jobs-{i}') for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+
+    def stop(self, *_):
+        self.stopping.set()
+
+
+def _run_process(app, threads, name):
+    from app.server import after_fork
+
+    after_fork(app)
+    worker = Worker(app, threads, name=name)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def run_workers(app, processes=1, threads=1):
+    """Run ``Worker``s until SIGTERM/SIGINT; with ``processes`` > 1, one per forked process.
+
+    Processes suit CPU-bound handlers (image rendering, validation), threads
+    I/O-bound ones. A forked worker that exits is replaced.
+    """
+    if processes <= 1:
+        worker = Worker(app, threads)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.run()
+        return
+    context = multiprocessing.get_context('fork')
+    stopping = threading.Event()
+    children = {}
+
+    def spawn(slot):
+        name = f'{socket.gethostname()}:{os.getpid()}.{slot}'
+        child = context.Process(target=_run_process, args=(app, threads, name), name=f'jobs-{slot}')
+        child.start()
+        children[slot] = child
+
+    def stop(*_):
+        stopping.set()
+        for child in children.values():
+            if child.is_alive():
+                child.terminate()  # SIGTERM: finish the current jobs, then exit
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(processes):
+        spawn(slot)
+    while not stopping.wait(1):
+        for slot, child in list(children.items()):
+            if not child.is_alive():
+                log.warning("Job worker process %s exited with %s; restarting", child.name, child.exitcode)
+                spawn(slot)
+    for child in children.values():
+        child.join()
+
+
+class _JobsState:
+    def __init__(self, registry):
+        self.enqueued = registry.counter('jobs_enqueued_total', 'Background jobs queued.', ('kind',))
+        self.finished = registry.counter(
+            'jobs_finished_total', 'Background job runs by outcome (error: will be retried).',
+            ('kind', 'status'))
+
+
+class JobQueue:
+    """Flask extension with the job queue settings."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_PROCESSES', 1)
+        app.config.setdefault('JOBS_THREADS', 2)
+        app.config.setdefault('JOBS_LEASE_SECONDS', 60)
+        app.config.setdefault('JOBS_POLL_SECONDS', 1.0)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_BACKOFF_SECONDS', 10)
+        app.config.setdefault('JOBS_BACKOFF_MAX_SECONDS', 3600)
+        app.extensions['jobs'] = _JobsState(app.extensions['metrics'])
@@ -0,0 +1,266 @@
+# app/logs.py
+"""Structured logging off the request thread.
+
+Records from the ``app`` logger tree go through a ``QueueHandler``: the
+calling thread only runs two filters (per-logger sampling, then copying the
+request id and other request fields onto the record) and a non-blocking
+``put``. A ``QueueListener`` thread formats the records (one JSON object per
+line, or plain text) and writes them to stderr. When the queue is full,
+records are dropped and counted instead of blocking the request.
+
+Every request gets an id (the incoming ``X-Request-ID`` when it looks sane,
+else a fresh one), echoed in the response header and on every record logged
+while handling it. ``app.access`` gets one line per request with its status,
+duration and database time.
+
+``LOG_SAMPLE_RATES`` maps a logger name (or prefix) to the fraction of its
+records to keep; sampling is deterministic (every Nth record) and kept
+records carry ``sample_rate`` so counts can be scaled back up.
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import current_app, g, has_request_context, request
+
+ROOT_LOGGER = 'app'
+access_log = logging.getLogger('app.access')
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``.
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records per logger, from ``{name or prefix: rate}``."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {}
+        for name, rate in (rates or {}).items():
+            self.rates[name] = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _every(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        every = self._every(record.name)
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        counter = self._counters.get(record.name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(record.name, itertools.count())
+        if next(counter) % every:
+            return False
+        record.sample_rate = 1 / every
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    """Copy request fields onto the record while still on the request thread."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            if not hasattr(record, 'path'):
+                record.method = request.method
+                record.path = request.path
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, state):
+        super().__init__(state.queue)
+        self.state = state
+
+    def prepare(self, record):
+        # Leave formatting to the listener; only resolve the message so args
+        # (which may be request-bound objects) never cross threads.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.state.ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.state.dropped += 1
+
+
+class _OutputHandler(logging.StreamHandler):
+    """Writes to ``state.stream``, or whatever ``sys.stderr`` is at the time."""
+
+    def __init__(self, state):
+        logging.Handler.__init__(self)
+        self.state = state
+
+    @property
+    def stream(self):
+        return self.state.stream or sys.stderr
+
+
+class _LoggingState:
+    def __init__(self, maxsize, formatter):
+        self.queue = queue.Queue(maxsize)
+        self.formatter = formatter
+        self.stream = None  # None: stderr
+        self.listener = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def ensure_listener(self):
+        # Threads do not survive fork: each server process starts its own.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            output = _OutputHandler(self)
+            output.setFormatter(self.formatter)
+            self.listener = QueueListener(self.queue, output, respect_handler_level=False)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self.pid == os.getpid():
+            self.queue.join()
+
+    def stop(self):
+        with self.lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+
+def _request_id():
+    incoming = request.headers.get('X-Request-ID', '')
+    return incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+def _begin_request():
+    g.request_id = _request_id()
+    g.log_started_at = time.perf_counter()
+
+
+def _finish_request(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    started = g.get('log_started_at')
+    if started is not None and current_app.config['ACCESS_LOG']:
+        queries = g.get('db_queries')  # app/instrumentation.py
+        user = g.get('_login_user')
+        access_log.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'db_queries': queries.count if queries else None,
+                'db_ms': round(queries.seconds * 1000, 2) if queries else None,
+                'user_id': getattr(user, 'id', None),
+                'remote_addr': request.remote_addr,
+            })
+    return response
+
+
+class StructuredLogging:
+    """Flask extension installing the queue-based handler on the ``app`` logger tree."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOG_LEVEL', 'INFO')
+        app.config.setdefault('LOG_FORMAT', 'json')  # or 'text'
+        app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+        app.config.setdefault('LOG_SAMPLE_RATES', {'app.auth.granted': 0.01})
+        app.config.setdefault('ACCESS_LOG', True)
+
+        formatter = JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter()
+        state = _LoggingState(app.config['LOG_QUEUE_SIZE'], formatter)
+        app.extensions['structured_logging'] = state
+
+        handler = _NonBlockingQueueHandler(state)
+        handler.addFilter(SamplingFilter(app.config['LOG_SAMPLE_RATES']))
+        handler.addFilter(RequestContextFilter())
+        logger = logging.getLogger(ROOT_LOGGER)
+        for old in [h for h in logger.handlers if isinstance(h, _NonBlockingQueueHandler)]:
+            logger.removeHandler(old)
+            old.state.stop()
+        logger.addHandler(handler)
+        logger.setLevel(app.config['LOG_LEVEL'])
+
+        app.before_request(_begin_request)
+        app.after_request(_finish_request)
+
+        registry = app.extensions.get('metrics')
+        if registry is not None:
+            dropped = registry.gauge('log_records_dropped', 'Log records dropped because the queue was full.')
+            registry.add_collector(lambda: dropped.set(value=state.dropped))
+
+    @property
+    def _state(self):
+        return current_app.extensions['structured_logging']
+
+    def flush(self):
+        self._state.flush()
+
+    def stop(self):
+        self._state.stop()
@@ -0,0 +1,192 @@
+# app/metrics.py
+"""Process-local Prometheus metrics without a client library.
+
+``Counter``, ``Gauge`` and ``Histogram`` keep one value (or bucket array) per
+label tuple under a lock, and ``MetricsRegistry.render`` writes the text
+exposition format (version 0.0.4). Each server process reports its own
+numbers; the scraper sums across workers.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+from flask import current_app
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; tuned for web requests and the statements they run.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value):
+        yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_max(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            if value > self._values.get(key, -math.inf):
+                self._values[key] = value
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels):
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self, labels, entry):
+        counts, total, count = entry
+        cumulative = 0
+        for bound, hits in zip((*self.buckets, math.inf), counts):
+            cumulative += hits
+            le = _format_labels(self.labelnames, labels, (('le', _format_value(bound)),))
+            yield f'{self.name}_bucket{le} {cumulative}'
+        plain = _format_labels(self.labelnames, labels)
+        yield f'{self.name}_sum{plain} {_format_value(total)}'
+        yield f'{self.name}_count{plain} {count}'
+
+
+class MetricsRegistry:
+    """Named metrics plus callbacks that refresh gauges just before a scrape."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """Call ``fn()`` before every render (e.g. to read pool sizes into gauges)."""
+        if fn not in self._collectors:
+            self._collectors.append(fn)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Flask extension holding the app's ``MetricsRegistry``."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # /metrics answers only these client addresses (scrapers on the host or pod).
+        app.config.setdefault('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+        app.extensions['metrics'] = MetricsRegistry()
+
+    @property
+    def registry(self):
+        return current_app.extensions['metrics']
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,148 @@
+# app/models/diagram.py
+"""Diagram models: a canvas of device nodes, their pins and the edges between pins.
+
+Nodes, pins and edges are addressed by the client-side ids used in the node
+JSON (``node.id``, ``pin.id``, ``edge.id``), scoped to their diagram, so a
+whole diagram can be written with set-based INSERT ... SELECT statements
+without mapping surrogate keys.
+"""
+
+from app import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+class Diagram(db.Model):
+    """A saved canvas owned by one user."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # bumped by every save
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Diagram {self.name} v{self.version}>'
+
+class DiagramNode(db.Model):
+    """A device placed on a diagram."""
+    __tablename__ = 'diagram_node'
+    __table_args__ = (
+        db.UniqueConstraint('diagram_id', 'key', name='uq_diagram_node_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    diagram_id = db.Column(db.Integer, db.ForeignKey('diagram.id', ondelete='CASCADE'), nullable=False)
+    key = db.Column(db.String(128), nullable=False)  # client node id
+    type = db.Column(db.String(64))
+    device_type = db.Column(db.String(64))
+    manufacturer = db.Column(db.String(64))
+    model = db.Column(db.String(128))
+    device_model_id = db.Column(db.Integer, db.ForeignKey('device_model.id'), index=True)  # pin template
+    color = db.Column(db.String(7))
+    x = db.Column(db.Float, nullable=False, default=0)
+    y = db.Column(db.Float, nullable=False, default=0)
+    notes = db.Column(db.Text)
+    thumbnail = db.Column(db.String(255))
+    extra = db.Column(JSONB)  # any other client fields
+
+    def __repr__(self):
+        return f'<DiagramNode {self.key}>'
+
+class DiagramPin(db.Model):
+    """A connector on a node.
+
+    For a node with a device model the rows are overrides of the template:
+    a template pin id overrides that pin, a new id adds a pin and
+    ``removed`` hides a template pin.
+    """
+    __tablename__ = 'diagram_pin'
+    __table_args__ = (
+        db.UniqueConstraint('diagram_id', 'node_key', 'key', name='uq_diagram_pin_key'),
+        db.ForeignKeyConstraint(
+            ['diagram_id', 'node_key'], ['diagram_node.diagram_id', 'diagram_node.key'],
+            ondelete='CASCADE', onupdate='CASCADE'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    diagram_id = db.Column(db.Integer, nullable=False)
+    node_key = db.Column(db.String(128), nullable=False)
+    key = db.Column(db.String(128), nullable=False)  # client pin id
+    ordinal = db.Column(db.Integer, nullable=False, default=0)  # position in the node's pin list
+    label = db.Column(db.String(128))
+    type = db.Column(db.String(16))  # 'input', 'output', 'control', ...
+    spec = db.Column(db.String(64))  # e.g. '12G-SDI'
+    removed = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    def __repr__(self):
+        return f'<DiagramPin {self.node_key}/{self.key}>'
+
+class DiagramEdge(db.Model):
+    """A connection from a source pin to a target pin."""
+    __tablename__ = 'diagram_edge'
+    __table_args__ = (
+        db.UniqueConstraint('diagram_id', 'key', name='uq_diagram_edge_key'),
+        db.ForeignKeyConstraint(
+            ['diagram_id', 'source_node'], ['diagram_node.diagram_id', 'diagram_node.key'],
+            ondelete='CASCADE', onupdate='CASCADE'),
+        db.ForeignKeyConstraint(
+            ['diagram_id', 'target_node'], ['diagram_node.diagram_id', 'diagram_node.key'],
+            ondelete='CASCADE', onupdate='CASCADE'),
+        db.Index('ix_diagram_edge_source', 'diagram_id', 'source_node'),
+        db.Index('ix_diagram_edge_target', 'diagram_id', 'target_node'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    diagram_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(128), nullable=False)  # client edge id
+    source_node = db.Column(db.String(128), nullable=False)
+    source_pin = db.Column(db.String(128))
+    target_node = db.Column(db.String(128), nullable=False)
+    target_pin = db.Column(db.String(128))
+    extra = db.Column(JSONB)  # any other client fields (type, label, ...)
+
+    def __repr__(self):
+        return f'<DiagramEdge {self.key}>'
+
+class DiagramChange(db.Model):
+    """One applied operation in a diagram's change feed (see app/services/sync.py)."""
+    __tablename__ = 'diagram_change'
+    __table_args__ = (
+        db.Index('ix_diagram_change_diagram_version', 'diagram_id', 'version'),
+    )
+    id = db.Column(db.BigInteger, primary_key=True)
+    diagram_id = db.Column(db.Integer, db.ForeignKey('diagram.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)  # diagram version this op produced
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    op = db.Column(db.String(32), nullable=False)
+    payload = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DiagramChange {self.diagram_id} v{self.version} {self.op}>'
+
+class DiagramSnapshot(db.Model):
+    """The whole document of a diagram at one version (see app/services/history.py)."""
+    __tablename__ = 'diagram_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('diagram_id', 'version', name='uq_diagram_snapshot_version'),
+        db.Index('ix_diagram_snapshot_blobs', 'blobs', postgresql_using='gin'),
+    )
+    id = db.Column(db.BigInteger, primary_key=True)
+    diagram_id = db.Column(db.Integer, db.ForeignKey('diagram.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)
+    # Either the document as JSONB (nodes with their effective pins, and edges) or
+    # packed by app/services/packing.py, with the diagram_blob hashes it refers to.
+    document = db.Column(JSONB)
+    packed = db.Column(db.LargeBinary)
+    blobs = db.Column(ARRAY(db.LargeBinary))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DiagramSnapshot {self.diagram_id} v{self.version}>'
+
+class DiagramBlob(db.Model):
+    """A device metadata object or pin list shared by packed snapshots, keyed by its hash."""
+    __tablename__ = 'diagram_blob'
+    hash = db.Column(db.LargeBinary, primary_key=True)  # BLAKE2b-128 of data
+    data = db.Column(db.LargeBinary, nullable=False)  # MessagePack
+    used_at = db.Column(db.DateTime, nullable=False)  # last interned; guards against pruning races
+
+    def __repr__(self):
+        return f'<DiagramBlob {self.hash.hex()}>'
@@ -0,0 +1,37 @@
+# app/models/job.py
+"""Background jobs queued in Postgres (see app/jobs.py)."""
+
+from app import db
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
+
+class Job(db.Model):
+    """One unit of background work and its current state."""
+    __tablename__ = 'job'
+    __table_args__ = (
+        # What a worker claims next: highest priority, then oldest due.
+        db.Index('ix_job_queued', db.text('priority DESC'), 'run_after', 'id',
+                 postgresql_where=db.text("status = 'queued'")),
+        db.Index('ix_job_lease', 'lease_until', postgresql_where=db.text("status = 'running'")),
+    )
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)  # a registered handler
+    payload = db.Column(JSONB, nullable=False, default=dict)
+    priority = db.Column(db.SmallInteger, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False)  # backoff: not claimed before this
+    locked_by = db.Column(db.String(128))  # worker holding the lease
+    lease_until = db.Column(db.DateTime)
+    progress = db.Column(db.Float, nullable=False, default=0)  # 0-1
+    message = db.Column(db.Text)
+    result = db.Column(JSONB)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
@@ -3,9 +3,24 @@
 
 from app import db
 from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+def _pg_trgm_installed(ddl, target, bind, **kw):
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar() is not None
+
+def trigram_index(name, column='name'):
+    """GIN trigram index for typo-tolerant ILIKE / word-similarity search.
+
+    The migrations install pg_trgm; create_all() leaves the index out on a
+    database where the extension is not installed.
+    """
+    index = db.Index(name, column, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+    return index.ddl_if(callable_=_pg_trgm_installed)
 
 class DeviceType(db.Model):
     """Global device type catalog."""
+    __table_args__ = (trigram_index('ix_device_type_name_trgm'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
     color = db.Column(db.String(7), nullable=False, default='#3366FF')  # hex
@@ -18,6 +33,7 @@ class DeviceType(db.Model):
 
 class Manufacturer(db.Model):
     """Global device type catalog."""
+    __table_args__ = (trigram_index('ix_manufacturer_name_trgm'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
     #color = db.Column(db.String(7), nullable=False, default='#3366FF')  # hex
@@ -26,4 +42,35 @@ class Manufacturer(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Manufacturer {self.name}>'
\ No newline at end of file
+        return f'<Manufacturer {self.name}>'
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped by every catalog write (see app/cache.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
+
+class DeviceModel(db.Model):
+    """A manufacturer's device with its pin template (see app/services/device_models.py).
+
+    ``pins`` is a JSONB array of ``[id, label, type, spec]`` arrays; diagram
+    nodes that reference the model store only their pin overrides.
+    """
+    __tablename__ = 'device_model'
+    __table_args__ = (
+        db.UniqueConstraint('manufacturer_id', 'name', name='uq_device_model_manufacturer_name'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), nullable=False)
+    manufacturer_id = db.Column(db.Integer, db.ForeignKey('manufacturer.id', ondelete='CASCADE'), nullable=False)
+    device_type_id = db.Column(db.Integer, db.ForeignKey('device_type.id', ondelete='SET NULL'), index=True)
+    color = db.Column(db.String(7))  # hex; falls back to the device type's
+    thumbnail = db.Column(db.String(128))  # filename
+    pins = db.Column(JSONB, nullable=False, default=list)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DeviceModel {self.name}>'
@@ -1,9 +1,14 @@
 # app/models/user.py
 """User model for authentication and roles."""
 
+import secrets
+
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from sqlalchemy import select
+from app import db, password_hasher
+
+def new_session_token():
+    return secrets.token_hex(6)
 
 class User(db.Model, UserMixin):
     """User account in the system."""
@@ -11,14 +16,59 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(64), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default='user')  # 'user' or 'super_admin'
+    # Part of every session id; replaced when the password changes.
+    session_token = db.Column(db.String(12), nullable=False, default=new_session_token)
 
     def set_password(self, password):
-        """Hash and store the password."""
-        self.password_hash = generate_password_hash(password)
+        """Hash and store a new password, ending other sessions (in the hashing pool; may raise HasherBusy)."""
+        self.password_hash = password_hasher.hash(password)
+        self.session_token = new_session_token()
+
+    def rehash_password(self, password):
+        """Re-hash the unchanged password with the current parameters; sessions stay valid."""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Verify password."""
-        return check_password_hash(self.password_hash, password)
+        """Verify password (in the hashing pool; may raise HasherBusy)."""
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash predates the configured hash parameters."""
+        return password_hasher.needs_rehash(self.password_hash)
+
+    def get_id(self):
+        """Session id ``"<id>:<session token>"``; a password change invalidates old sessions."""
+        return f'{self.id}:{self.session_token}'
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+class UserIdentity(UserMixin):
+    """Detached, read-only view of a User used as ``current_user``.
+
+    Holds only what request handling needs, so it can be cached across
+    requests without touching the ``user`` table.
+    """
+
+    def __init__(self, id, username, role, session_token):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.session_token = session_token
+
+    def get_id(self):
+        return f'{self.id}:{self.session_token}'
+
+    @classmethod
+    def load(cls, user_id):
+        """Read one identity with a single primary-key query, or None."""
+        row = db.session.execute(
+            select(User.id, User.username, User.role, User.session_token)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        return cls(row.id, row.username, row.role, row.session_token)
 
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<UserIdentity {self.username}>'
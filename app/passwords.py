@@ -0,0 +1,194 @@
+# app/passwords.py
+"""Password hashing off the request thread, plus per-username login throttling.
+
+``PasswordHasher`` runs Werkzeug's hash/verify in a small process pool. The
+number of in-flight jobs is capped; past the cap callers get ``HasherBusy``
+immediately instead of queueing behind a login burst; a job that outlives
+``PASSWORD_HASH_TIMEOUT`` or a crashed pool also ends in ``HasherBusy`` (the
+pool is then replaced). ``LoginThrottle``
+rejects a username after repeated failures before any hashing happens.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash,
+)
+
+from app.cache import TTLCache
+
+log = logging.getLogger('app.passwords')
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is full, too slow or broken; the caller should retry later."""
+
+
+def _generate(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def canonical_method(method):
+    """Expand a short method name to the prefix Werkzeug writes into the hash."""
+    if method == 'scrypt':
+        return 'scrypt:32768:8:1'
+    if method in ('pbkdf2', 'pbkdf2:sha256'):
+        return f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+class _HasherState:
+    def __init__(self, method, workers, max_pending, timeout):
+        self.method = canonical_method(method)
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def executor(self):
+        # Created lazily and per process, so forked server workers get their own pool.
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                self.pid = os.getpid()
+            return self.pool
+
+    def discard(self, pool):
+        """Drop a broken pool; the next job starts a new one."""
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None and self.pid == os.getpid():
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+class PasswordHasher:
+    """Flask extension running password hash work in a bounded process pool."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 16)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+        app.extensions['password_hasher'] = _HasherState(
+            method=app.config['PASSWORD_HASH_METHOD'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+            timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+        )
+
+    @property
+    def _state(self):
+        return current_app.extensions['password_hasher']
+
+    def _run(self, fn, *args):
+        state = self._state
+        if not state.slots.acquire(blocking=False):
+            raise HasherBusy()
+        if state.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                state.slots.release()
+        pool = state.executor()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            state.slots.release()
+            state.discard(pool)
+            raise HasherBusy("Password hashing pool crashed.") from None
+        # The slot is held until the job is done, even by a caller that stopped waiting.
+        future.add_done_callback(lambda _: state.slots.release())
+        try:
+            return future.result(timeout=state.timeout)
+        except TimeoutError:
+            future.cancel()
+            log.warning("Password hashing took longer than %ss", state.timeout)
+            raise HasherBusy("Password hashing timed out.") from None
+        except BrokenProcessPool:
+            log.warning("Password hashing pool crashed; starting a new one")
+            state.discard(pool)
+            raise HasherBusy("Password hashing pool crashed.") from None
+
+    def hash(self, password):
+        return self._run(_generate, password, self._state.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when ``pwhash`` was made with other parameters than configured."""
+        return pwhash.split('$', 1)[0] != self._state.method
+
+    def shutdown(self):
+        self._state.shutdown()
+
+
+class LoginThrottle:
+    """Per-username failed-login counter over a sliding window."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOGIN_THROTTLE_ATTEMPTS', 5)
+        app.config.setdefault('LOGIN_THROTTLE_WINDOW', 300)
+        app.config.setdefault('LOGIN_THROTTLE_MAX_USERNAMES', 10000)
+        window = app.config['LOGIN_THROTTLE_WINDOW']
+        app.extensions['login_throttle'] = TTLCache(
+            maxsize=app.config['LOGIN_THROTTLE_MAX_USERNAMES'], ttl=window,
+        )
+
+    @property
+    def _failures(self):
+        return current_app.extensions['login_throttle']
+
+    def _recent(self, username, now):
+        window = current_app.config['LOGIN_THROTTLE_WINDOW']
+        attempts = self._failures.get(username.lower())
+        if attempts is None:
+            return deque()
+        while attempts and attempts[0] <= now - window:
+            attempts.popleft()
+        return attempts
+
+    def retry_after(self, username):
+        """Seconds until ``username`` may try again, or 0 if not throttled."""
+        now = time.monotonic()
+        attempts = self._recent(username, now)
+        if len(attempts) < current_app.config['LOGIN_THROTTLE_ATTEMPTS']:
+            return 0
+        window = current_app.config['LOGIN_THROTTLE_WINDOW']
+        return max(1, int(attempts[0] + window - now) + 1)
+
+    def record_failure(self, username):
+        now = time.monotonic()
+        attempts = self._recent(username, now)
+        attempts.append(now)
+        self._failures.set(username.lower(), attempts)
+
+    def reset(self, username):
+        self._failures.pop(username.lower())
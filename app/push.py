@@ -0,0 +1,380 @@
+# app/push.py
+"""Live diagram changes pushed to browsers as server-sent events.
+
+``GET /api/diagrams/<id>/events`` is an ``EventSource`` stream. Every
+transaction that appends to a diagram's change feed also runs
+``pg_notify('diagram_changes', '<diagram id>:<version>')``. Postgres delivers
+the notification when (and only if) the transaction commits, to every
+listening connection, so each server process hears about changes made by
+all the others.
+
+Each process runs two threads, started on first use (threads do not survive
+gunicorn's fork):
+
+* the listener holds a dedicated connection with ``LISTEN diagram_changes``
+  and marks the diagrams it is told about as changed;
+* the pump wakes at most once per ``PUSH_TICK_SECONDS``, reads the new ops of
+  each changed diagram once, however many clients watch it, coalesces them
+  (a node dragged through thirty positions becomes one ``move_node``) and
+  hands the frame to every subscriber. A client therefore gets at most one
+  frame per tick.
+
+Subscribers buffer at most ``PUSH_QUEUE_FRAMES`` frames. A client that cannot
+keep up is never waited for: its buffer is replaced by a single ``resync``
+event and it catches up through ``/changes?since=``. ``changes`` frames carry
+the diagram version as their event id, so a reconnecting ``EventSource``
+resumes from ``Last-Event-ID``; clients skip ops at or below the version they
+already have.
+
+A stream holds a server thread until it ends after ``PUSH_STREAM_SECONDS``
+and the browser reconnects. Under gthread both that and the per-process cap
+``PUSH_MAX_SUBSCRIBERS`` default to what leaves most threads to ordinary
+requests (see ``push_limits`` in app/server.py); past the cap clients get a
+503 and poll ``/changes``. With many watchers, run the gevent worker model.
+
+LISTEN needs a real server session: behind pgbouncer in transaction mode,
+point ``PUSH_LISTEN_URL`` at Postgres itself. The listener uses psycopg2's
+notification API.
+"""
+
+import collections
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import create_engine, func
+from sqlalchemy.pool import NullPool
+
+CHANNEL = 'diagram_changes'
+log = logging.getLogger('app.push')
+
+
+def notify_change(diagram_id, version):
+    """Announce a new diagram version; Postgres sends it at COMMIT."""
+    from app import db
+
+    db.session.execute(db.select(func.pg_notify(CHANNEL, f'{diagram_id}:{version}')))
+
+
+def coalesce(changes):
+    """Drop the ops in ``changes`` that a later one makes redundant.
+
+    Everything before the last ``replace`` goes (the client reloads anyway),
+    and a ``move_node`` goes when the same node moves again later with no
+    other op touching it in between.
+    """
+    from app.services.sync import op_keys
+
+    for i in range(len(changes) - 1, -1, -1):
+        if changes[i]['op'] == 'replace':
+            changes = changes[i:]
+            break
+    kept, moved = [], set()
+    for change in reversed(changes):
+        if change['op'] == 'move_node':
+            if change['node'] in moved:
+                continue
+            moved.add(change['node'])
+        else:
+            moved -= {key for kind, key in op_keys(change) if kind == 'node'}
+        kept.append(change)
+    kept.reverse()
+    return kept
+
+
+def load_frame(diagram_id, since, until=None):
+    """``(version, changes)`` for the feed after ``since`` (up to ``until``).
+
+    ``(None, None)`` when there is nothing new; ``changes`` is None when
+    there are too many for one frame, or the start was pruned, and the
+    client should resync.
+    """
+    from app import db
+    from app.models.diagram import Diagram
+    from app.services.sync import CHANGE_FEED_LIMIT, changes_since
+
+    changes = changes_since(diagram_id, since, limit=CHANGE_FEED_LIMIT + 1)
+    if until is not None:
+        changes = [c for c in changes if c['version'] <= until]
+    if not changes:
+        return None, None
+    if len(changes) > CHANGE_FEED_LIMIT or changes[0]['version'] != since + 1:  # too many, or pruned
+        version = until if until is not None else db.session.execute(
+            db.select(Diagram.version).where(Diagram.id == diagram_id)).scalar()
+        return version, None
+    return changes[-1]['version'], coalesce(changes)
+
+
+def format_event(event, version, changes):
+    """One frame in the ``text/event-stream`` format."""
+    if event == 'resync':
+        # No id: a reconnect must still resume from the last frame applied.
+        return f'event: resync\ndata: {json.dumps({"version": version})}\n\n'
+    data = json.dumps({'version': version, 'changes': changes}, separators=(',', ':'))
+    return f'id: {version}\nevent: changes\ndata: {data}\n\n'
+
+
+class Subscriber:
+    """One client's stream: the frames queued for it and the version they reach."""
+
+    def __init__(self, diagram_id, version, max_frames):
+        self.diagram_id = diagram_id
+        self.start = version  # the stream's own catch-up goes up to here
+        self.version = version
+        self.max_frames = max_frames
+        self.frames = collections.deque()
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def offer(self, since, version, changes):
+        """Queue the ops in ``(since, version]``; return the event queued, if any.
+
+        ``changes=None`` asks for a resync. So does a gap before ``since`` or
+        a full buffer; the resync replaces everything queued and absorbs
+        later frames until the client takes it.
+        """
+        with self.lock:
+            if version <= self.version:
+                return None
+            if changes is None or since > self.version or len(self.frames) >= self.max_frames or \
+                    (self.frames and self.frames[-1][0] == 'resync'):
+                # A pending resync covers everything after it too.
+                self.frames.clear()
+                self.frames.append(('resync', version, None))
+            else:
+                self.frames.append(('changes', version, [c for c in changes if c['version'] > self.version]))
+            self.version = version
+            self.ready.set()
+            return self.frames[-1][0]
+
+    def get(self, timeout):
+        """The next ``(event, version, changes)``, or None after ``timeout`` seconds."""
+        if not self.ready.wait(timeout):
+            return None
+        with self.lock:
+            frame = self.frames.popleft()
+            if not self.frames:
+                self.ready.clear()
+            return frame
+
+
+class _Channel:
+    def __init__(self, version):
+        self.version = version  # frames have been built up to here
+        self.subscribers = set()
+
+
+class PushHub:
+    """This process's subscribers, its LISTEN connection and the pump feeding them."""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.channels = {}
+        self.dirty = set()
+        self.cond = threading.Condition()
+        self.lock = threading.Lock()
+        self.pid = None
+        self.stopping = False
+        self.frames_sent = registry.counter(
+            'push_frames_total', 'Frames queued for live diagram streams.', ('event',))
+        self.notifications = registry.counter(
+            'push_notifications_total', 'Diagram change notifications received.')
+
+    @property
+    def config(self):
+        return self.app.config
+
+    def subscriber_count(self):
+        with self.cond:
+            return sum(len(c.subscribers) for c in self.channels.values())
+
+    def ensure_threads(self):
+        # Threads do not survive fork: each server process starts its own.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.stopping = False
+            with self.cond:
+                self.channels.clear()
+                self.dirty.clear()
+            for target, name in ((self._listen, 'push-listener'), (self._pump, 'push-pump')):
+                threading.Thread(target=target, name=name, daemon=True).start()
+            self.pid = os.getpid()
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            self.pid = None
+            with self.cond:
+                self.cond.notify_all()
+
+    def subscribe(self, diagram_id, since, current):
+        """Watch a diagram from version ``since``; None when this process is full.
+
+        ``current`` is the version just read from the database. Ops up to the
+        subscriber's ``start`` are the stream's own catch-up; the hub only
+        delivers what comes after.
+        """
+        self.ensure_threads()
+        with self.cond:
+            if self.subscriber_count() >= self.config['PUSH_MAX_SUBSCRIBERS']:
+                return None
+            channel = self.channels.get(diagram_id)
+            if channel is None:
+                channel = self.channels[diagram_id] = _Channel(current)
+                # A commit notified just before the channel existed went unheard: look once.
+                self.dirty.add(diagram_id)
+                self.cond.notify()
+            subscriber = Subscriber(diagram_id, max(since, channel.version), self.config['PUSH_QUEUE_FRAMES'])
+            channel.subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.cond:
+            channel = self.channels.get(subscriber.diagram_id)
+            if channel is not None:
+                channel.subscribers.discard(subscriber)
+                if not channel.subscribers:
+                    del self.channels[subscriber.diagram_id]
+                    self.dirty.discard(subscriber.diagram_id)
+
+    def notify(self, diagram_id, version):
+        with self.cond:
+            channel = self.channels.get(diagram_id)
+            if channel is not None and version > channel.version:
+                self.dirty.add(diagram_id)
+                self.cond.notify()
+
+    def stream(self, subscriber, first=None):
+        """The ``text/event-stream`` body for one subscriber.
+
+        The caller unsubscribes when the response is closed (a generator that
+        never started would not run a ``finally``).
+        """
+        heartbeat = self.config['PUSH_HEARTBEAT_SECONDS']
+        deadline = time.monotonic() + self.config['PUSH_STREAM_SECONDS']
+        yield 'retry: 2000\n\n'
+        if first is not None:
+            yield format_event(*first)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            frame = subscriber.get(min(heartbeat, remaining))
+            # The heartbeat comment also finds disconnected clients: the write fails.
+            yield ': ping\n\n' if frame is None else format_event(*frame)
+
+    def _notification(self, payload):
+        diagram_id, _, version = payload.partition(':')
+        try:
+            self.notify(int(diagram_id), int(version))
+        except ValueError:
+            log.warning("Ignoring malformed %s payload %r", CHANNEL, payload)
+            return
+        self.notifications.inc()
+
+    def _listen(self):
+        engine = create_engine(self.config['PUSH_LISTEN_URL'] or self.config['SQLALCHEMY_DATABASE_URI'],
+                               poolclass=NullPool)
+        delay = 1
+        while not self.stopping:
+            try:
+                connection = engine.raw_connection()
+                try:
+                    dbapi = connection.driver_connection
+                    dbapi.autocommit = True
+                    with dbapi.cursor() as cursor:
+                        cursor.execute(f'LISTEN {CHANNEL}')
+                        # Anything committed while nobody was listening has to be looked up.
+                        with self.cond:
+                            self.dirty.update(self.channels)
+                            self.cond.notify()
+                        delay = 1
+                        while not self.stopping:
+                            if select.select([dbapi], [], [], 5)[0]:
+                                dbapi.poll()
+                            else:
+                                cursor.execute('SELECT 1')  # notices a dead connection
+                            while dbapi.notifies:
+                                self._notification(dbapi.notifies.pop(0).payload)
+                finally:
+                    connection.close()
+            except Exception:
+                if self.stopping:
+                    break
+                log.warning("Push listener lost its connection; retrying in %ss", delay, exc_info=True)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        engine.dispose()
+
+    def _pump(self):
+        last = 0.0
+        while True:
+            with self.cond:
+                while not self.dirty and not self.stopping:
+                    self.cond.wait()
+                if self.stopping:
+                    return
+            # At most one frame per diagram per tick; later changes wait for the next one.
+            delay = last + self.config['PUSH_TICK_SECONDS'] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            last = time.monotonic()
+            with self.cond:
+                dirty, self.dirty = self.dirty, set()
+                work = [(d, self.channels[d].version) for d in dirty if d in self.channels]
+            try:
+                with self.app.app_context():
+                    frames = [(d, since) + load_frame(d, since) for d, since in work]
+            except Exception:
+                log.exception("Loading diagram changes for live streams failed")
+                with self.cond:
+                    self.dirty |= dirty
+                time.sleep(1)
+                continue
+            for diagram_id, since, version, changes in frames:
+                with self.cond:
+                    channel = self.channels.get(diagram_id)
+                    if version is None or channel is None or channel.version != since:
+                        continue
+                    channel.version = version
+                    subscribers = list(channel.subscribers)
+                for subscriber in subscribers:
+                    event = subscriber.offer(since, version, changes)
+                    if event is not None:
+                        self.frames_sent.inc(event)
+
+
+class DiagramPush:
+    """Flask extension owning the process's ``PushHub``."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PUSH_TICK_SECONDS', 0.1)
+        app.config.setdefault('PUSH_QUEUE_FRAMES', 32)
+        app.config.setdefault('PUSH_HEARTBEAT_SECONDS', 15)
+        app.config.setdefault('PUSH_STREAM_SECONDS', 60)
+        app.config.setdefault('PUSH_MAX_SUBSCRIBERS', 2)  # see push_limits in app/server.py
+        app.config.setdefault('PUSH_LISTEN_URL', None)  # None: SQLALCHEMY_DATABASE_URI
+        registry = app.extensions['metrics']
+        hub = PushHub(app, registry)
+        app.extensions['diagram_push'] = hub
+
+        subscribers = registry.gauge('push_subscribers', 'Open live diagram streams in this process.')
+        registry.add_collector(lambda: subscribers.set(value=hub.subscriber_count()))
+
+    @property
+    def hub(self):
+        return current_app.extensions['diagram_push']
+
+    def stop(self):
+        self.hub.stop()
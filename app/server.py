@@ -0,0 +1,96 @@
+# app/server.py
+"""Production serving helpers used by gunicorn.conf.py and the ops probes.
+
+The app is imported once in the gunicorn master (``preload_app``) and the
+workers are forked from it, so imports, templates and catalog caches are
+built once and shared copy-on-write. Database connections must not be
+shared across processes: ``after_fork`` throws away the pool each worker
+inherited (without closing the parent's sockets) so it opens its own.
+
+Two worker models are supported, picked with ``SERVER_WORKER_MODEL``:
+
+* ``gthread`` (default): ``WEB_CONCURRENCY`` processes (CPU count when
+  unset) of ``SERVER_THREADS`` threads each.
+* ``gevent``: the same number of processes, each running up to
+  ``SERVER_WORKER_CONNECTIONS`` greenlets. Needs the ``gevent`` and
+  ``psycogreen`` packages, which are not in requirements.txt.
+
+Live diagram streams are capped per process to fit the model (see
+``push_limits``); many watchers need gevent.
+"""
+
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+log = logging.getLogger('app.server')
+
+WORKER_MODELS = ('gthread', 'gevent')
+
+
+def _int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def worker_settings(environ, cpus):
+    """gunicorn settings for the worker model chosen in ``environ``."""
+    model = environ.get('SERVER_WORKER_MODEL', 'gthread')
+    if model not in WORKER_MODELS:
+        raise ValueError(f"SERVER_WORKER_MODEL must be one of: {', '.join(WORKER_MODELS)}")
+    settings = {'worker_class': model, 'workers': max(1, _int(environ, 'WEB_CONCURRENCY', cpus))}
+    if model == 'gthread':
+        settings['threads'] = max(1, _int(environ, 'SERVER_THREADS', 4))
+    else:
+        settings['worker_connections'] = max(1, _int(environ, 'SERVER_WORKER_CONNECTIONS', 100))
+    return settings
+
+
+def push_limits(environ):
+    """Default ``(PUSH_MAX_SUBSCRIBERS, PUSH_STREAM_SECONDS)`` for the worker model in ``environ``.
+
+    A live diagram stream holds its worker thread (or greenlet) until it
+    ends. Under gthread, at most half the threads may stream, for a minute at
+    a time, so ordinary requests always have threads left; clients turned
+    away poll ``/changes`` instead.
+    """
+    settings = worker_settings(environ, 1)
+    if settings['worker_class'] == 'gevent':
+        return settings['worker_connections'] // 2, 300
+    return settings['threads'] // 2, 60
+
+
+def after_fork(app):
+    """Give a freshly forked worker its own connection pool."""
+    from app import db
+
+    with app.app_context():
+        # close=False: the sockets still belong to the parent; just forget them.
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def patch_psycopg_for_gevent():
+    """Make psycopg2 yield to other greenlets while waiting on the server."""
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        log.warning("gevent workers without psycogreen: every query blocks the whole worker")
+        return False
+    patch_psycopg()
+    return True
+
+
+def check_database(engine, timeout_ms):
+    """``None`` if ``SELECT 1`` succeeds within ``timeout_ms``, else a short error."""
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+            conn.execute(text('SELECT 1'))
+    except SQLAlchemyError as e:
+        error = type(getattr(e, 'orig', None) or e).__name__
+        log.warning("Readiness check failed in worker %s: %s", os.getpid(), error)
+        return error
+    return None
@@ -0,0 +1,239 @@
+# app/services/cables.py
+"""Cable schedule and bill of materials for a diagram.
+
+Edge endpoints are loaded with one query straight into NumPy arrays
+(positions, a spec code per run, a system code per run). Run lengths, slack,
+snapping to stock lengths and every aggregate are whole-array operations;
+Python only loops over the distinct specs and the rows of the result.
+
+Lengths come from canvas positions: ``CABLE_UNITS_PER_METER`` canvas units
+make a metre, and runs follow ``manhattan`` (tray-style) or ``direct``
+routing.
+"""
+
+import csv
+import io
+from collections import namedtuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import text
+
+from app import db, diagram_cache
+from app.services.diagrams import EFFECTIVE_PINS
+from app.services.graph import diagram_graph
+
+CableRule = namedtuple('CableRule', 'slack_m slack_pct stock max_run')
+
+_COAX_STOCK = (0.5, 1, 2, 3, 5, 10, 15, 20, 25, 30, 50, 75, 100)
+_CAT_STOCK = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100)
+
+# Slack is a fixed service loop plus a percentage for dressing; max_run is
+# the longest run the format supports without active extension.
+CABLE_RULES = {
+    '12G-SDI': CableRule(1.0, 0.10, _COAX_STOCK, 70),
+    '6G-SDI': CableRule(1.0, 0.10, _COAX_STOCK, 100),
+    '3G-SDI': CableRule(1.0, 0.10, _COAX_STOCK, 120),
+    'HD-SDI': CableRule(1.0, 0.10, _COAX_STOCK, 140),
+    'Tri-Level / Black Burst': CableRule(1.0, 0.10, _COAX_STOCK, 300),
+    '1GBASE-T': CableRule(2.0, 0.10, _CAT_STOCK, 100),
+    '10GBASE-T': CableRule(2.0, 0.10, _CAT_STOCK, 100),
+}
+DEFAULT_RULE = CableRule(1.0, 0.10, _COAX_STOCK, float('inf'))
+
+UNSPECIFIED = 'unspecified'
+ROUTINGS = ('manhattan', 'direct')
+
+# Specs and source nodes come back as dense codes (0..n-1) so Python never
+# has to sort or hash 100k label strings.
+_LOAD_RUNS = text(f"""
+    WITH {EFFECTIVE_PINS}
+    SELECT e.key, s.x, s.y, t.x, t.y,
+           dense_rank() OVER (ORDER BY COALESCE(p.spec, q.spec, :unspecified)) - 1,
+           COALESCE(p.spec, q.spec, :unspecified),
+           dense_rank() OVER (ORDER BY e.source_node) - 1,
+           e.source_node
+    FROM diagram_edge e
+    JOIN diagram_node s ON s.diagram_id = e.diagram_id AND s.key = e.source_node
+    JOIN diagram_node t ON t.diagram_id = e.diagram_id AND t.key = e.target_node
+    LEFT JOIN effective_pin p ON p.node_key = e.source_node AND p.key = e.source_pin
+    LEFT JOIN effective_pin q ON q.node_key = e.target_node AND q.key = e.target_pin
+    WHERE e.diagram_id = :diagram_id
+    ORDER BY e.id
+""")
+
+
+def rule_for(spec):
+    return CABLE_RULES.get(spec, DEFAULT_RULE)
+
+
+class CableSchedule:
+    """Per-run arrays for one diagram plus their aggregates.
+
+    ``specs``/``systems`` hold the distinct labels; ``spec_codes`` and
+    ``system_codes`` index into them per run. ``stock_codes`` index the
+    spec's stock lengths, -1 for runs longer than the longest stock cable
+    (custom made), and ``stock`` is the matching length (NaN when custom).
+    """
+
+    def __init__(self, edge_keys, specs, spec_codes, systems, system_codes,
+                 length, stock_codes, stock, over_limit):
+        self.edge_keys = edge_keys
+        self.specs = specs
+        self.spec_codes = spec_codes
+        self.systems = systems
+        self.system_codes = system_codes
+        self.length = length
+        self.stock_codes = stock_codes
+        self.stock = stock
+        self.over_limit = over_limit
+
+    def __len__(self):
+        return len(self.length)
+
+    def _groups(self, by_system):
+        """Distinct (system, spec, stock) groups with run counts and metres.
+
+        The three codes are packed into one int64 so grouping is a single
+        integer ``np.unique`` and two ``np.bincount`` calls.
+        """
+        if not len(self):
+            return iter(())
+        stock_span = max(len(rule_for(spec).stock) for spec in self.specs) + 1
+        key = self.spec_codes.astype(np.int64) * stock_span + (self.stock_codes + 1)
+        if by_system:
+            key += self.system_codes.astype(np.int64) * (len(self.specs) * stock_span)
+        groups, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+        meters = np.bincount(inverse, weights=self.length, minlength=len(groups))
+        stock_meters = np.bincount(inverse, weights=np.nan_to_num(self.stock), minlength=len(groups))
+        system, rest = np.divmod(groups, len(self.specs) * stock_span)
+        spec, stock_code = np.divmod(rest, stock_span)
+        return zip(system.tolist(), spec.tolist(), (stock_code - 1).tolist(),
+                   counts.tolist(), meters.tolist(), stock_meters.tolist())
+
+    def _item(self, spec, stock_code, count, meters, stock_meters):
+        custom = stock_code < 0
+        return {
+            'spec': self.specs[spec],
+            'length': None if custom else float(rule_for(self.specs[spec]).stock[stock_code]),
+            'count': count,
+            'run_meters': round(meters, 2),
+            # Custom runs are cut to length, so their cable is the run itself.
+            'cable_meters': round(meters if custom else stock_meters, 2),
+        }
+
+    def bom(self):
+        """One line per (spec, stock length); ``length`` None marks custom runs."""
+        return [self._item(spec, *rest) for _, spec, *rest in self._groups(by_system=False)]
+
+    def by_system(self):
+        """Bill of materials per system, largest cable total first."""
+        systems = {}
+        for system, spec, *rest in self._groups(by_system=True):
+            entry = systems.setdefault(system, {'system': self.systems[system], 'bom': []})
+            entry['bom'].append(self._item(spec, *rest))
+        for entry in systems.values():
+            entry['runs'] = sum(item['count'] for item in entry['bom'])
+            entry['cable_meters'] = round(sum(item['cable_meters'] for item in entry['bom']), 2)
+        return sorted(systems.values(), key=lambda e: (-e['cable_meters'], e['system']))
+
+    def totals(self):
+        return {
+            'runs': len(self),
+            'run_meters': round(float(self.length.sum()), 2),
+            'custom_runs': int((self.stock_codes < 0).sum()),
+            'over_limit': int(self.over_limit.sum()),
+        }
+
+    def rows(self):
+        """Per-run schedule rows in edge order."""
+        columns = zip(self.edge_keys, self.spec_codes.tolist(), self.system_codes.tolist(),
+                      np.round(self.length, 2).tolist(), self.stock.tolist(), self.over_limit.tolist())
+        for key, spec, system, length, stock, over in columns:
+            yield key, self.specs[spec], self.systems[system], length, None if stock != stock else stock, over
+
+
+def compute_schedule(edge_keys, sx, sy, tx, ty, spec_codes, specs, system_codes, systems,
+                     units_per_meter=100.0, routing='manhattan'):
+    """Build a CableSchedule from per-run endpoint coordinates and label codes.
+
+    ``spec_codes``/``system_codes`` are per-run integer indexes into the
+    ``specs``/``systems`` label lists.
+    """
+    sx, sy, tx, ty = (np.asarray(a, dtype=np.float64) for a in (sx, sy, tx, ty))
+    spec_codes = np.asarray(spec_codes, dtype=np.intp)
+    system_codes = np.asarray(system_codes, dtype=np.intp)
+    dx, dy = np.abs(tx - sx), np.abs(ty - sy)
+    distance = dx + dy if routing == 'manhattan' else np.hypot(dx, dy)
+    raw = distance / units_per_meter
+
+    rules = [rule_for(spec) for spec in specs]
+    slack_pct = np.array([r.slack_pct for r in rules] or [0.0])[spec_codes]
+    slack_m = np.array([r.slack_m for r in rules] or [0.0])[spec_codes]
+    max_run = np.array([r.max_run for r in rules] or [0.0], dtype=np.float64)[spec_codes]
+    length = raw * (1 + slack_pct) + slack_m
+
+    # One searchsorted per spec over that spec's runs only.
+    stock_codes = np.full(len(length), -1, dtype=np.intp)
+    stock = np.full(len(length), np.nan)
+    order = np.argsort(spec_codes, kind='stable')
+    bounds = np.searchsorted(spec_codes[order], np.arange(len(rules) + 1))
+    for code, rule in enumerate(rules):
+        runs = order[bounds[code]:bounds[code + 1]]
+        table = np.asarray(rule.stock, dtype=np.float64)
+        pos = np.searchsorted(table, length[runs], side='left')
+        fits = pos < len(table)
+        stock_codes[runs[fits]] = pos[fits]
+        stock[runs[fits]] = table[pos[fits]]
+
+    return CableSchedule(
+        edge_keys=list(edge_keys), specs=list(specs), spec_codes=spec_codes,
+        systems=list(systems), system_codes=system_codes,
+        length=length, stock_codes=stock_codes, stock=stock, over_limit=length > max_run,
+    )
+
+
+def load_schedule(diagram, routing='manhattan'):
+    """The cable schedule of a saved diagram, cached per version."""
+    units = current_app.config.get('CABLE_UNITS_PER_METER', 100.0)
+    key = ('cables', diagram.id, diagram.version, routing, units)
+    return diagram_cache.get_or_load(key, lambda: _build(diagram, units, routing))
+
+
+def _labels(codes, labels):
+    """Label list for dense ``codes`` from the per-run label column."""
+    _, first = np.unique(codes, return_index=True)
+    return [labels[i] for i in first.tolist()]
+
+
+def _build(diagram, units, routing):
+    rows = db.session.execute(_LOAD_RUNS, {'diagram_id': diagram.id, 'unspecified': UNSPECIFIED}).all()
+    if not rows:
+        return compute_schedule([], [], [], [], [], [], [], [], [], units, routing)
+    keys, sx, sy, tx, ty, spec_codes, spec_labels, node_codes, node_labels = zip(*rows)
+    spec_codes, node_codes = np.array(spec_codes), np.array(node_codes)
+
+    # A run belongs to its source device's system, labelled by the system's
+    # smallest node id so names stay stable between versions.
+    graph = diagram_graph(diagram)
+    names = {root: min(nodes) for root, nodes in graph.members.items()}
+    node_systems = [names[graph.find(node)] for node in _labels(node_codes, node_labels)]
+    systems, node_system_codes = np.unique(np.array(node_systems, dtype=str), return_inverse=True)
+    return compute_schedule(
+        keys, sx, sy, tx, ty, spec_codes, _labels(spec_codes, spec_labels),
+        node_system_codes.ravel()[node_codes], systems.tolist(), units, routing,
+    )
+
+
+def schedule_csv(schedule):
+    """Yield the per-run schedule as CSV text chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('edge', 'spec', 'system', 'run_m', 'stock_m', 'over_limit'))
+    for i, row in enumerate(schedule.rows(), 1):
+        writer.writerow(row)
+        if i % 1000 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
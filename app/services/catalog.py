@@ -0,0 +1,169 @@
+# app/services/catalog.py
+"""Read helpers for the master catalog tables (device types, manufacturers)."""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from sqlalchemy import case, func, literal, select, tuple_, union_all
+
+from app import db
+from app.models.master import DeviceType, Manufacturer
+
+# URL slug -> model for every catalog table exposed through the API
+CATALOGS = {
+    'device-types': DeviceType,
+    'manufacturers': Manufacturer,
+}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 50
+MAX_QUERY_LENGTH = 64
+
+
+class CatalogQueryError(ValueError):
+    """Raised when a catalog request has a bad cursor, field list or limit."""
+
+
+def catalog_fields(model):
+    """Column names a client may project for this catalog model."""
+    return [column.name for column in model.__table__.columns]
+
+
+def parse_fields(model, raw):
+    """Turn a comma-separated ``fields`` parameter into a list of column names."""
+    allowed = catalog_fields(model)
+    if not raw:
+        return allowed
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise CatalogQueryError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(raw):
+    if raw is None or raw == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise CatalogQueryError("limit must be an integer")
+    if limit < 1:
+        raise CatalogQueryError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(name, row_id):
+    raw = json.dumps([name, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(name, id)`` keyset position encoded in ``cursor``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        name, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise CatalogQueryError("Malformed cursor")
+    if not isinstance(name, str) or not isinstance(row_id, int):
+        raise CatalogQueryError("Malformed cursor")
+    return name, row_id
+
+
+def fingerprint(model):
+    """Row count and newest ``updated_at`` of a catalog, in one aggregate query."""
+    count, latest = db.session.execute(
+        select(func.count(model.id), func.max(model.updated_at))
+    ).one()
+    return count, latest
+
+
+def make_etag(model, count, latest, *variant):
+    """Strong ETag for a catalog state plus the request parameters shaping the body."""
+    stamp = latest.isoformat() if latest else ''
+    key = '|'.join([model.__tablename__, str(count), stamp, *map(str, variant)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def catalog_rows(model, *fields):
+    """Every row of a catalog as plain dicts of ``fields``, ordered by name."""
+    table = model.__table__
+    stmt = select(*(table.c[f] for f in fields)).order_by(table.c.name)
+    return [dict(row) for row in db.session.execute(stmt).mappings()]
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def fetch_page(model, fields, after=None, limit=DEFAULT_PAGE_SIZE):
+    """Return ``(rows, next_cursor)`` for one keyset page ordered by ``(name, id)``.
+
+    Only the requested columns are selected; ``name`` and ``id`` are added to the
+    SELECT when missing because the cursor is built from them.
+    """
+    table = model.__table__
+    columns = [table.c[f] for f in fields]
+    extra = [table.c[k] for k in ('name', 'id') if k not in fields]
+
+    stmt = select(*columns, *extra).order_by(table.c.name, table.c.id).limit(limit + 1)
+    if after:
+        stmt = stmt.where(tuple_(table.c.name, table.c.id) > tuple_(*decode_cursor(after)))
+
+    rows = db.session.execute(stmt).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['name'], rows[-1]['id'])
+
+    items = [{f: _serialize(row[f]) for f in fields} for row in rows]
+    return items, next_cursor
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_catalogs(query, catalogs=None, limit=DEFAULT_SEARCH_RESULTS):
+    """Typo-tolerant name search across catalogs, best matches first.
+
+    A row matches when its name contains the query (``ILIKE``) or when some
+    word run of it is trigram-similar to the query (``name %> query``); both
+    predicates are served by the ``gin_trgm_ops`` indexes. Rank: prefix
+    matches, then substring matches, then ``word_similarity``.
+    """
+    query = (query or '').strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        raise CatalogQueryError(f"q must be 1-{MAX_QUERY_LENGTH} characters")
+    slugs = catalogs or list(CATALOGS)
+    unknown = [slug for slug in slugs if slug not in CATALOGS]
+    if unknown:
+        raise CatalogQueryError(f"Unknown catalog(s): {', '.join(unknown)}")
+
+    escaped = _like_escape(query)
+    parts = []
+    for slug in slugs:
+        table = CATALOGS[slug].__table__
+        name = table.c.name
+        score = (func.word_similarity(query, name)
+                 + case((name.ilike(f'{escaped}%'), 2.0), else_=0.0)
+                 + case((name.ilike(f'%{escaped}%'), 1.0), else_=0.0))
+        parts.append(
+            select(literal(slug).label('catalog'), table.c.id, name, score.label('score'))
+            .where(name.ilike(f'%{escaped}%') | name.op('%>')(query))
+        )
+    ranked = union_all(*parts).subquery()
+    stmt = (select(ranked)
+            .order_by(ranked.c.score.desc(), func.length(ranked.c.name), ranked.c.name)
+            .limit(min(limit, MAX_SEARCH_RESULTS)))
+    return [
+        {'catalog': row.catalog, 'id': row.id, 'name': row.name, 'score': round(row.score, 3)}
+        for row in db.session.execute(stmt)
+    ]
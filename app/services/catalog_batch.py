@@ -0,0 +1,163 @@
+# app/services/catalog_batch.py
+"""Apply a list of add/update/delete operations to the catalogs in one transaction.
+
+Operations are validated up front, then applied per catalog with one
+set-based statement per kind: ``DELETE ... WHERE id = ANY(...)``, an
+``UPDATE ... FROM (VALUES ...)`` and a multi-row ``INSERT ... ON CONFLICT
+(name) DO NOTHING``. Deletes run first so a batch can free a name and reuse it.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Integer, String, any_, bindparam, column, delete, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from app import db
+from app.cache import mark_catalog_changed
+from app.services.catalog import CATALOGS
+from app.services.catalog_import import INSERT_DEFAULTS, clean_record
+
+MAX_BATCH_OPERATIONS = 5000
+OPS = ('add', 'update', 'delete')
+
+
+class BatchValidationError(ValueError):
+    """Raised with the per-operation results when any operation is malformed."""
+
+    def __init__(self, results):
+        super().__init__("Invalid batch")
+        self.results = results
+
+
+def _validate(index, op, seen_ids, seen_names):
+    if not isinstance(op, dict):
+        raise ValueError("Operation must be an object.")
+    kind = op.get('op')
+    if kind not in OPS:
+        raise ValueError(f"op must be one of: {', '.join(OPS)}")
+    catalog = op.get('catalog')
+    model = CATALOGS.get(catalog) if isinstance(catalog, str) else None
+    if model is None:
+        raise ValueError(f"catalog must be one of: {', '.join(sorted(CATALOGS))}")
+
+    parsed = {'index': index, 'op': kind, 'model': model}
+    if kind in ('update', 'delete'):
+        row_id = op.get('id')
+        if not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise ValueError("id must be an integer.")
+        if (model, row_id) in seen_ids:
+            raise ValueError(f"id {row_id} appears more than once in the batch.")
+        seen_ids.add((model, row_id))
+        parsed['id'] = row_id
+    if kind in ('add', 'update'):
+        values_ = clean_record(model, op, partial=(kind == 'update'))
+        if not values_:
+            raise ValueError("update needs at least one column to change.")
+        name = values_.get('name')
+        if name is not None:
+            if (model, name) in seen_names:
+                raise ValueError(f"Name '{name}' appears more than once in the batch.")
+            seen_names.add((model, name))
+        parsed['values'] = values_
+    return parsed
+
+
+def validate_operations(operations):
+    """Return parsed operations or raise BatchValidationError."""
+    if not isinstance(operations, list) or not operations:
+        raise BatchValidationError([{'index': None, 'status': 'invalid',
+                                     'error': "operations must be a non-empty list."}])
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise BatchValidationError([{'index': None, 'status': 'invalid',
+                                     'error': f"At most {MAX_BATCH_OPERATIONS} operations per batch."}])
+
+    parsed, errors = [], []
+    seen_ids, seen_names = set(), set()
+    for index, op in enumerate(operations):
+        try:
+            parsed.append(_validate(index, op, seen_ids, seen_names))
+        except ValueError as e:
+            errors.append({'index': index, 'status': 'invalid', 'error': str(e)})
+    if errors:
+        raise BatchValidationError(errors)
+    return parsed
+
+
+def _delete(model, ops, results):
+    table = model.__table__
+    ids = [op['id'] for op in ops]
+    stmt = delete(table).where(
+        table.c.id == any_(bindparam('ids', ids, type_=ARRAY(Integer)))
+    ).returning(table.c.id)
+    deleted = set(db.session.execute(stmt).scalars())
+    for op in ops:
+        found = op['id'] in deleted
+        results[op['index']] = {'index': op['index'], 'status': 'deleted' if found else 'not_found',
+                                'id': op['id']}
+
+
+def _update(model, ops, results, now):
+    table = model.__table__
+    groups = {}
+    for op in ops:
+        groups.setdefault(tuple(sorted(op['values'])), []).append(op)
+
+    updated = set()
+    for cols, group in groups.items():
+        rows = values(
+            column('id', Integer), *(column(c, String) for c in cols), name='v'
+        ).data([(op['id'], *(op['values'][c] for c in cols)) for op in group])
+        stmt = update(table).where(table.c.id == rows.c.id).values(
+            {**{c: rows.c[c] for c in cols}, 'updated_at': now}
+        ).returning(table.c.id)
+        updated.update(db.session.execute(stmt).scalars())
+
+    for op in ops:
+        found = op['id'] in updated
+        results[op['index']] = {'index': op['index'], 'status': 'updated' if found else 'not_found',
+                                'id': op['id']}
+
+
+def _add(model, ops, results, now):
+    table = model.__table__
+    defaults = INSERT_DEFAULTS[model]
+    stmt = insert(table).values([
+        {**defaults, **op['values'], 'created_at': now, 'updated_at': now} for op in ops
+    ]).on_conflict_do_nothing(index_elements=['name']).returning(table.c.id, table.c.name)
+    added = dict((name, row_id) for row_id, name in db.session.execute(stmt))
+    for op in ops:
+        name = op['values']['name']
+        if name in added:
+            results[op['index']] = {'index': op['index'], 'status': 'added', 'id': added[name]}
+        else:
+            results[op['index']] = {'index': op['index'], 'status': 'exists',
+                                    'error': f"'{name}' already exists."}
+
+
+def apply_batch(operations):
+    """Validate and apply ``operations``; return one result per operation.
+
+    Runs inside the caller's transaction and does not commit. A unique-name
+    violation from an update surfaces as ``IntegrityError`` and the caller
+    must roll back.
+    """
+    parsed = validate_operations(operations)
+    results = [None] * len(parsed)
+    now = datetime.utcnow()
+
+    by_kind = {(kind, model): [] for kind in OPS for model in CATALOGS.values()}
+    for op in parsed:
+        by_kind[(op['op'], op['model'])].append(op)
+
+    for model in CATALOGS.values():
+        if by_kind[('delete', model)]:
+            _delete(model, by_kind[('delete', model)], results)
+    for model in CATALOGS.values():
+        if by_kind[('update', model)]:
+            _update(model, by_kind[('update', model)], results, now)
+    for model in CATALOGS.values():
+        if by_kind[('add', model)]:
+            _add(model, by_kind[('add', model)], results, now)
+
+    mark_catalog_changed(db.session)
+    return results
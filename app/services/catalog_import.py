@@ -0,0 +1,267 @@
+# app/services/catalog_import.py
+"""Streaming bulk import of catalog rows from CSV or NDJSON.
+
+Input is read record by record and upserted in fixed-size chunks with
+``INSERT ... ON CONFLICT (name)``, one transaction per chunk, so memory stays
+bounded by ``chunk_size`` and the error cap no matter how large the file is.
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+from sqlalchemy import literal_column, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+
+from app import db
+from app.cache import mark_catalog_changed
+from app.models.master import DeviceType, Manufacturer
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'ndjson')
+
+# Columns a file may set per catalog; ``name`` is the conflict key.
+IMPORT_COLUMNS = {
+    DeviceType: ('name', 'color', 'thumbnail'),
+    Manufacturer: ('name',),
+}
+
+# Values used for new rows when the input leaves a column out. Existing rows
+# only have the columns the input actually provides overwritten.
+INSERT_DEFAULTS = {
+    DeviceType: {'color': '#3366FF', 'thumbnail': None},
+    Manufacturer: {},
+}
+
+HEX_COLOR = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+
+class UnreadableUpload(ValueError):
+    """Raised when the upload itself cannot be decoded; chunks before it stay committed."""
+
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+
+class ImportReport:
+    """Counters plus a capped list of per-row errors."""
+
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.superseded = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'superseded': self.superseded,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess ``csv`` or ``ndjson`` from a filename or MIME type, else None."""
+    name = (filename or '').lower()
+    if name.endswith('.csv') or content_type == 'text/csv':
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or content_type in (
+            'application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_number, record_or_error)`` from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:  # e.g. an oversized field; the reader resumes on the next line
+                yield reader.line_num + 1, ValueError(f"Invalid CSV: {e}")
+                continue
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Each line must be a JSON object")
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def clean_record(model, record, partial=False):
+    """Validate one input record and return the column values it provides.
+
+    With ``partial`` the name may be left out (used for updates by id).
+    """
+    values = {}
+    for column in ('name',) + IMPORT_COLUMNS[model]:
+        if record.get(column) is not None and not isinstance(record[column], str):
+            raise ValueError(f"{column.capitalize()} must be a string.")
+        if '\x00' in (record.get(column) or ''):
+            raise ValueError(f"{column.capitalize()} must not contain NUL characters.")
+    if not partial or 'name' in record:
+        name = (record.get('name') or '').strip()
+        if not name:
+            raise ValueError("Name is required.")
+        if len(name) > 64:
+            raise ValueError("Name must be 64 characters or less.")
+        values['name'] = name
+
+    columns = IMPORT_COLUMNS[model]
+    if 'color' in columns and record.get('color'):
+        color = record['color'].strip()
+        if not HEX_COLOR.match(color):
+            raise ValueError(f"Invalid color '{color}'.")
+        values['color'] = color
+    if 'thumbnail' in columns and 'thumbnail' in record:
+        thumbnail = (record['thumbnail'] or '').strip() or None
+        if thumbnail and len(thumbnail) > 128:
+            raise ValueError("Thumbnail must be 128 characters or less.")
+        values['thumbnail'] = thumbnail
+    return values
+
+
+def upsert_rows(model, rows):
+    """Upsert ``rows`` in one statement; return ``(inserted, updated)``.
+
+    All rows must provide the same columns. Conflicting rows are only
+    rewritten when a provided value actually differs, so re-importing an
+    unchanged catalog leaves ``updated_at`` (and the API ETags) alone.
+    ``xmax = 0`` in RETURNING is true for freshly inserted tuples.
+    """
+    table = model.__table__
+    now = datetime.utcnow()
+    defaults = INSERT_DEFAULTS[model]
+    stmt = insert(table).values([
+        {**defaults, **row, 'created_at': now, 'updated_at': now} for row in rows
+    ])
+    update_cols = [c for c in rows[0] if c != 'name']
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={**{c: stmt.excluded[c] for c in update_cols}, 'updated_at': now},
+            where=or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_cols)),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['name'])
+    flags = db.session.execute(stmt.returning(literal_column('xmax = 0'))).scalars().all()
+    mark_catalog_changed(db.session)
+    inserted = sum(1 for f in flags if f)
+    return inserted, len(flags) - inserted
+
+
+def _upsert_grouped(model, rows):
+    """Upsert rows grouped by the set of columns they provide."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    inserted = updated = 0
+    for group in groups.values():
+        i, u = upsert_rows(model, group)
+        inserted += i
+        updated += u
+    return inserted, updated
+
+
+def _flush_chunk(model, chunk, report):
+    # The same name twice in one statement is an ON CONFLICT error; last row wins.
+    by_name = {}
+    for line, values in chunk:
+        by_name[values['name']] = (line, values)
+    report.superseded += len(chunk) - len(by_name)
+    report.chunks += 1
+    failed = 0
+    try:
+        inserted, updated = _upsert_grouped(model, [values for _, values in by_name.values()])
+        db.session.commit()
+    except DBAPIError:
+        # Retry row by row to pin the failure on the offending lines.
+        db.session.rollback()
+        mark_catalog_changed(db.session)
+        inserted = updated = 0
+        for line, values in by_name.values():
+            try:
+                with db.session.begin_nested():
+                    i, u = upsert_rows(model, [values])
+                inserted += i
+                updated += u
+            except DBAPIError as e:
+                report.add_error(line, str(e.orig).strip())
+                failed += 1
+        db.session.commit()
+    report.inserted += inserted
+    report.updated += updated
+    report.unchanged += len(by_name) - failed - inserted - updated
+
+
+def import_catalog(model, stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Stream ``stream`` (text) into the ``model`` catalog and return an ImportReport.
+
+    ``progress(report)`` is called after every committed chunk. Raises
+    ``UnreadableUpload`` if the stream turns out not to be UTF-8.
+    """
+    report = ImportReport()
+    chunk = []
+    records = iter_records(stream, fmt)
+    line = 0
+    while True:
+        try:
+            line, record = next(records)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            raise UnreadableUpload(f"The file is not UTF-8 text (after line {line}).", report) from None
+        if isinstance(record, Exception):
+            report.add_error(line, str(record))
+            continue
+        try:
+            chunk.append((line, clean_record(model, record)))
+        except ValueError as e:
+            report.add_error(line, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _flush_chunk(model, chunk, report)
+            chunk = []
+            if progress is not None:
+                progress(report)
+    if chunk:
+        _flush_chunk(model, chunk, report)
+    return report
+
+
+def open_text(binary_stream):
+    """Wrap a binary upload stream for the csv/json readers."""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
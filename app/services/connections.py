@@ -0,0 +1,280 @@
+# app/services/connections.py
+"""Server-side connection rules for diagram edges.
+
+Two structures keep every check O(1):
+
+* ``CompatibilityIndex`` answers whether a pin class ``(type, spec)`` may
+  feed another. Answers are memoized per pair in a bounded LRU (specs are
+  free text from clients), so a repeated check is one dict lookup.
+* ``DiagramIndex`` holds one diagram's pins in a dict keyed by
+  ``(node id, pin id)`` and the pins already in use, so validating an edge
+  never scans the node or pin lists (the frontend's ``isValidConnection``
+  does ``nodes.find``/``pins.find`` per hover).
+
+Indexes of persisted diagrams are cached per version in ``diagram_cache``.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlalchemy import select, text
+
+from app import db, diagram_cache
+from app.models.diagram import DiagramEdge, DiagramNode
+from app.services.device_models import effective_pins
+from app.services.diagrams import EFFECTIVE_PINS, DiagramError
+
+# (source pin type, target pin type) pairs that may be connected. Control
+# ports (Ethernet, RS-422, ...) are symmetric and join each other.
+DIRECTIONS = frozenset({('output', 'input'), ('control', 'control')})
+
+# A pin whose spec lists alternatives ("Tri-Level / Black Burst") accepts any of them.
+SPEC_SEPARATOR = ' / '
+
+PinRecord = namedtuple('PinRecord', 'node pin type spec')
+
+# Pin-class pairs remembered per process by ``compatibility``.
+COMPATIBILITY_CACHE_SIZE = 65536
+
+_LOAD_PINS = text(f"WITH {EFFECTIVE_PINS} SELECT node_key, key, type, spec FROM effective_pin")
+
+# Reasons returned by the checks; stable strings the client can switch on.
+SELF_LOOP = 'self_loop'
+UNKNOWN_NODE = 'unknown_node'
+UNKNOWN_PIN = 'unknown_pin'
+DIRECTION = 'direction'
+SPEC_MISMATCH = 'spec_mismatch'
+SOURCE_IN_USE = 'source_in_use'
+TARGET_IN_USE = 'target_in_use'
+DUPLICATE_EDGE = 'duplicate_edge'
+
+
+def spec_variants(spec):
+    """The concrete specs a pin spec stands for (``'A / B'`` -> ``{'A', 'B', 'A / B'}``)."""
+    if not spec:
+        return frozenset({spec})
+    parts = {part.strip() for part in spec.split(SPEC_SEPARATOR) if part.strip()}
+    return frozenset(parts | {spec})
+
+
+class CompatibilityIndex:
+    """Memoized ``(source class, target class) -> bool`` lookup, at most ``maxsize`` pairs."""
+
+    def __init__(self, maxsize=COMPATIBILITY_CACHE_SIZE):
+        # lru_cache is thread-safe and evicts the least recently checked pairs.
+        self.accepts = lru_cache(maxsize=maxsize)(self._accepts)
+
+    @staticmethod
+    def _accepts(source, target):
+        """True if a pin of class ``source`` may feed a pin of class ``target``."""
+        return ((source[0], target[0]) in DIRECTIONS
+                and not spec_variants(source[1]).isdisjoint(spec_variants(target[1])))
+
+
+compatibility = CompatibilityIndex()
+
+
+class InvalidConnection(DiagramError):
+    """An edge breaks the connection rules; ``reason`` is one of the constants above."""
+
+    def __init__(self, edge_key, reason):
+        super().__init__(f"Edge '{edge_key}' is not a valid connection: {reason}.")
+        self.edge_key = edge_key
+        self.reason = reason
+
+
+class DiagramIndex:
+    """Hash maps over one diagram's pins and occupied pins.
+
+    ``pins`` maps ``(node, pin)`` to a ``PinRecord``; ``nodes`` is the set of
+    node ids; ``sources``/``targets`` map an occupied ``(node, pin)`` to the
+    id of the edge using it; ``edges`` maps edge id to its endpoints.
+    """
+
+    def __init__(self):
+        self.nodes = set()
+        self.pins = {}
+        self.edges = {}
+        self.sources = {}
+        self.targets = {}
+
+    @classmethod
+    def from_document(cls, nodes, edges=()):
+        index = cls()
+        for node in nodes:
+            index.add_node(node['id'], effective_pins(node))
+        for edge in edges:
+            index.connect(edge)
+        return index
+
+    @classmethod
+    def load(cls, diagram_id):
+        """Build the index of a persisted diagram with three column-only queries.
+
+        Pins are read through ``EFFECTIVE_PINS`` so device model templates apply.
+        """
+        index = cls()
+        index.nodes.update(db.session.execute(
+            select(DiagramNode.key).where(DiagramNode.diagram_id == diagram_id)).scalars())
+        pins = db.session.execute(_LOAD_PINS, {'diagram_id': diagram_id})
+        for node_key, key, type_, spec in pins:
+            index.pins[node_key, key] = PinRecord(node_key, key, type_, spec)
+        edges = db.session.execute(
+            select(DiagramEdge.key, DiagramEdge.source_node, DiagramEdge.source_pin,
+                   DiagramEdge.target_node, DiagramEdge.target_pin)
+            .where(DiagramEdge.diagram_id == diagram_id)
+            .order_by(DiagramEdge.id))
+        for key, source, source_pin, target, target_pin in edges:
+            index._occupy(key, (source, source_pin), (target, target_pin))
+        return index
+
+    def copy(self):
+        other = DiagramIndex()
+        other.nodes = set(self.nodes)
+        other.pins = dict(self.pins)
+        other.edges = dict(self.edges)
+        other.sources = dict(self.sources)
+        other.targets = dict(self.targets)
+        return other
+
+    def add_node(self, node_key, pins=()):
+        self.nodes.add(node_key)
+        for pin in pins:
+            self.add_pin(node_key, pin)
+
+    def add_pin(self, node_key, pin):
+        self.pins[node_key, pin['id']] = PinRecord(node_key, pin['id'], pin.get('type'), pin.get('spec'))
+
+    def remove_pin(self, node_key, pin_key):
+        self.pins.pop((node_key, pin_key), None)
+        for occupied in (self.sources, self.targets):
+            edge_key = occupied.get((node_key, pin_key))
+            if edge_key is not None:
+                self.disconnect(edge_key)
+
+    def remove_node(self, node_key):
+        self.nodes.discard(node_key)
+        for key in [k for k in self.pins if k[0] == node_key]:
+            del self.pins[key]
+        for edge_key, (source, target) in list(self.edges.items()):
+            if source[0] == node_key or target[0] == node_key:
+                self.disconnect(edge_key)
+
+    def _occupy(self, edge_key, source, target):
+        self.edges[edge_key] = (source, target)
+        self.sources[source] = edge_key
+        self.targets[target] = edge_key
+
+    def connect(self, edge):
+        """Record ``edge`` as present without checking it."""
+        self._occupy(edge['id'], (edge.get('source'), edge.get('sourceHandle')),
+                     (edge.get('target'), edge.get('targetHandle')))
+
+    def disconnect(self, edge_key):
+        ends = self.edges.pop(edge_key, None)
+        if ends is not None:
+            source, target = ends
+            if self.sources.get(source) == edge_key:
+                del self.sources[source]
+            if self.targets.get(target) == edge_key:
+                del self.targets[target]
+
+    def check(self, source, source_pin, target, target_pin, edge_key=None):
+        """Reason the connection is invalid, or None if it is allowed.
+
+        ``edge_key`` names the edge being checked so that it does not count
+        as occupying its own pins.
+        """
+        if source == target:
+            return SELF_LOOP
+        if source not in self.nodes or target not in self.nodes:
+            return UNKNOWN_NODE
+        source_record = self.pins.get((source, source_pin))
+        target_record = self.pins.get((target, target_pin))
+        if source_record is None or target_record is None:
+            return UNKNOWN_PIN
+        if (source_record.type, target_record.type) not in DIRECTIONS:
+            return DIRECTION
+        if not compatibility.accepts((source_record.type, source_record.spec),
+                                     (target_record.type, target_record.spec)):
+            return SPEC_MISMATCH
+        if self.sources.get((source, source_pin), edge_key) != edge_key:
+            return SOURCE_IN_USE
+        if self.targets.get((target, target_pin), edge_key) != edge_key:
+            return TARGET_IN_USE
+        return None
+
+    def check_edge(self, edge):
+        if edge.get('id') in self.edges:
+            return DUPLICATE_EDGE
+        return self.check(edge.get('source'), edge.get('sourceHandle'),
+                          edge.get('target'), edge.get('targetHandle'))
+
+    def apply_op(self, op):
+        """Mirror a sync op (see app/services/sync.py); return the reason a connect is invalid."""
+        kind = op['op']
+        if kind == 'add_node':
+            self.add_node(op['node']['id'], effective_pins(op['node']))
+        elif kind == 'remove_node':
+            self.remove_node(op['node'])
+        elif kind == 'add_pin':
+            self.add_pin(op['node'], op['pin'])
+        elif kind == 'remove_pin':
+            self.remove_pin(op['node'], op['pin'])
+        elif kind == 'disconnect':
+            self.disconnect(op['edge'])
+        elif kind == 'connect':
+            reason = self.check_edge(op['edge'])
+            if reason is None:
+                self.connect(op['edge'])
+            return reason
+        return None
+
+
+def diagram_index(diagram):
+    """The cached index of a persisted diagram at its current version."""
+    return diagram_cache.get_or_load(('connections', diagram.id, diagram.version),
+                                     lambda: DiagramIndex.load(diagram.id))
+
+
+def validate_edges(nodes, edges):
+    """Check every edge of a document in one pass; return ``[{edge, reason}]`` for the bad ones.
+
+    Edges are checked in order against the pins occupied by the edges before
+    them, so the first edge to claim a pin wins.
+    """
+    index = DiagramIndex.from_document(nodes)
+    errors = []
+    for edge in edges:
+        reason = index.check_edge(edge)
+        if reason is None:
+            index.connect(edge)
+        else:
+            errors.append({'edge': edge.get('id'), 'reason': reason})
+    return errors
+
+
+def validate_persisted_edges(diagram):
+    """Same as ``validate_edges`` for a saved diagram, using its cached index."""
+    index = diagram_index(diagram)
+    errors = []
+    for edge_key, ((source, source_pin), (target, target_pin)) in index.edges.items():
+        reason = index.check(source, source_pin, target, target_pin, edge_key=edge_key)
+        if reason is not None:
+            errors.append({'edge': edge_key, 'reason': reason})
+    return errors
+
+
+def check_patch(diagram, ops):
+    """Raise InvalidConnection if a ``connect`` op in ``ops`` breaks the rules.
+
+    The ops are replayed on a copy of the current index so that a patch may
+    add a node or pin and connect it in one go.
+    """
+    if not any(op['op'] == 'connect' for op in ops):
+        return
+    index = diagram_index(diagram).copy()
+    for op in ops:
+        reason = index.apply_op(op)
+        if reason is not None:
+            raise InvalidConnection(op['edge']['id'], reason)
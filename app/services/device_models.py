@@ -0,0 +1,146 @@
+# app/services/device_models.py
+"""Device models: pin templates shared by every node placed from them.
+
+A template is stored once on ``device_model.pins`` as a compact JSONB array
+of ``[id, label, type, spec]`` arrays (a Constellation 2 M/E is ~40 pins in
+a few KB instead of a dict per pin per node). A node with a
+``device_model_id`` keeps only its differences in ``diagram_pin``; the
+effective pin list is assembled in SQL (see ``EFFECTIVE_PINS`` in
+app/services/diagrams.py) or, for ops replayed in Python, by
+``effective_pins`` below.
+"""
+
+from sqlalchemy import select
+
+from app import catalog_cache, db
+from app.models.master import DeviceModel, DeviceType, Manufacturer
+from app.services.catalog_import import HEX_COLOR
+
+PIN_FIELDS = ('id', 'label', 'type', 'spec')
+MAX_TEMPLATE_PINS = 512
+
+# Columns a create/update request may set.
+MODEL_FIELDS = ('name', 'manufacturer_id', 'device_type_id', 'color', 'thumbnail', 'pins')
+
+
+class DeviceModelError(ValueError):
+    """Raised when a device model payload is malformed."""
+
+
+def compact_pins(pins):
+    """``[{id, label, type, spec}, ...]`` -> ``[[id, label, type, spec], ...]``, validated."""
+    if not isinstance(pins, list) or len(pins) > MAX_TEMPLATE_PINS:
+        raise DeviceModelError(f"pins must be a list of at most {MAX_TEMPLATE_PINS}.")
+    compact, seen = [], set()
+    for pin in pins:
+        key = pin.get('id') if isinstance(pin, dict) else None
+        if not isinstance(key, str) or not key or len(key) > 128:
+            raise DeviceModelError("Every pin needs a string id of 1-128 characters.")
+        if key in seen:
+            raise DeviceModelError(f"Duplicate pin id '{key}'.")
+        seen.add(key)
+        values = [pin.get(field) for field in PIN_FIELDS]
+        if not all(v is None or isinstance(v, str) for v in values):
+            raise DeviceModelError(f"Pin '{key}' fields must be strings.")
+        compact.append(values)
+    return compact
+
+
+def expand_pins(compact):
+    return [dict(zip(PIN_FIELDS, pin)) for pin in compact]
+
+
+def template_pins(model_id):
+    """The expanded pin template of a device model (cached with the catalogs), or None."""
+    def load():
+        compact = db.session.execute(
+            select(DeviceModel.pins).where(DeviceModel.id == model_id)).scalar_one_or_none()
+        return None if compact is None else expand_pins(compact)
+    return catalog_cache.get_or_load(('device-model-pins', model_id), load)
+
+
+def effective_pins(node):
+    """The pins a node document stands for.
+
+    An explicit ``pins`` list is the full list; otherwise a node placed from
+    a device model has that model's template.
+    """
+    if node.get('pins') is not None or node.get('device_model_id') is None:
+        return node.get('pins') or []
+    return template_pins(node['device_model_id']) or []
+
+
+def model_summary(model, pins=False):
+    data = {
+        'id': model.id,
+        'name': model.name,
+        'manufacturer_id': model.manufacturer_id,
+        'device_type_id': model.device_type_id,
+        'color': model.color,
+        'thumbnail': model.thumbnail,
+        'pin_count': len(model.pins),
+    }
+    if pins:
+        data['pins'] = expand_pins(model.pins)
+    return data
+
+
+def load_model(model_id):
+    """Summary plus expanded pins of one device model, or None."""
+    model = db.session.get(DeviceModel, model_id)
+    return None if model is None else model_summary(model, pins=True)
+
+
+def list_models(manufacturer_id=None, device_type_id=None):
+    stmt = select(DeviceModel).order_by(DeviceModel.name, DeviceModel.id)
+    if manufacturer_id is not None:
+        stmt = stmt.where(DeviceModel.manufacturer_id == manufacturer_id)
+    if device_type_id is not None:
+        stmt = stmt.where(DeviceModel.device_type_id == device_type_id)
+    return [model_summary(m) for m in db.session.execute(stmt).scalars()]
+
+
+def _clean(data, partial=False):
+    if not isinstance(data, dict):
+        raise DeviceModelError("Expected a JSON object.")
+    values = {k: data[k] for k in MODEL_FIELDS if k in data}
+    for required in ('name', 'manufacturer_id'):
+        if (required in values or not partial) and values.get(required) is None:
+            raise DeviceModelError(f"{required} is required.")
+    if 'name' in values:
+        name = values['name']
+        if not isinstance(name, str) or not name.strip() or len(name) > 128:
+            raise DeviceModelError("name must be 1-128 characters.")
+        values['name'] = name.strip()
+    if values.get('color') is not None:
+        if not isinstance(values['color'], str) or not HEX_COLOR.match(values['color']):
+            raise DeviceModelError("color must be a hex color like '#3366FF'.")
+    if values.get('thumbnail') is not None:
+        if not isinstance(values['thumbnail'], str) or len(values['thumbnail']) > 128:
+            raise DeviceModelError("thumbnail must be a filename of at most 128 characters.")
+    for ref, model in (('manufacturer_id', Manufacturer), ('device_type_id', DeviceType)):
+        if values.get(ref) is None:
+            continue
+        if not isinstance(values[ref], int) or isinstance(values[ref], bool):
+            raise DeviceModelError(f"{ref} must be an integer.")
+        if db.session.get(model, values[ref]) is None:
+            raise DeviceModelError(f"{ref} {values[ref]!r} does not exist.")
+    if 'pins' in values:
+        values['pins'] = compact_pins(values['pins'])
+    return values
+
+
+def create_model(data):
+    """Add a device model from a request body (not committed)."""
+    model = DeviceModel(**_clean(data))
+    model.pins = model.pins or []
+    db.session.add(model)
+    db.session.flush()
+    return model
+
+
+def update_model(model, data):
+    """Apply a partial update (not committed). Placed nodes pick up template changes."""
+    for key, value in _clean(data, partial=True).items():
+        setattr(model, key, value)
+    return model
@@ -0,0 +1,348 @@
+# app/services/diagrams.py
+"""Bulk save and load of whole diagrams.
+
+A save replaces a diagram's contents with one DELETE and three
+``INSERT ... SELECT FROM jsonb_array_elements(...)`` statements (nodes, pins,
+edges); the document travels to Postgres once per statement as a single
+JSONB parameter instead of one ORM object per row. A load asks Postgres to
+assemble the whole document with ``json_agg`` and returns it as text, so
+Python never builds or serializes the node/pin objects.
+
+Nodes placed from a device model store only their pin overrides; the
+``effective_pin`` CTE below merges them with the model's template wherever
+pins are read. Loads return node summaries (``pin_count``) unless pins are
+asked for, and ``load_node_pins`` fetches them per node.
+"""
+
+import json
+from datetime import datetime
+
+from sqlalchemy import delete, text
+
+from app import db
+from app.models.diagram import Diagram, DiagramNode
+
+MAX_NODES = 20000
+MAX_PINS_PER_NODE = 512
+MAX_EDGES = 100000
+
+# Node keys stored in their own columns; anything else goes to ``extra``.
+NODE_COLUMNS = ('id', 'type', 'device_type', 'manufacturer', 'model', 'device_model_id',
+                'color', 'position', 'pins', 'notes', 'thumbnail')
+EDGE_COLUMNS = ('id', 'source', 'sourceHandle', 'target', 'targetHandle')
+# Stored as text columns: anything but a string (or null) is rejected up front.
+NODE_TEXT_COLUMNS = ('type', 'device_type', 'manufacturer', 'model', 'color', 'notes', 'thumbnail')
+PIN_TEXT_COLUMNS = ('label', 'type', 'spec')
+
+
+class DiagramError(ValueError):
+    """Raised when a submitted diagram document is malformed."""
+
+
+def _require_key(obj, what):
+    key = obj.get('id') if isinstance(obj, dict) else None
+    if not isinstance(key, str) or not key or len(key) > 128:
+        raise DiagramError(f"Every {what} needs a string id of 1-128 characters.")
+    return key
+
+
+def require_text(obj, fields, what):
+    """Check that each of ``fields`` present in ``obj`` is a string or null."""
+    for field in fields:
+        if obj.get(field) is not None and not isinstance(obj[field], str):
+            raise DiagramError(f"{what} {field} must be a string.")
+
+
+def validate_pin(pin):
+    key = _require_key(pin, 'pin')
+    require_text(pin, PIN_TEXT_COLUMNS, f"Pin '{key}'")
+    return key
+
+
+def validate_node(node):
+    """Check one node (position, unique pin ids) and return its id."""
+    key = _require_key(node, 'node')
+    require_text(node, NODE_TEXT_COLUMNS, f"Node '{key}'")
+    position = node.get('position') or {}
+    if not isinstance(position, dict) or not all(
+            isinstance(position.get(axis, 0), (int, float)) for axis in ('x', 'y')):
+        raise DiagramError(f"Node '{key}' has an invalid position.")
+    model_id = node.get('device_model_id')
+    if model_id is not None and (not isinstance(model_id, int) or isinstance(model_id, bool)):
+        raise DiagramError(f"Node '{key}' device_model_id must be an integer.")
+    pins = node.get('pins') or []
+    if not isinstance(pins, list) or len(pins) > MAX_PINS_PER_NODE:
+        raise DiagramError(f"Node '{key}' pins must be a list of at most {MAX_PINS_PER_NODE}.")
+    pin_keys = set()
+    for pin in pins:
+        pin_key = validate_pin(pin)
+        if pin_key in pin_keys:
+            raise DiagramError(f"Duplicate pin id '{pin_key}' on node '{key}'.")
+        pin_keys.add(pin_key)
+    return key
+
+
+def validate_document(doc, check_endpoints=True):
+    """Check the shape of ``{"nodes": [...], "edges": [...]}`` and return both lists.
+
+    With ``check_endpoints=False`` edges to unknown nodes are let through for
+    the connection validator to report.
+    """
+    if not isinstance(doc, dict):
+        raise DiagramError("Diagram must be a JSON object.")
+    nodes = doc.get('nodes') or []
+    edges = doc.get('edges') or []
+    if not isinstance(nodes, list) or not isinstance(edges, list):
+        raise DiagramError("nodes and edges must be lists.")
+    if len(nodes) > MAX_NODES or len(edges) > MAX_EDGES:
+        raise DiagramError(f"At most {MAX_NODES} nodes and {MAX_EDGES} edges per diagram.")
+
+    node_keys = set()
+    for node in nodes:
+        key = validate_node(node)
+        if key in node_keys:
+            raise DiagramError(f"Duplicate node id '{key}'.")
+        node_keys.add(key)
+
+    edge_keys = set()
+    for edge in edges:
+        key = _require_key(edge, 'edge')
+        if key in edge_keys:
+            raise DiagramError(f"Duplicate edge id '{key}'.")
+        edge_keys.add(key)
+        for end in ('source', 'target'):
+            if check_endpoints and edge.get(end) not in node_keys:
+                raise DiagramError(f"Edge '{key}' {end} '{edge.get(end)}' is not a node.")
+    return nodes, edges
+
+
+# The pins of every node of :diagram_id: template pins (ordinal = position in
+# the template) merged with the node's override rows, removed ones dropped.
+# Pins that exist only as overrides sort after the template's.
+EFFECTIVE_PINS = """
+    effective_pin AS (
+        SELECT COALESCE(o.node_key, t.node_key) AS node_key,
+               COALESCE(o.key, t.key) AS key,
+               CASE WHEN t.key IS NULL THEN 100000 + o.ordinal ELSE t.ordinal END AS ordinal,
+               COALESCE(o.label, t.label) AS label,
+               COALESCE(o.type, t.type) AS type,
+               COALESCE(o.spec, t.spec) AS spec
+        FROM (
+            SELECT n.key AS node_key, tp.pin->>0 AS key, tp.ord::int - 1 AS ordinal,
+                   tp.pin->>1 AS label, tp.pin->>2 AS type, tp.pin->>3 AS spec
+            FROM diagram_node n
+            JOIN device_model m ON m.id = n.device_model_id
+            CROSS JOIN LATERAL jsonb_array_elements(m.pins) WITH ORDINALITY AS tp(pin, ord)
+            WHERE n.diagram_id = :diagram_id
+        ) t
+        FULL JOIN (
+            SELECT node_key, key, ordinal, label, type, spec, removed
+            FROM diagram_pin WHERE diagram_id = :diagram_id
+        ) o ON o.node_key = t.node_key AND o.key = t.key
+        WHERE NOT COALESCE(o.removed, false)
+    )
+"""
+
+_INSERT_NODES = text("""
+    INSERT INTO diagram_node (diagram_id, key, type, device_type, manufacturer, model, device_model_id,
+                              color, x, y, notes, thumbnail, extra)
+    SELECT :diagram_id, n->>'id', n->>'type', n->>'device_type', n->>'manufacturer',
+           n->>'model', (n->>'device_model_id')::int, n->>'color',
+           COALESCE((n->'position'->>'x')::float, 0), COALESCE((n->'position'->>'y')::float, 0),
+           n->>'notes', n->>'thumbnail',
+           NULLIF(n - CAST(:node_columns AS text[]), '{}'::jsonb)
+    FROM jsonb_array_elements(CAST(:doc AS jsonb)->'nodes') WITH ORDINALITY AS t(n, ord)
+    ORDER BY ord
+""")
+
+# A node's ``pins`` list is stored as-is, except that for a node with a
+# device model the pins equal to the template pin with the same id are left
+# out and template pins missing from the list get a ``removed`` row.
+_INSERT_PINS = text("""
+    WITH nodes AS (
+        SELECT n FROM jsonb_array_elements(CAST(:doc AS jsonb)->'nodes') AS n
+    ), template AS (
+        SELECT m.id, m.pins, jsonb_object_agg(tp->>0, tp) AS by_id
+        FROM device_model m
+        CROSS JOIN LATERAL jsonb_array_elements(m.pins) AS tp
+        WHERE m.id IN (SELECT (n->>'device_model_id')::int FROM nodes)
+        GROUP BY m.id
+    )
+    INSERT INTO diagram_pin (diagram_id, node_key, key, ordinal, label, type, spec, removed)
+    SELECT :diagram_id, n->>'id', p->>'id', p_ord - 1, p->>'label', p->>'type', p->>'spec', false
+    FROM nodes
+    CROSS JOIN LATERAL jsonb_array_elements(COALESCE(n->'pins', '[]'::jsonb)) WITH ORDINALITY AS t(p, p_ord)
+    LEFT JOIN template m ON m.id = (n->>'device_model_id')::int
+    WHERE m.by_id -> (p->>'id') IS DISTINCT FROM
+          jsonb_build_array(p->'id', p->'label', p->'type', p->'spec')
+    UNION ALL
+    SELECT :diagram_id, n->>'id', tp->>0, 0, NULL, NULL, NULL, true
+    FROM nodes
+    JOIN template m ON m.id = (n->>'device_model_id')::int
+    CROSS JOIN LATERAL jsonb_array_elements(m.pins) AS tp
+    WHERE jsonb_typeof(n->'pins') = 'array'
+      AND NOT n->'pins' @> jsonb_build_array(jsonb_build_object('id', tp->0))
+""")
+
+_INSERT_EDGES = text("""
+    INSERT INTO diagram_edge (diagram_id, key, source_node, source_pin, target_node, target_pin, extra)
+    SELECT :diagram_id, e->>'id', e->>'source', e->>'sourceHandle', e->>'target', e->>'targetHandle',
+           NULLIF(e - CAST(:edge_columns AS text[]), '{}'::jsonb)
+    FROM jsonb_array_elements(CAST(:doc AS jsonb)->'edges') WITH ORDINALITY AS t(e, ord)
+    ORDER BY ord
+""")
+
+# Override rows of nodes re-submitted without ``pins`` survive a full replace.
+_KEEP_PINS = text("""
+    CREATE TEMPORARY TABLE kept_pin ON COMMIT DROP AS
+    SELECT node_key, key, ordinal, label, type, spec, removed
+    FROM diagram_pin
+    WHERE diagram_id = :diagram_id AND node_key = ANY(:node_keys)
+""")
+
+_RESTORE_PINS = text("""
+    INSERT INTO diagram_pin (diagram_id, node_key, key, ordinal, label, type, spec, removed)
+    SELECT :diagram_id, k.node_key, k.key, k.ordinal, k.label, k.type, k.spec, k.removed
+    FROM kept_pin k
+    JOIN diagram_node n ON n.diagram_id = :diagram_id AND n.key = k.node_key
+""")
+
+_PIN_OBJECT = "jsonb_build_object('id', key, 'label', label, 'type', type, 'spec', spec)"
+
+_LOAD_DOCUMENT = """
+    WITH {effective_pins}
+    SELECT json_build_object(
+        'id', d.id,
+        'name', d.name,
+        'version', d.version,
+        'nodes', COALESCE((
+            SELECT json_agg(
+                jsonb_build_object(
+                    'id', n.key, 'type', n.type, 'device_type', n.device_type,
+                    'manufacturer', n.manufacturer, 'model', n.model, 'color', n.color,
+                    'position', jsonb_build_object('x', n.x, 'y', n.y),
+                    {pins_key}, COALESCE(p.pins, {pins_empty}),
+                    'notes', n.notes, 'thumbnail', n.thumbnail
+                ) || CASE WHEN n.device_model_id IS NULL THEN '{{}}'::jsonb
+                          ELSE jsonb_build_object('device_model_id', n.device_model_id) END
+                  || COALESCE(n.extra, '{{}}'::jsonb)
+                ORDER BY n.id)
+            FROM diagram_node n
+            LEFT JOIN (
+                SELECT node_key, {pins_agg} AS pins
+                FROM effective_pin
+                GROUP BY node_key
+            ) p ON p.node_key = n.key
+            WHERE n.diagram_id = d.id
+        ), '[]'::json),
+        'edges', COALESCE((
+            SELECT json_agg(
+                jsonb_build_object(
+                    'id', e.key, 'source', e.source_node, 'sourceHandle', e.source_pin,
+                    'target', e.target_node, 'targetHandle', e.target_pin
+                ) || COALESCE(e.extra, '{{}}'::jsonb)
+                ORDER BY e.id)
+            FROM diagram_edge e
+            WHERE e.diagram_id = d.id
+        ), '[]'::json)
+    )::text
+    FROM diagram d
+    WHERE d.id = :diagram_id
+"""
+
+# Also the body of history snapshots (app/services/history.py).
+DOCUMENT_WITH_PINS_SQL = _LOAD_DOCUMENT.format(
+    effective_pins=EFFECTIVE_PINS, pins_key="'pins'", pins_empty="'[]'::jsonb",
+    pins_agg=f"jsonb_agg({_PIN_OBJECT} ORDER BY ordinal)")
+_LOAD_DOCUMENT_WITH_PINS = text(DOCUMENT_WITH_PINS_SQL)
+_LOAD_DOCUMENT_SUMMARY = text(_LOAD_DOCUMENT.format(
+    effective_pins=EFFECTIVE_PINS, pins_key="'pin_count'", pins_empty='0', pins_agg='count(*)'))
+
+_LOAD_NODE_PINS = text(f"""
+    WITH {EFFECTIVE_PINS}
+    SELECT node_key, jsonb_agg({_PIN_OBJECT} ORDER BY ordinal)::text
+    FROM effective_pin
+    WHERE node_key = ANY(:node_keys)
+    GROUP BY node_key
+""")
+
+
+def insert_nodes(diagram_id, nodes, raw=None):
+    """Insert ``nodes`` (with their pins) into a diagram with two statements."""
+    doc = raw if raw is not None else json.dumps({'nodes': nodes})
+    params = {'diagram_id': diagram_id, 'doc': doc}
+    db.session.execute(_INSERT_NODES, dict(params, node_columns=list(NODE_COLUMNS)))
+    db.session.execute(_INSERT_PINS, params)
+
+
+def insert_edges(diagram_id, edges, raw=None):
+    doc = raw if raw is not None else json.dumps({'edges': edges})
+    db.session.execute(_INSERT_EDGES, {'diagram_id': diagram_id, 'doc': doc,
+                                       'edge_columns': list(EDGE_COLUMNS)})
+
+
+def replace_contents(diagram_id, nodes, edges, raw=None):
+    """Replace every node, pin and edge of a diagram.
+
+    ``raw`` may be the already-serialized request body containing ``nodes``
+    and ``edges``; it is passed to Postgres as-is to skip re-encoding. Nodes
+    without a ``pins`` key (as sent back from a summary load) keep the pins
+    they had.
+    """
+    keep = [node['id'] for node in nodes if 'pins' not in node]
+    if keep:
+        db.session.execute(_KEEP_PINS, {'diagram_id': diagram_id, 'node_keys': keep})
+    db.session.execute(delete(DiagramNode.__table__).where(DiagramNode.diagram_id == diagram_id))
+    if nodes:
+        insert_nodes(diagram_id, nodes, raw=raw)
+    if keep:
+        db.session.execute(_RESTORE_PINS, {'diagram_id': diagram_id})
+        db.session.execute(text('DROP TABLE kept_pin'))
+    if edges:
+        insert_edges(diagram_id, edges, raw=raw)
+
+
+def save_document(diagram, doc, raw=None):
+    """Validate ``doc`` and make it the new contents of ``diagram`` (not committed)."""
+    nodes, edges = validate_document(doc)
+    if 'name' in doc:
+        name = doc['name']
+        if not isinstance(name, str) or not name.strip() or len(name) > 128:
+            raise DiagramError("name must be 1-128 characters.")
+        diagram.name = name.strip()
+    if diagram.id is None:
+        db.session.flush()
+    replace_contents(diagram.id, nodes, edges, raw=raw)
+    diagram.version = (diagram.version or 0) + 1
+    diagram.updated_at = datetime.utcnow()
+    return diagram
+
+
+def load_document_json(diagram_id, pins=False):
+    """The whole diagram as one JSON string built by Postgres, or None.
+
+    Nodes carry ``pin_count`` instead of their pins unless ``pins`` is true.
+    """
+    stmt = _LOAD_DOCUMENT_WITH_PINS if pins else _LOAD_DOCUMENT_SUMMARY
+    return db.session.execute(stmt, {'diagram_id': diagram_id}).scalar()
+
+
+def load_node_pins_json(diagram_id, node_keys):
+    """``{node key: pins JSON text}`` for the given nodes (absent when a node has no pins)."""
+    rows = db.session.execute(_LOAD_NODE_PINS, {'diagram_id': diagram_id, 'node_keys': list(node_keys)})
+    return dict(rows.all())
+
+
+def diagram_summary(diagram):
+    return {
+        'id': diagram.id,
+        'name': diagram.name,
+        'version': diagram.version,
+        'updated_at': diagram.updated_at.isoformat() if diagram.updated_at else None,
+    }
+
+
+def iter_chunks(document, size=65536):
+    """Yield a pre-serialized document in fixed-size slices for a streamed response."""
+    for start in range(0, len(document), size):
+        yield document[start:start + size]
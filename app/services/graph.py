@@ -0,0 +1,312 @@
+# app/services/graph.py
+"""Signal-flow analytics over a diagram's nodes and edges.
+
+``SignalGraph`` keeps per-node adjacency sets over the edges, so upstream and
+downstream traces are plain BFS walks, and feedback loops are found with an
+iterative Tarjan SCC pass. A device is treated as routing every input to
+every output. Edges between ``control`` pins (Ethernet and the like) are not
+signal flow; they count only when grouping devices into systems.
+
+Systems (connected components) are kept in a union-find with per-root member
+sets. Adding an edge is one union. Removing an edge or node recomputes only
+the component it belonged to.
+
+Graphs of saved diagrams are cached per version in ``diagram_cache``. A newer
+version is reached by replaying the change feed (app/services/sync.py) onto
+a copy of the newest cached graph instead of reloading the diagram.
+"""
+
+from collections import deque
+
+from app import diagram_cache
+from app.services.connections import diagram_index
+from app.services.device_models import effective_pins
+from app.services.sync import changes_since
+
+# Beyond this many ops since the newest cached graph, rebuild from the tables.
+MAX_REPLAY_OPS = 2000
+
+UPSTREAM = 'upstream'
+DOWNSTREAM = 'downstream'
+
+
+class SignalGraph:
+    """Directed edge adjacency plus union-find systems for one diagram version."""
+
+    def __init__(self, version=0):
+        self.version = version
+        self.pin_types = {}  # (node, pin) -> pin type
+        self.edges = {}      # edge id -> (source, source_pin, target, target_pin)
+        self.outgoing = {}   # node -> set of edge ids
+        self.incoming = {}   # node -> set of edge ids
+        self.parent = {}     # union-find over nodes
+        self.members = {}    # root -> set of nodes in that system
+
+    @classmethod
+    def from_index(cls, index, version=0):
+        """Build from a ``DiagramIndex`` (app/services/connections.py)."""
+        graph = cls(version)
+        for node in index.nodes:
+            graph.add_node(node)
+        for (node, pin), record in index.pins.items():
+            graph.pin_types[node, pin] = record.type
+        for edge_key, ((source, source_pin), (target, target_pin)) in index.edges.items():
+            graph.connect(edge_key, source, source_pin, target, target_pin)
+        return graph
+
+    def copy(self):
+        other = SignalGraph(self.version)
+        other.pin_types = dict(self.pin_types)
+        other.edges = dict(self.edges)
+        other.outgoing = {node: set(keys) for node, keys in self.outgoing.items()}
+        other.incoming = {node: set(keys) for node, keys in self.incoming.items()}
+        other.parent = dict(self.parent)
+        other.members = {root: set(nodes) for root, nodes in self.members.items()}
+        return other
+
+    # -- union-find -------------------------------------------------------
+
+    def find(self, node):
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def _union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a] |= self.members.pop(b)
+
+    def _recompute(self, root):
+        """Relabel the former system ``root`` by BFS after an edge or node left it."""
+        unseen = {node for node in self.members.pop(root) if node in self.parent}
+        while unseen:
+            start = unseen.pop()
+            part = {start}
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for neighbour in self._neighbours(node):
+                    if neighbour in unseen:
+                        unseen.discard(neighbour)
+                        part.add(neighbour)
+                        queue.append(neighbour)
+            for node in part:
+                self.parent[node] = start
+            self.members[start] = part
+
+    def _neighbours(self, node):
+        for edge_key in self.outgoing.get(node, ()):
+            yield self.edges[edge_key][2]
+        for edge_key in self.incoming.get(node, ()):
+            yield self.edges[edge_key][0]
+
+    # -- mutation -----------------------------------------------------------
+
+    def add_node(self, node):
+        if node not in self.parent:
+            self.parent[node] = node
+            self.members[node] = {node}
+            self.outgoing[node] = set()
+            self.incoming[node] = set()
+
+    def remove_node(self, node):
+        if node not in self.parent:
+            return
+        root = self.find(node)
+        for edge_key in self.outgoing.pop(node) | self.incoming.pop(node):
+            source, _, target, _ = self.edges.pop(edge_key)
+            self.incoming.get(target, set()).discard(edge_key)
+            self.outgoing.get(source, set()).discard(edge_key)
+        for key in [k for k in self.pin_types if k[0] == node]:
+            del self.pin_types[key]
+        del self.parent[node]
+        self._recompute(root)
+
+    def connect(self, edge_key, source, source_pin, target, target_pin):
+        self.add_node(source)
+        self.add_node(target)
+        self.edges[edge_key] = (source, source_pin, target, target_pin)
+        self.outgoing[source].add(edge_key)
+        self.incoming[target].add(edge_key)
+        self._union(source, target)
+
+    def disconnect(self, edge_key):
+        ends = self.edges.pop(edge_key, None)
+        if ends is None:
+            return
+        source, _, target, _ = ends
+        self.outgoing[source].discard(edge_key)
+        self.incoming[target].discard(edge_key)
+        self._recompute(self.find(source))
+
+    def remove_pin(self, node, pin):
+        self.pin_types.pop((node, pin), None)
+        for edge_key in list(self.outgoing.get(node, ())) + list(self.incoming.get(node, ())):
+            source, source_pin, target, target_pin = self.edges[edge_key]
+            if (source, source_pin) == (node, pin) or (target, target_pin) == (node, pin):
+                self.disconnect(edge_key)
+
+    def apply_op(self, op):
+        """Mirror one change-feed op (see app/services/sync.py)."""
+        kind = op['op']
+        if kind == 'add_node':
+            node = op['node']
+            self.add_node(node['id'])
+            for pin in effective_pins(node):
+                self.pin_types[node['id'], pin['id']] = pin.get('type')
+        elif kind == 'remove_node':
+            self.remove_node(op['node'])
+        elif kind == 'add_pin':
+            self.pin_types[op['node'], op['pin']['id']] = op['pin'].get('type')
+        elif kind == 'remove_pin':
+            self.remove_pin(op['node'], op['pin'])
+        elif kind == 'connect':
+            edge = op['edge']
+            self.connect(edge['id'], edge['source'], edge.get('sourceHandle'),
+                         edge['target'], edge.get('targetHandle'))
+        elif kind == 'disconnect':
+            self.disconnect(op['edge'])
+
+    # -- queries ------------------------------------------------------------
+
+    def is_signal(self, edge_key):
+        source, source_pin = self.edges[edge_key][:2]
+        return self.pin_types.get((source, source_pin)) != 'control'
+
+    def trace(self, node, pin=None, direction=UPSTREAM, max_depth=None):
+        """Devices and edges feeding (``upstream``) or fed by (``downstream``) a node or pin.
+
+        From an input pin upstream follows only the edge into that pin; from
+        an output pin downstream follows only the edges leaving it. Returns
+        ``{'nodes': [{'id', 'depth'}], 'edges': [...]}`` in BFS order. Any
+        other pin traces the whole device.
+        """
+        if node not in self.parent:
+            raise KeyError(node)
+        upstream = direction == UPSTREAM
+        adjacency = self.incoming if upstream else self.outgoing
+        end = 0 if upstream else 2  # index of the far node in an edge tuple
+        pin_end = 3 if upstream else 1  # index of this pin in an edge tuple
+
+        first = [k for k in adjacency[node] if self.is_signal(k)]
+        if pin is not None and self.pin_types.get((node, pin)) == ('input' if upstream else 'output'):
+            first = [k for k in first if self.edges[k][pin_end] == pin]
+
+        depths = {node: 0}
+        nodes, edges = [], []
+        queue = deque((edge_key, 1) for edge_key in first)
+        while queue:
+            edge_key, depth = queue.popleft()
+            edges.append(edge_key)
+            far = self.edges[edge_key][end]
+            if far in depths:
+                continue
+            depths[far] = depth
+            nodes.append({'id': far, 'depth': depth})
+            if max_depth is None or depth < max_depth:
+                queue.extend((k, depth + 1) for k in adjacency[far] if self.is_signal(k))
+        return {'nodes': nodes, 'edges': edges}
+
+    def loops(self):
+        """Feedback loops: strongly connected groups of two or more devices.
+
+        Each loop is ``{'nodes': [...], 'edges': [...]}`` with the signal
+        edges inside the group.
+        """
+        index, low, on_stack = {}, {}, set()
+        stack, found = [], []
+        counter = 0
+        for start in self.parent:
+            if start in index:
+                continue
+            work = [(start, iter(self._signal_successors(start)))]
+            index[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for succ in successors:
+                    if succ not in index:
+                        index[succ] = low[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack.add(succ)
+                        work.append((succ, iter(self._signal_successors(succ))))
+                        advanced = True
+                        break
+                    if succ in on_stack:
+                        low[node] = min(low[node], index[succ])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    group = set()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        group.add(member)
+                        if member == node:
+                            break
+                    if len(group) > 1:
+                        found.append(group)
+        return [{
+            'nodes': sorted(group),
+            'edges': sorted(k for node in group for k in self.outgoing[node]
+                            if self.is_signal(k) and self.edges[k][2] in group),
+        } for group in found]
+
+    def _signal_successors(self, node):
+        return [self.edges[k][2] for k in self.outgoing[node] if self.is_signal(k)]
+
+    def system_of(self, node):
+        return sorted(self.members[self.find(node)])
+
+    def systems(self):
+        """Every system as a sorted node list, largest first."""
+        return sorted((sorted(nodes) for nodes in self.members.values()),
+                      key=lambda nodes: (-len(nodes), nodes))
+
+
+def _advance(diagram):
+    """The newest cached graph brought up to ``diagram.version`` via the change feed, or None."""
+    latest = diagram_cache.get(('graph', diagram.id, 'latest'))
+    if latest is None or latest.version >= diagram.version:
+        return None
+    changes = changes_since(diagram.id, latest.version, limit=MAX_REPLAY_OPS + 1)
+    if (len(changes) > MAX_REPLAY_OPS or not changes
+            or changes[0]['version'] != latest.version + 1  # pruned past the cached graph
+            or changes[-1]['version'] != diagram.version
+            or any(change['op'] == 'replace' for change in changes)):
+        return None
+    graph = latest.copy()
+    for change in changes:
+        graph.apply_op(change)
+    graph.version = diagram.version
+    return graph
+
+
+def diagram_graph(diagram):
+    """The signal graph of a saved diagram at its current version."""
+    key = ('graph', diagram.id, diagram.version)
+    graph = diagram_cache.get(key)
+    if graph is None:
+        graph = _advance(diagram)
+        if graph is None:
+            graph = SignalGraph.from_index(diagram_index(diagram), version=diagram.version)
+        diagram_cache.set(key, graph)
+        latest = diagram_cache.get(('graph', diagram.id, 'latest'))
+        if latest is None or latest.version < graph.version:
+            diagram_cache.set(('graph', diagram.id, 'latest'), graph)
+    return graph
@@ -0,0 +1,306 @@
+# app/services/history.py
+"""Diagram history: the change feed as an event log, plus periodic snapshots.
+
+``diagram_change`` (see app/services/sync.py) is the append-only log: every
+op, the version it produced and the user who sent it. ``diagram_snapshot``
+holds the whole document, with effective pins inlined, at some of those
+versions. A snapshot is taken in the same transaction as
+
+* every full save, since a ``replace`` op does not carry the document, and
+* any patch that brings the ops since the last snapshot to
+  ``HISTORY_SNAPSHOT_EVENTS`` events or ``HISTORY_SNAPSHOT_BYTES`` bytes of
+  payload.
+
+With ``HISTORY_SNAPSHOT_FORMAT = 'jsonb'`` the check and the copy are a
+single ``INSERT ... SELECT ... WHERE``. The default, ``'packed'``, reads the
+document only when a snapshot is due and stores it in the compact format of
+app/services/packing.py: device metadata and pin lists are interned into
+``diagram_blob``, shared by every snapshot of every diagram. ``document_at``
+rebuilds any version from the newest snapshot at or below it plus a short
+replay in Python, so restore cost stays bounded however long the history
+grows; ``node_at`` does the same for one node, decoding only its block.
+
+``prune_history`` keeps, per diagram, the newest snapshot taken before a
+cutoff and everything after it. Older ops and snapshots are deleted,
+optionally archived as JSON lines first, along with blobs no snapshot refers
+to any more. Versions from the kept snapshot on can still be rebuilt. Replay
+uses today's device model templates for nodes that were added without a pin
+list.
+"""
+
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from app.models.diagram import DiagramBlob, DiagramChange, DiagramSnapshot
+from app.models.user import User
+from app.services.device_models import PIN_FIELDS, effective_pins
+from app.services.diagrams import DOCUMENT_WITH_PINS_SQL
+from app.services.packing import pack_document, unpack_document, unpack_node
+
+MAX_HISTORY_PAGE = 500
+
+_PENDING = """
+    WITH last AS (
+        SELECT COALESCE(max(version), -1) AS version
+        FROM diagram_snapshot WHERE diagram_id = :diagram_id
+    ), pending AS (
+        SELECT count(*) AS events, COALESCE(sum(pg_column_size(c.payload)), 0) AS bytes
+        FROM diagram_change c, last
+        WHERE c.diagram_id = :diagram_id AND c.version > last.version
+    )
+"""
+_DUE = ":force OR pending.events >= :max_events OR pending.bytes >= :max_bytes"
+_SNAPSHOT = text(f"""
+    {_PENDING}
+    INSERT INTO diagram_snapshot (diagram_id, version, document, created_at)
+    SELECT :diagram_id, :version, CAST(({DOCUMENT_WITH_PINS_SQL}) AS jsonb) - 'version', :now
+    FROM pending
+    WHERE {_DUE}
+""")
+# The packed format is encoded in Python: fetch the document only when due.
+_DUE_DOCUMENT = text(f"""
+    {_PENDING}
+    SELECT ({DOCUMENT_WITH_PINS_SQL})
+    FROM pending
+    WHERE {_DUE}
+""")
+
+# Per diagram, the newest snapshot taken before :before is kept with everything after it.
+_KEPT = """
+    kept AS (
+        SELECT diagram_id, max(version) AS version
+        FROM diagram_snapshot WHERE created_at < :before
+        GROUP BY diagram_id
+    )
+"""
+_PRUNE_CHANGES = text(f"""
+    WITH {_KEPT}
+    DELETE FROM diagram_change c USING kept
+    WHERE c.diagram_id = kept.diagram_id AND c.version <= kept.version
+    RETURNING c.id, c.diagram_id, c.version, c.user_id, c.op, c.payload, c.created_at
+""")
+_PRUNE_SNAPSHOTS = text(f"""
+    WITH {_KEPT}
+    DELETE FROM diagram_snapshot s USING kept
+    WHERE s.diagram_id = kept.diagram_id AND s.version < kept.version
+    RETURNING s.id, s.diagram_id, s.version, s.document, s.packed, s.created_at
+""")
+# Interning bumps used_at, so a blob a concurrent snapshot is about to refer to is never older than :before.
+_PRUNE_BLOBS = text("""
+    DELETE FROM diagram_blob b
+    WHERE b.used_at < :before
+      AND NOT EXISTS (SELECT 1 FROM diagram_snapshot s WHERE s.blobs @> ARRAY[b.hash])
+""")
+
+
+class HistoryUnavailable(Exception):
+    """The version cannot be rebuilt (pruned, or from before snapshots existed)."""
+
+
+def snapshot(diagram_id, version, force=False):
+    """Snapshot the diagram as ``version`` if forced or due; True if one was taken."""
+    config = current_app.config
+    db.session.flush()  # the document is read back by SQL
+    params = {
+        'diagram_id': diagram_id, 'version': version, 'now': datetime.utcnow(), 'force': force,
+        'max_events': config['HISTORY_SNAPSHOT_EVENTS'], 'max_bytes': config['HISTORY_SNAPSHOT_BYTES'],
+    }
+    if config['HISTORY_SNAPSHOT_FORMAT'] == 'jsonb':
+        return db.session.execute(_SNAPSHOT, params).rowcount == 1
+    raw = db.session.execute(_DUE_DOCUMENT, params).scalar()
+    if raw is None:
+        return False
+    doc = json.loads(raw)
+    doc.pop('version')
+    body, blobs = pack_document(doc)
+    intern_blobs(blobs, params['now'])
+    db.session.add(DiagramSnapshot(diagram_id=diagram_id, version=version, packed=body,
+                                   blobs=list(blobs), created_at=params['now']))
+    db.session.flush()
+    return True
+
+
+def intern_blobs(blobs, now):
+    """Store ``{hash: data}`` in diagram_blob, marking existing blobs as used ``now``."""
+    if not blobs:
+        return
+    # Sorted, so concurrent snapshots lock shared blobs in the same order.
+    stmt = pg_insert(DiagramBlob).values([
+        {'hash': key, 'data': blobs[key], 'used_at': now} for key in sorted(blobs)])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[DiagramBlob.hash], set_={'used_at': stmt.excluded.used_at}))
+
+
+def load_blobs(hashes):
+    """``{hash: data}`` for the given blob hashes."""
+    rows = db.session.execute(
+        select(DiagramBlob.hash, DiagramBlob.data).where(DiagramBlob.hash.in_(list(hashes)))).all()
+    return {bytes(row.hash): bytes(row.data) for row in rows}
+
+
+def _node(node):
+    # Shaped like a node of a loaded document.
+    shaped = dict({key: None for key in ('type', 'device_type', 'manufacturer', 'model', 'color',
+                                         'notes', 'thumbnail')}, **node)
+    position = node.get('position') or {}
+    shaped['position'] = {'x': position.get('x', 0), 'y': position.get('y', 0)}
+    shaped['pins'] = [_pin(pin) for pin in effective_pins(node)]
+    return shaped
+
+
+def _pin(pin):
+    return {field: pin.get(field) for field in PIN_FIELDS}
+
+
+def _edge(edge):
+    return dict({'sourceHandle': None, 'targetHandle': None}, **edge)
+
+
+def _touches(edge, node, pin=None):
+    return ((edge['source'] == node and pin in (None, edge.get('sourceHandle')))
+            or (edge['target'] == node and pin in (None, edge.get('targetHandle'))))
+
+
+def replay(doc, ops):
+    """Apply change-feed ops to a loaded document, as app/services/sync.py does in SQL."""
+    nodes = {node['id']: node for node in doc['nodes']}
+    edges = {edge['id']: edge for edge in doc['edges']}
+    for op in ops:
+        kind = op['op']
+        if kind == 'replace':
+            raise HistoryUnavailable("A full save cannot be replayed without its snapshot.")
+        if kind == 'move_node':
+            nodes[op['node']]['position'] = {'x': op['position']['x'], 'y': op['position']['y']}
+        elif kind == 'update_node':
+            nodes[op['node']].update(op['fields'])
+        elif kind == 'add_node':
+            nodes[op['node']['id']] = _node(op['node'])
+        elif kind == 'remove_node':
+            del nodes[op['node']]
+            edges = {key: e for key, e in edges.items() if not _touches(e, op['node'])}
+        elif kind == 'add_pin':
+            nodes[op['node']]['pins'].append(_pin(op['pin']))
+        elif kind == 'remove_pin':
+            node = nodes[op['node']]
+            node['pins'] = [p for p in node['pins'] if p['id'] != op['pin']]
+            edges = {key: e for key, e in edges.items() if not _touches(e, op['node'], op['pin'])}
+        elif kind == 'connect':
+            edges[op['edge']['id']] = _edge(op['edge'])
+        elif kind == 'disconnect':
+            edges.pop(op['edge'], None)
+    doc['nodes'] = list(nodes.values())
+    doc['edges'] = list(edges.values())
+    return doc
+
+
+def _base(diagram_id, version):
+    """``(snapshot, ops)``: the newest snapshot at or below ``version`` and the ops after it."""
+    base = db.session.execute(
+        select(DiagramSnapshot.version, DiagramSnapshot.document, DiagramSnapshot.packed)
+        .where(DiagramSnapshot.diagram_id == diagram_id, DiagramSnapshot.version <= version)
+        .order_by(DiagramSnapshot.version.desc())
+        .limit(1)
+    ).first()
+    if base is None:
+        raise HistoryUnavailable(f"Version {version} is no longer available.")
+    rows = db.session.execute(
+        select(DiagramChange.version, DiagramChange.payload)
+        .where(DiagramChange.diagram_id == diagram_id,
+               DiagramChange.version > base.version, DiagramChange.version <= version)
+        .order_by(DiagramChange.id)
+    ).all()
+    if version > base.version and (not rows or rows[0].version != base.version + 1
+                                   or rows[-1].version != version):
+        raise HistoryUnavailable(f"The changes leading to version {version} are missing.")
+    return base, [row.payload for row in rows]
+
+
+def _document(base):
+    if base.packed is None:
+        return base.document
+    return unpack_document(base.packed, load_blobs)
+
+
+def document_at(diagram_id, version):
+    """The diagram's document as it was at ``version``; raises HistoryUnavailable."""
+    base, ops = _base(diagram_id, version)
+    return dict(replay(_document(base), ops), version=version)
+
+
+def _node_op(op, key):
+    node = op.get('node')
+    return (node['id'] if isinstance(node, dict) else node) == key or op['op'] == 'replace'
+
+
+def node_at(diagram_id, version, key):
+    """Node ``key`` as it was at ``version``, or None if it did not exist; raises HistoryUnavailable."""
+    base, ops = _base(diagram_id, version)
+    if base.packed is not None:
+        node = unpack_node(base.packed, key, load_blobs)
+    else:
+        node = next((n for n in base.document['nodes'] if n['id'] == key), None)
+    doc = replay({'nodes': [node] if node else [], 'edges': []}, [op for op in ops if _node_op(op, key)])
+    return doc['nodes'][0] if doc['nodes'] else None
+
+
+def earliest_version(diagram_id):
+    """The oldest version ``document_at`` can rebuild, or None."""
+    return db.session.execute(
+        select(func.min(DiagramSnapshot.version)).where(DiagramSnapshot.diagram_id == diagram_id)
+    ).scalar()
+
+
+def change_log(diagram_id, before=None, limit=100):
+    """``(items, next)``: ops newest first with who made them.
+
+    ``before`` is the ``next`` cursor of the previous page.
+    """
+    stmt = (
+        select(DiagramChange.id, DiagramChange.version, DiagramChange.payload, DiagramChange.created_at,
+               DiagramChange.user_id, User.username)
+        .outerjoin(User, User.id == DiagramChange.user_id)
+        .where(DiagramChange.diagram_id == diagram_id)
+        .order_by(DiagramChange.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        stmt = stmt.where(DiagramChange.id < before)
+    rows = db.session.execute(stmt).all()
+    items = [{
+        'id': row.id, 'version': row.version, 'change': row.payload,
+        'user_id': row.user_id, 'username': row.username,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    } for row in rows[:limit]]
+    return items, items[-1]['id'] if len(rows) > limit else None
+
+
+def prune_history(before, archive=None):
+    """Drop history older than each diagram's newest snapshot taken before ``before``.
+
+    ``archive`` is a text file that receives every deleted change and
+    snapshot as one JSON line (``{"table": ..., ...}``, packed snapshots as
+    their document) before the deletion is committed. Returns the number of
+    rows deleted per table.
+    """
+    counts = {}
+    for table, stmt in (('diagram_change', _PRUNE_CHANGES), ('diagram_snapshot', _PRUNE_SNAPSHOTS)):
+        counts[table] = 0
+        for row in db.session.execute(stmt, {'before': before}).mappings():
+            counts[table] += 1
+            if archive is not None:
+                row = dict(row, table=table)
+                packed = row.pop('packed', None)
+                if packed is not None:
+                    # Archived as a plain document, so the archive does not need the blobs.
+                    row['document'] = unpack_document(packed, load_blobs)
+                archive.write(json.dumps(row, default=str) + '\n')
+    counts['diagram_blob'] = db.session.execute(_PRUNE_BLOBS, {'before': before}).rowcount
+    if archive is not None:
+        archive.flush()
+    db.session.commit()
+    return counts
@@ -0,0 +1,151 @@
+# app/services/packing.py
+"""Compact binary encoding of whole diagram documents.
+
+A loaded document repeats the same device metadata (type, manufacturer,
+model, colour, ...) and often the same pin list for every instance of a
+device. A packed document stores each of those sub-objects once, as a
+MessagePack blob keyed by its 16-byte BLAKE2b hash; the caller keeps the
+blobs in a shared, deduplicated table. Nodes keep only their id, position,
+the two blob hashes and any remaining fields.
+
+The packed body is a MessagePack map whose node records sit in
+zstd-compressed blocks of ``BLOCK_SIZE`` nodes, plus one block for the
+edges. ``unpack_node`` decompresses the one block holding a node and fetches
+that node's two blobs; the rest of the document stays compressed.
+
+This module is pure codec. Storing the blobs is the caller's job (see
+app/services/history.py).
+"""
+
+import hashlib
+
+import msgpack
+import zstandard
+
+from app.services.device_models import PIN_FIELDS
+
+FORMAT = 1
+BLOCK_SIZE = 256
+ZSTD_LEVEL = 3
+
+# Node fields interned together as the device metadata blob.
+META_FIELDS = ('type', 'device_type', 'manufacturer', 'model', 'device_model_id', 'color', 'thumbnail')
+EDGE_FIELDS = ('id', 'source', 'sourceHandle', 'target', 'targetHandle')
+
+
+class PackError(ValueError):
+    """The body is not a packed document this version understands."""
+
+
+def blob_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _intern(value, blobs):
+    data = msgpack.packb(value)
+    key = blob_hash(data)
+    blobs.setdefault(key, data)
+    return key
+
+
+def _node_record(node, blobs):
+    meta = {field: node[field] for field in META_FIELDS if field in node}
+    pins = [[pin.get(field) for field in PIN_FIELDS] for pin in node.get('pins') or ()]
+    rest = {k: v for k, v in node.items() if k not in META_FIELDS and k not in ('id', 'position', 'pins')}
+    position = node.get('position') or {}
+    return [node['id'], position.get('x', 0), position.get('y', 0), _intern(meta, blobs),
+            _intern(pins, blobs) if 'pins' in node else None, rest or None]
+
+
+def _edge_record(edge):
+    return [edge.get(field) for field in EDGE_FIELDS] + [
+        {k: v for k, v in edge.items() if k not in EDGE_FIELDS} or None]
+
+
+def pack_document(doc, block_size=BLOCK_SIZE, level=ZSTD_LEVEL):
+    """``(body, blobs)``: the packed document and ``{hash: MessagePack bytes}`` it refers to."""
+    compressor = zstandard.ZstdCompressor(level=level)
+    blobs = {}
+    nodes = doc.get('nodes') or []
+    records = [_node_record(node, blobs) for node in nodes]
+    body = msgpack.packb({
+        'format': FORMAT,
+        'meta': {k: v for k, v in doc.items() if k not in ('nodes', 'edges')},
+        'block_size': block_size,
+        'index': [record[0] for record in records],
+        'blocks': [compressor.compress(msgpack.packb(records[i:i + block_size]))
+                   for i in range(0, len(records), block_size)],
+        'edges': compressor.compress(msgpack.packb([_edge_record(e) for e in doc.get('edges') or []])),
+        'blobs': list(blobs),
+    })
+    return body, blobs
+
+
+def _outer(body):
+    # Blocks stay compressed: only the index and the blob list are decoded here.
+    try:
+        outer = msgpack.unpackb(body)
+    except (ValueError, msgpack.ExtraData) as e:
+        raise PackError("Not a packed diagram.") from e
+    if not isinstance(outer, dict) or outer.get('format') != FORMAT:
+        raise PackError(f"Unsupported packed diagram format {outer.get('format') if isinstance(outer, dict) else None}.")
+    return outer
+
+
+def blob_refs(body):
+    """The blob hashes a packed document refers to."""
+    return _outer(body)['blobs']
+
+
+def _block(data):
+    return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(data))
+
+
+class _Decoded:
+    """Blobs decoded once per unpack, however many nodes share them."""
+
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.values = {}
+
+    def __getitem__(self, key):
+        if key not in self.values:
+            self.values[key] = msgpack.unpackb(self.blobs[key])
+        return self.values[key]
+
+
+def _node(record, decoded):
+    key, x, y, meta_ref, pins_ref, rest = record
+    node = {'id': key, **decoded[meta_ref], 'position': {'x': x, 'y': y}}
+    if pins_ref is not None:
+        node['pins'] = [dict(zip(PIN_FIELDS, pin)) for pin in decoded[pins_ref]]
+    if rest:
+        node.update(rest)
+    return node
+
+
+def _edge(record):
+    edge = dict(zip(EDGE_FIELDS, record))
+    if record[-1]:
+        edge.update(record[-1])
+    return edge
+
+
+def unpack_document(body, load_blobs):
+    """The whole document. ``load_blobs(hashes)`` returns ``{hash: bytes}`` for those hashes."""
+    outer = _outer(body)
+    decoded = _Decoded(load_blobs(outer['blobs']))
+    nodes = [_node(record, decoded) for block in outer['blocks'] for record in _block(block)]
+    return dict(outer['meta'], nodes=nodes, edges=[_edge(record) for record in _block(outer['edges'])])
+
+
+def unpack_node(body, key, load_blobs):
+    """One node, decompressing only its block; None if the document has no such node."""
+    outer = _outer(body)
+    try:
+        position = outer['index'].index(key)
+    except ValueError:
+        return None
+    record = _block(outer['blocks'][position // outer['block_size']])[position % outer['block_size']]
+    refs = [ref for ref in record[3:5] if ref is not None]
+    return _node(record, _Decoded(load_blobs(refs)))
@@ -0,0 +1,308 @@
+# app/services/sync.py
+"""Incremental diagram sync: small versioned patches instead of full re-uploads.
+
+A client sends ``{"base_version": N, "ops": [...]}``. Under a row lock on the
+diagram the ops are applied with a few targeted statements, the diagram
+version goes up by one and every op is appended to ``diagram_change`` with
+that version. A patch based on an older version is rebased when none of the
+changes since ``N`` touched the same nodes or edges (concurrent node moves
+never block each other: last write wins); otherwise it is rejected with
+``SyncConflict`` and the client catches up through ``changes_since``.
+Every new version is also announced to live streams (app/push.py), and
+the feed doubles as the diagram's history (app/services/history.py).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Float, String, bindparam, column, delete, func, insert, or_, select, text, update, values
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+
+from app import db
+from app.models.diagram import DiagramChange, DiagramEdge, DiagramNode, DiagramPin
+from app.push import notify_change
+from app.services.connections import check_patch
+from app.services.device_models import template_pins
+from app.services.history import snapshot
+from app.services.diagrams import (
+    DiagramError, NODE_COLUMNS, insert_edges, insert_nodes, require_text, validate_node, validate_pin,
+)
+
+MAX_OPS_PER_PATCH = 1000
+MAX_REBASE_CHANGES = 5000
+CHANGE_FEED_LIMIT = 1000
+
+# Node columns an ``update_node`` op may set directly; other keys go to ``extra``.
+UPDATABLE_NODE_COLUMNS = ('type', 'device_type', 'manufacturer', 'model', 'color', 'notes', 'thumbnail')
+
+OPS = ('move_node', 'update_node', 'add_node', 'remove_node',
+       'add_pin', 'remove_pin', 'connect', 'disconnect')
+
+
+class SyncConflict(Exception):
+    """The patch cannot be applied on top of the diagram's current version."""
+
+    def __init__(self, message, version):
+        super().__init__(message)
+        self.version = version
+
+
+def _key(value, what):
+    if not isinstance(value, str) or not value or len(value) > 128:
+        raise DiagramError(f"{what} must be a string id of 1-128 characters.")
+    return value
+
+
+def normalize_op(op):
+    """Validate one op and return the dict that will be applied and logged."""
+    if not isinstance(op, dict) or op.get('op') not in OPS:
+        raise DiagramError(f"Each op needs 'op' set to one of: {', '.join(OPS)}")
+    kind = op['op']
+    if kind == 'move_node':
+        position = op.get('position')
+        if not isinstance(position, dict) or not all(
+                isinstance(position.get(axis), (int, float)) for axis in ('x', 'y')):
+            raise DiagramError("move_node needs position {x, y}.")
+        return {'op': kind, 'node': _key(op.get('node'), 'node'),
+                'position': {'x': position['x'], 'y': position['y']}}
+    if kind == 'update_node':
+        fields = op.get('fields')
+        if not isinstance(fields, dict) or not fields:
+            raise DiagramError("update_node needs a non-empty fields object.")
+        if set(fields) & {'id', 'pins', 'position', 'device_model_id'}:
+            raise DiagramError("update_node cannot change id, pins, position or device_model_id.")
+        node = _key(op.get('node'), 'node')
+        require_text(fields, UPDATABLE_NODE_COLUMNS, f"Node '{node}'")
+        return {'op': kind, 'node': node, 'fields': fields}
+    if kind == 'add_node':
+        validate_node(op.get('node'))
+        return {'op': kind, 'node': op['node']}
+    if kind == 'remove_node':
+        return {'op': kind, 'node': _key(op.get('node'), 'node')}
+    if kind == 'add_pin':
+        validate_pin(op.get('pin'))
+        return {'op': kind, 'node': _key(op.get('node'), 'node'), 'pin': op['pin']}
+    if kind == 'remove_pin':
+        return {'op': kind, 'node': _key(op.get('node'), 'node'), 'pin': _key(op.get('pin'), 'pin')}
+    if kind == 'connect':
+        edge = op.get('edge')
+        if not isinstance(edge, dict):
+            raise DiagramError("connect needs an edge object.")
+        _key(edge.get('id'), 'edge id')
+        _key(edge.get('source'), 'edge source')
+        _key(edge.get('target'), 'edge target')
+        return {'op': kind, 'edge': edge}
+    return {'op': kind, 'edge': _key(op.get('edge'), 'edge')}
+
+
+def op_keys(op):
+    """The nodes and edges an op reads or writes, for conflict detection."""
+    kind = op['op']
+    if kind == 'add_node':
+        return {('node', op['node']['id'])}
+    if kind in ('move_node', 'update_node', 'remove_node', 'add_pin', 'remove_pin'):
+        return {('node', op['node'])}
+    if kind == 'connect':
+        edge = op['edge']
+        return {('edge', edge['id']), ('node', edge['source']), ('node', edge['target'])}
+    if kind == 'disconnect':
+        return {('edge', op['edge'])}
+    return set()
+
+
+def _check_rebase(diagram, base_version, ops):
+    rows = db.session.execute(
+        select(DiagramChange.version, DiagramChange.payload)
+        .where(DiagramChange.diagram_id == diagram.id, DiagramChange.version > base_version)
+        .order_by(DiagramChange.id)
+        .limit(MAX_REBASE_CHANGES + 1)
+    ).all()
+    # A missing first version means that part of the feed was pruned (app/services/history.py).
+    if len(rows) > MAX_REBASE_CHANGES or not rows or rows[0].version != base_version + 1:
+        raise SyncConflict("Too far behind; reload the diagram.", diagram.version)
+
+    blocked = set()
+    for change in (row.payload for row in rows):
+        if change['op'] == 'replace':
+            raise SyncConflict("Diagram was replaced; reload it.", diagram.version)
+        if change['op'] != 'move_node':
+            blocked |= op_keys(change)
+    wanted = set().union(*(op_keys(op) for op in ops))
+    if blocked & wanted:
+        raise SyncConflict("Conflicting changes since base_version.", diagram.version)
+
+
+def _expect(rowcount, expected, what, diagram):
+    if rowcount != expected:
+        raise SyncConflict(f"{what} no longer exists.", diagram.version)
+
+
+def _move_nodes(diagram, ops):
+    # Consecutive drags of many nodes become one UPDATE ... FROM (VALUES ...).
+    latest = {op['node']: op['position'] for op in ops}
+    rows = values(column('key', String), column('x', Float), column('y', Float), name='v').data(
+        [(key, pos['x'], pos['y']) for key, pos in latest.items()])
+    table = DiagramNode.__table__
+    result = db.session.execute(
+        update(table)
+        .where(table.c.diagram_id == diagram.id, table.c.key == rows.c.key)
+        .values(x=rows.c.x, y=rows.c.y))
+    _expect(result.rowcount, len(latest), "A moved node", diagram)
+
+
+def _update_node(diagram, op):
+    table = DiagramNode.__table__
+    fields = op['fields']
+    columns = {c: fields[c] for c in UPDATABLE_NODE_COLUMNS if c in fields}
+    extra = {k: v for k, v in fields.items() if k not in NODE_COLUMNS}
+    if extra:
+        columns['extra'] = func.coalesce(table.c.extra, text("'{}'::jsonb")).op('||')(
+            bindparam('extra', extra, type_=JSONB))
+    result = db.session.execute(
+        update(table).where(table.c.diagram_id == diagram.id, table.c.key == op['node']).values(columns))
+    _expect(result.rowcount, 1, f"Node '{op['node']}'", diagram)
+
+
+def _template_keys(diagram, node_key):
+    """Pin ids of the device model template of a node, if it has one."""
+    model_id = db.session.execute(select(DiagramNode.device_model_id).where(
+        DiagramNode.diagram_id == diagram.id, DiagramNode.key == node_key)).scalar()
+    return {pin['id'] for pin in template_pins(model_id) or ()} if model_id else set()
+
+
+def _add_pin(diagram, op):
+    pin = op['pin']
+    if pin['id'] in _template_keys(diagram, op['node']):
+        # Only a template pin hidden by a ``removed`` row can be added back.
+        pins = DiagramPin.__table__
+        result = db.session.execute(
+            update(pins)
+            .where(pins.c.diagram_id == diagram.id, pins.c.node_key == op['node'],
+                   pins.c.key == pin['id'], pins.c.removed)
+            .values(removed=False, label=pin.get('label'), type=pin.get('type'), spec=pin.get('spec')))
+        if result.rowcount != 1:
+            raise SyncConflict(f"Pin '{op['node']}/{pin['id']}' already exists.", diagram.version)
+        return
+    db.session.execute(text("""
+        INSERT INTO diagram_pin (diagram_id, node_key, key, ordinal, label, type, spec)
+        SELECT :diagram_id, :node, :key, COALESCE(MAX(ordinal) + 1, 0), :label, :type, :spec
+        FROM diagram_pin WHERE diagram_id = :diagram_id AND node_key = :node
+    """), {'diagram_id': diagram.id, 'node': op['node'], 'key': pin['id'],
+           'label': pin.get('label'), 'type': pin.get('type'), 'spec': pin.get('spec')})
+
+
+def _remove_pin(diagram, op):
+    edges = DiagramEdge.__table__
+    db.session.execute(delete(edges).where(edges.c.diagram_id == diagram.id, or_(
+        (edges.c.source_node == op['node']) & (edges.c.source_pin == op['pin']),
+        (edges.c.target_node == op['node']) & (edges.c.target_pin == op['pin']),
+    )))
+    pins = DiagramPin.__table__
+    if op['pin'] in _template_keys(diagram, op['node']):
+        # Template pins are hidden with a ``removed`` override row.
+        stmt = pg_insert(pins).values(diagram_id=diagram.id, node_key=op['node'], key=op['pin'],
+                                      ordinal=0, removed=True)
+        result = db.session.execute(stmt.on_conflict_do_update(
+            constraint='uq_diagram_pin_key',
+            set_={'removed': True, 'label': None, 'type': None, 'spec': None},
+            where=~pins.c.removed))
+    else:
+        result = db.session.execute(delete(pins).where(
+            pins.c.diagram_id == diagram.id, pins.c.node_key == op['node'], pins.c.key == op['pin']))
+    _expect(result.rowcount, 1, f"Pin '{op['node']}/{op['pin']}'", diagram)
+
+
+def _remove_node(diagram, op):
+    # Pins and edges go with it through ON DELETE CASCADE.
+    table = DiagramNode.__table__
+    result = db.session.execute(delete(table).where(
+        table.c.diagram_id == diagram.id, table.c.key == op['node']))
+    _expect(result.rowcount, 1, f"Node '{op['node']}'", diagram)
+
+
+def _disconnect(diagram, op):
+    table = DiagramEdge.__table__
+    result = db.session.execute(delete(table).where(
+        table.c.diagram_id == diagram.id, table.c.key == op['edge']))
+    _expect(result.rowcount, 1, f"Edge '{op['edge']}'", diagram)
+
+
+def _apply(diagram, ops):
+    moves = []
+    for op in ops:
+        if op['op'] == 'move_node':
+            moves.append(op)
+            continue
+        if moves:
+            _move_nodes(diagram, moves)
+            moves = []
+        kind = op['op']
+        if kind == 'update_node':
+            _update_node(diagram, op)
+        elif kind == 'add_node':
+            insert_nodes(diagram.id, [op['node']])
+        elif kind == 'remove_node':
+            _remove_node(diagram, op)
+        elif kind == 'add_pin':
+            _add_pin(diagram, op)
+        elif kind == 'remove_pin':
+            _remove_pin(diagram, op)
+        elif kind == 'connect':
+            insert_edges(diagram.id, [op['edge']])
+        elif kind == 'disconnect':
+            _disconnect(diagram, op)
+    if moves:
+        _move_nodes(diagram, moves)
+
+
+def record_changes(diagram_id, version, ops, user_id):
+    """Append ``ops`` to the change feed as version ``version``.
+
+    Call it once the ops have been applied: a history snapshot of the result
+    may be taken (always after a ``replace``), and live streams are notified
+    on commit.
+    """
+    now = datetime.utcnow()
+    db.session.execute(insert(DiagramChange.__table__), [
+        {'diagram_id': diagram_id, 'version': version, 'user_id': user_id,
+         'op': op['op'], 'payload': op, 'created_at': now}
+        for op in ops
+    ])
+    snapshot(diagram_id, version, force=any(op['op'] == 'replace' for op in ops))
+    notify_change(diagram_id, version)
+
+
+def apply_patch(diagram, base_version, ops, user_id):
+    """Apply ``ops`` to a diagram locked FOR UPDATE; return the new version.
+
+    Raises DiagramError for malformed input, InvalidConnection when a
+    ``connect`` breaks the pin rules and SyncConflict when the patch
+    cannot be rebased. Integrity errors (duplicate ids, edges to missing
+    nodes) propagate; the caller rolls back either way.
+    """
+    if not isinstance(base_version, int) or base_version < 0 or base_version > diagram.version:
+        raise DiagramError("base_version must be a known diagram version.")
+    if not isinstance(ops, list) or not ops or len(ops) > MAX_OPS_PER_PATCH:
+        raise DiagramError(f"ops must be a list of 1-{MAX_OPS_PER_PATCH} operations.")
+    ops = [normalize_op(op) for op in ops]
+
+    if base_version < diagram.version:
+        _check_rebase(diagram, base_version, ops)
+    check_patch(diagram, ops)
+    _apply(diagram, ops)
+
+    version = diagram.version + 1
+    record_changes(diagram.id, version, ops, user_id)
+    diagram.version = version
+    diagram.updated_at = datetime.utcnow()
+    return version
+
+
+def changes_since(diagram_id, since, limit=CHANGE_FEED_LIMIT):
+    """Ops with a version above ``since`` in apply order, at most ``limit``."""
+    rows = db.session.execute(
+        select(DiagramChange.version, DiagramChange.user_id, DiagramChange.payload)
+        .where(DiagramChange.diagram_id == diagram_id, DiagramChange.version > since)
+        .order_by(DiagramChange.id)
+        .limit(limit)
+    )
+    return [dict(row.payload, version=row.version, user_id=row.user_id) for row in rows]
@@ -0,0 +1,65 @@
+# app/services/tasks.py
+"""Background job handlers (see app/jobs.py).
+
+Each handler takes the job's JSON payload and its ``JobContext`` and
+returns the JSON result shown by ``/api/jobs/<id>``. All of them are safe
+to run again from the start, as a retried or re-queued job is.
+"""
+
+import os
+
+from app import db, thumbnail_store
+from app.jobs import JobFailed, handler
+from app.models.diagram import Diagram
+from app.services.catalog import CATALOGS
+from app.services.catalog_import import UnreadableUpload, import_catalog, open_text
+from app.services.connections import validate_persisted_edges
+from app.thumbnails import render
+
+
+def _remove_staged_upload(payload):
+    if os.path.exists(payload['path']):
+        os.unlink(payload['path'])
+
+
+@handler('catalog.import', on_failure=_remove_staged_upload)
+def catalog_import_job(payload, job):
+    """Upsert a staged upload into a catalog: ``{catalog, path, format, chunk_size}``.
+
+    Re-running is harmless (rows are upserted by name). The staged file is
+    removed once the import has run, or once the job has finally failed.
+    """
+    path = payload['path']
+    if not os.path.exists(path):
+        raise JobFailed("The uploaded file is no longer available.")
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as f:
+            report = import_catalog(
+                CATALOGS[payload['catalog']], open_text(f), payload['format'], payload['chunk_size'],
+                progress=lambda report: job.progress(
+                    f.tell() / size, f"{report.inserted} inserted, {report.updated} updated, "
+                                     f"{report.failed} failed"))
+    except UnreadableUpload as e:
+        raise JobFailed(str(e))  # no point retrying
+    os.unlink(path)
+    return report.to_dict()
+
+
+@handler('diagram.validate')
+def diagram_validation_job(payload, job):
+    """Check every saved edge of ``{diagram_id}`` against the connection rules."""
+    diagram = db.session.get(Diagram, payload['diagram_id'])
+    if diagram is None:
+        raise JobFailed("The diagram was deleted.")
+    errors = validate_persisted_edges(diagram)
+    return {'valid': not errors, 'errors': errors, 'version': diagram.version}
+
+
+@handler('thumbnails.render')
+def thumbnail_render_job(payload, job):
+    """Render the missing sizes of ``{digest}``."""
+    digest = payload['digest']
+    if not thumbnail_store.exists(digest):
+        raise JobFailed("No such thumbnail.")
+    return {'rendered': render(thumbnail_store.root, digest)}
@@ -0,0 +1,224 @@
+# app/thumbnails.py
+"""Content-addressed device thumbnails with pre-rendered sizes.
+
+An upload is streamed to a temporary file in fixed-size chunks while its
+SHA-256 is computed, checked with Pillow and moved to
+``<THUMBNAIL_FOLDER>/<aa>/<digest>/original``; a second upload of the same
+bytes finds the file already there and is dropped. The digest is what the
+catalogs store in their ``thumbnail`` column.
+
+The palette and canvas renditions in ``SIZES`` are rendered to WebP in a
+small process pool right after the upload (``ThumbnailStore.path`` renders a
+missing one inline, so a request never waits on the pool). Every file is
+written under a temporary name and renamed into place, so readers never see
+half-written images and renditions are immutable once they exist.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+# Longest side in pixels of each rendition.
+SIZES = {
+    'palette': 48,
+    'palette@2x': 96,
+    'canvas': 128,
+    'canvas@2x': 256,
+}
+FORMATS = ('PNG', 'JPEG', 'WEBP', 'GIF')
+RENDITION_MIMETYPE = 'image/webp'
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ThumbnailError(ValueError):
+    """The upload is not an acceptable image."""
+
+
+class ThumbnailTooLarge(ThumbnailError):
+    """The upload exceeds ``THUMBNAIL_MAX_BYTES``."""
+
+
+def is_digest(value):
+    return isinstance(value, str) and _DIGEST.match(value) is not None
+
+
+def digest_dir(root, digest):
+    return os.path.join(root, digest[:2], digest)
+
+
+def _check_image(path, max_pixels):
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            if image.format not in FORMATS:
+                raise ThumbnailError(f"Image format must be one of: {', '.join(FORMATS)}")
+            width, height = image.size
+            if width * height > max_pixels:
+                raise ThumbnailError("Image has too many pixels.")
+            image.verify()  # structure only: JPEG scan data is not decoded
+        with Image.open(path) as image:
+            image.load()  # a truncated file fails here, not later in render()
+    except ThumbnailError:
+        raise
+    except Exception as e:  # Pillow raises a zoo of types for corrupt files
+        raise ThumbnailError("Upload is not a readable image.") from e
+
+
+def store_upload(root, stream, max_bytes, max_pixels, chunk_size=65536):
+    """Stream ``stream`` into the store; return ``(digest, created)``."""
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=root, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ThumbnailTooLarge(f"Thumbnails are limited to {max_bytes} bytes.")
+                digest.update(chunk)
+                out.write(chunk)
+        if not size:
+            raise ThumbnailError("Upload is empty.")
+        _check_image(tmp, max_pixels)
+        key = digest.hexdigest()
+        target = os.path.join(digest_dir(root, key), 'original')
+        if os.path.exists(target):
+            return key, False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp, target)
+        tmp = None
+        return key, True
+    finally:
+        if tmp is not None:
+            os.unlink(tmp)
+
+
+def render(root, digest, names=None):
+    """Write the missing renditions of ``digest``; return the names written.
+
+    A plain function of paths so it can run in a worker process.
+    """
+    from PIL import Image
+
+    folder = digest_dir(root, digest)
+    wanted = [n for n in (names or SIZES) if not os.path.exists(os.path.join(folder, f'{n}.webp'))]
+    if not wanted:
+        return []
+    with Image.open(os.path.join(folder, 'original')) as original:
+        original.seek(0)  # first frame of animations
+        source = original.convert('RGBA')
+    for name in wanted:
+        image = source.copy()
+        image.thumbnail((SIZES[name], SIZES[name]), Image.Resampling.LANCZOS)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=f'.{name}-')
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, 'WEBP', quality=85, method=4)
+        os.replace(tmp, os.path.join(folder, f'{name}.webp'))
+    return wanted
+
+
+class _ThumbnailState:
+    def __init__(self, max_pending):
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.duplicates = 0
+        self.inline_renders = 0
+
+    def executor(self, workers):
+        # Created lazily and per process, like the password hashing pool.
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                self.pool = ProcessPoolExecutor(max_workers=workers)
+                self.pid = os.getpid()
+            return self.pool
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None and self.pid == os.getpid():
+                self.pool.shutdown(wait=True)
+            self.pool = None
+
+
+class ThumbnailStore:
+    """Flask extension storing uploads by content hash and rendering their sizes."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('THUMBNAIL_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails'))
+        app.config.setdefault('THUMBNAIL_MAX_BYTES', 5 * 1024 * 1024)
+        app.config.setdefault('THUMBNAIL_MAX_PIXELS', 40_000_000)
+        app.config.setdefault('THUMBNAIL_WORKERS', 1)  # 0 renders on first request only
+        # Past this many queued renders, uploads skip pre-rendering.
+        app.config.setdefault('THUMBNAIL_MAX_PENDING', 32)
+        # Render through the background job queue (app/jobs.py) instead of the pool.
+        app.config.setdefault('THUMBNAIL_RENDER_JOBS', False)
+        app.extensions['thumbnails'] = _ThumbnailState(max_pending=app.config['THUMBNAIL_MAX_PENDING'])
+
+    @property
+    def _state(self):
+        return current_app.extensions['thumbnails']
+
+    @property
+    def root(self):
+        return current_app.config['THUMBNAIL_FOLDER']
+
+    def save(self, stream):
+        """Store an upload and queue its renditions; return ``(digest, created)``."""
+        config = current_app.config
+        state = self._state
+        digest, created = store_upload(self.root, stream, config['THUMBNAIL_MAX_BYTES'],
+                                       config['THUMBNAIL_MAX_PIXELS'])
+        state.uploads += 1
+        if created:
+            self._prerender(state, digest)
+        else:
+            state.duplicates += 1
+        return digest, created
+
+    def _prerender(self, state, digest):
+        if current_app.config['THUMBNAIL_RENDER_JOBS']:
+            return None  # the upload view queues a job instead
+        workers = current_app.config['THUMBNAIL_WORKERS']
+        if workers <= 0 or not state.slots.acquire(blocking=False):
+            return None
+        future = state.executor(workers).submit(render, self.root, digest)
+        future.add_done_callback(lambda _: state.slots.release())
+        return future
+
+    def exists(self, digest):
+        return is_digest(digest) and os.path.exists(os.path.join(digest_dir(self.root, digest), 'original'))
+
+    def path(self, digest, size):
+        """Filesystem path of a rendition, rendering it now if the pool has not yet; None if unknown."""
+        if size not in SIZES or not self.exists(digest):
+            return None
+        path = os.path.join(digest_dir(self.root, digest), f'{size}.webp')
+        if not os.path.exists(path):
+            render(self.root, digest, [size])
+            self._state.inline_renders += 1
+        return path
+
+    def stats(self):
+        state = self._state
+        return {'uploads': state.uploads, 'duplicates': state.duplicates,
+                'inline_renders': state.inline_renders}
+
+    def shutdown(self):
+        self._state.shutdown()
@@ -0,0 +1,244 @@
+# benchmarks/bench_app.py
+"""Request-level benchmarks of the catalog, auth and diagram hot paths.
+
+Run from the repo root against a database filled by benchmarks/datagen.py:
+
+    DATABASE_URL=... PYTHONPATH=. python benchmarks/bench_app.py --scale 100k --populate \\
+        --out benchmarks/results/100k.json
+    DATABASE_URL=... PYTHONPATH=. python benchmarks/bench_app.py --scale 100k \\
+        --compare benchmarks/results/100k.json --threshold 0.2
+
+Each scenario drives the app in-process through Flask's test client (no
+network, no WSGI server) and records per-request latency. Results are
+written as JSON with percentiles. ``--compare`` reads an earlier results
+file as the baseline. It exits with status 1 when a scenario's ``--metric``
+(p95 by default) is more than ``--threshold`` slower than the baseline and
+also more than ``--min-delta-ms`` slower, so sub-millisecond jitter does not
+fail a run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(samples, errors=0):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = np.asarray(samples, dtype=float) * 1000
+    summary = {'n': int(ms.size), 'errors': errors}
+    if ms.size:
+        summary['mean_ms'] = round(float(ms.mean()), 3)
+        for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+            summary[f'p{p}_ms'] = round(float(value), 3)
+        summary['max_ms'] = round(float(ms.max()), 3)
+    return summary
+
+
+def compare(current, baseline, threshold=0.2, metric='p95_ms', min_delta_ms=1.0):
+    """``[(scenario, base, now, ratio, regressed)]`` for scenarios in both result sets."""
+    rows = []
+    for name, base in sorted(baseline['scenarios'].items()):
+        now = current['scenarios'].get(name)
+        if now is None or metric not in now or metric not in base:
+            continue
+        ratio = now[metric] / base[metric] if base[metric] else float('inf')
+        regressed = (ratio > 1 + threshold and now[metric] - base[metric] > min_delta_ms) or \
+            now.get('errors', 0) > base.get('errors', 0)
+        rows.append((name, base[metric], now[metric], ratio, regressed))
+    return rows
+
+
+class Bench:
+    """The app, logged-in clients and generated ids the scenarios share."""
+
+    def __init__(self, app, rows, diagram_ids):
+        from benchmarks.datagen import ADMIN, PASSWORD
+
+        self.app = app
+        self.rows = rows
+        self.diagram_ids = diagram_ids
+        self.password = PASSWORD
+        self.admin = self.login(ADMIN)
+        self.user_index = 0
+        self.catalog_cursor = None
+        self.import_round = 0
+        self.diagram_round = 0
+
+    def login(self, username):
+        client = self.app.test_client()
+        response = client.post('/login', data={'username': username, 'password': self.password})
+        if response.status_code != 302:
+            raise SystemExit(f"Could not log in as {username}; run with --populate first.")
+        return client
+
+
+def scenario_dashboard(bench):
+    return bench.admin.get('/super_admin/super_admin/'), 200
+
+
+def scenario_login(bench):
+    from benchmarks.datagen import PREFIX
+
+    bench.user_index = (bench.user_index + 1) % bench.rows
+    client = bench.app.test_client()
+    return client.post('/login', data={'username': f'{PREFIX}user-{bench.user_index:07d}',
+                                       'password': bench.password}), 302
+
+
+def scenario_catalog_list(bench):
+    # Walks the whole catalog page by page, then starts over.
+    query = {'limit': 100}
+    if bench.catalog_cursor:
+        query['after'] = bench.catalog_cursor
+    response = bench.admin.get('/api/catalog/device-types', query_string=query)
+    bench.catalog_cursor = (response.get_json(silent=True) or {}).get('next')
+    return response, 200
+
+
+def scenario_bulk_import(bench, rows=1000):
+    from benchmarks.datagen import PREFIX
+
+    bench.import_round += 1
+    body = '\n'.join(json.dumps({'name': f'{PREFIX}import-{bench.import_round:04d}-{i:05d}',
+                                 'color': '#336699'}) for i in range(rows))
+    return bench.admin.post('/super_admin/import/device-types?format=ndjson', data=body,
+                            content_type='application/x-ndjson'), 200
+
+
+def scenario_diagram_load(bench):
+    diagram_id = bench.diagram_ids[bench.diagram_round % len(bench.diagram_ids)]
+    bench.diagram_round += 1
+    return bench.admin.get(f'/api/diagrams/{diagram_id}?include=pins'), 200
+
+
+# name -> (function, share of --requests it runs)
+SCENARIOS = {
+    'dashboard': (scenario_dashboard, 1.0),
+    'login': (scenario_login, 1.0),
+    'catalog_list': (scenario_catalog_list, 1.0),
+    'bulk_import': (scenario_bulk_import, 0.1),
+    'diagram_load': (scenario_diagram_load, 1.0),
+}
+
+
+def run_scenario(bench, fn, requests, warmup):
+    samples, errors = [], 0
+    for i in range(warmup + requests):
+        started = time.perf_counter()
+        response, expected = fn(bench)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        if response.status_code != expected:
+            errors += 1
+        samples.append(elapsed)
+    return summarize(samples, errors)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    from app import create_app, db
+    from benchmarks import datagen
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False  # the login scenario posts the form directly
+    app.extensions['structured_logging'].stream = open(os.devnull, 'w')  # still formatted, not shown
+    rows = datagen.scale_rows(args.scale)
+
+    with app.app_context():
+        if args.populate:
+            db.create_all()
+            datagen.populate(rows)
+        diagram_ids = datagen.populate_diagrams(_admin_id(), args.diagrams, args.nodes) \
+            if args.diagrams else []
+        db.session.remove()
+
+    names = args.scenarios or [n for n in SCENARIOS if n != 'diagram_load' or diagram_ids]
+    bench = Bench(app, rows, diagram_ids)
+    results = {
+        'meta': {
+            'scale': args.scale, 'rows': rows, 'requests': args.requests, 'warmup': args.warmup,
+            'diagrams': len(diagram_ids), 'nodes': args.nodes if diagram_ids else None,
+            'git': _git_revision(), 'python': platform.python_version(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'scenarios': {},
+    }
+    try:
+        for name in names:
+            fn, share = SCENARIOS[name]
+            requests = max(3, int(args.requests * share))
+            results['scenarios'][name] = summary = run_scenario(bench, fn, requests, args.warmup)
+            print(f"{name:>14} n={summary['n']:<5} p50={summary.get('p50_ms', 0):>9.2f} ms "
+                  f"p95={summary.get('p95_ms', 0):>9.2f} ms errors={summary['errors']}")
+    finally:
+        if any(n == 'bulk_import' for n in names):
+            with app.app_context():
+                from app.models.master import DeviceType
+                db.session.execute(db.delete(DeviceType).where(
+                    DeviceType.name.like(f'{datagen.PREFIX}import-%')))
+                db.session.commit()
+    return results
+
+
+def _admin_id():
+    from app import db
+    from app.models.user import User
+    from benchmarks.datagen import ADMIN
+
+    return db.session.execute(db.select(User.id).where(User.username == ADMIN)).scalar()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', default='1k', help='rows per table the data was generated at')
+    parser.add_argument('--populate', action='store_true', help='generate missing data first')
+    parser.add_argument('--diagrams', type=int, default=0, help='diagrams for diagram_load (0 skips it)')
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--scenario', dest='scenarios', action='append', choices=sorted(SCENARIOS))
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    parser.add_argument('--metric', default='p95_ms')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        print(f"\n{'scenario':>14} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, base, now, ratio, regressed in compare(results, baseline, args.threshold,
+                                                          args.metric, args.min_delta_ms):
+            failed |= regressed
+            print(f"{name:>14} {base:>10.2f} {now:>10.2f} {ratio:>7.2f}{'  REGRESSED' if regressed else ''}")
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+# benchmarks/bench_cables.py
+"""Cable schedule scaling benchmark.
+
+Run from the repo root:  PYTHONPATH=. python benchmarks/bench_cables.py [edges ...]
+
+Times compute_schedule() plus the per-spec and per-system aggregates on
+synthetic diagrams (random positions, a mix of specs, one system per 500
+runs). No database is needed.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from app.services.cables import compute_schedule
+
+SPECS = ['12G-SDI', '1GBASE-T', '3G-SDI', 'Dante', 'Tri-Level / Black Burst']
+
+
+def synthetic(edges, seed=0):
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform(0, 20000, size=(4, edges))
+    spec_codes = rng.integers(0, len(SPECS), edges)
+    system_codes = np.arange(edges) // 500
+    systems = [f'sys-{i}' for i in range(int(system_codes[-1]) + 1)]
+    keys = [f'e{i}' for i in range(edges)]
+    return keys, coords, spec_codes, system_codes, systems
+
+
+def run(edges, repeat=5):
+    keys, (sx, sy, tx, ty), spec_codes, system_codes, systems = synthetic(edges)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schedule = compute_schedule(keys, sx, sy, tx, ty, spec_codes, SPECS, system_codes, systems)
+        schedule.bom()
+        schedule.by_system()
+        best = min(best, time.perf_counter() - start)
+    return best, schedule.totals()
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1000, 10000, 100000]
+    print(f"{'edges':>8} {'best ms':>9} {'us/edge':>8}  totals")
+    for edges in sizes:
+        seconds, totals = run(edges)
+        print(f'{edges:>8} {seconds * 1000:>9.1f} {seconds / edges * 1e6:>8.2f}  {totals}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
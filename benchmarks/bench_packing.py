@@ -0,0 +1,113 @@
+# benchmarks/bench_packing.py
+"""Packed vs JSON(B) diagram documents: size and decode time.
+
+Run from the repo root:  PYTHONPATH=. python benchmarks/bench_packing.py [nodes ...] [--database-url URL]
+
+Builds a loaded-shape document (as GET /api/diagrams/<id>?include=pins
+returns it) of ``nodes`` instances drawn from 40 device models with 4-32
+pins each, every node patched to the next. Reports the JSON text size, the
+size Postgres stores for it as JSONB (TOAST-compressed, in a temporary table;
+only with ``--database-url``), and the packed body plus its unique blobs
+(app/services/packing.py). Decode times are best of 5: ``json.loads`` of the
+text, which is what reading a JSONB column costs the app, against
+``unpack_document``; and one node, via ``json.loads`` plus a scan against
+``unpack_node``.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from app.services.packing import pack_document, unpack_document, unpack_node
+
+SPECS = ['12G-SDI', '3G-SDI', '1GBASE-T', 'Dante', 'XLR', 'Tri-Level / Black Burst']
+KINDS = [('switcher', 'Switcher'), ('router', 'Router'), ('camera', 'Camera'), ('monitor', 'Monitor'),
+         ('audio', 'Audio Console'), ('converter', 'Converter')]
+
+
+def device_models(count=40, seed=0):
+    rng = random.Random(seed)
+    models = []
+    for i in range(count):
+        kind, device_type = rng.choice(KINDS)
+        pins = [{'id': f'{direction}-{n}', 'label': f'{spec} {direction.title()} {n}',
+                 'type': 'input' if direction == 'in' else 'output', 'spec': spec}
+                for n, (direction, spec) in enumerate(
+                    ((rng.choice(['in', 'out']), rng.choice(SPECS)) for _ in range(rng.randint(4, 32))), 1)]
+        models.append({'type': kind, 'device_type': device_type, 'manufacturer': f'Maker {i % 9}',
+                       'model': f'{device_type} {1000 + i}', 'color': f'#{rng.randrange(0x1000000):06x}',
+                       'device_model_id': i + 1, 'pins': pins})
+    return models
+
+
+def synthetic_document(nodes, seed=0):
+    rng = random.Random(seed)
+    models = device_models(seed=seed)
+    doc_nodes = []
+    for i in range(nodes):
+        model = rng.choice(models)
+        doc_nodes.append(dict(model, id=f'n{i}', position={'x': (i % 100) * 240, 'y': (i // 100) * 180},
+                              pins=[dict(pin) for pin in model['pins']],
+                              notes=f'Rack {i // 40}' if i % 10 == 0 else None, thumbnail=None))
+    edges = [{'id': f'e{i}', 'source': f'n{i - 1}', 'sourceHandle': doc_nodes[i - 1]['pins'][-1]['id'],
+              'target': f'n{i}', 'targetHandle': doc_nodes[i]['pins'][0]['id']} for i in range(1, nodes)]
+    return {'id': 1, 'name': f'bench-{nodes}', 'nodes': doc_nodes, 'edges': edges}
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def jsonb_size(url, text):
+    from sqlalchemy import create_engine, text as sql
+
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(sql('CREATE TEMPORARY TABLE bench_jsonb (doc jsonb) ON COMMIT DROP'))
+        conn.execute(sql('INSERT INTO bench_jsonb VALUES (CAST(:doc AS jsonb))'), {'doc': text})
+        size = conn.execute(sql('SELECT pg_column_size(doc) FROM bench_jsonb')).scalar()
+    engine.dispose()
+    return size
+
+
+def run(nodes, url=None):
+    doc = synthetic_document(nodes)
+    text = json.dumps(doc)
+    body, blobs = pack_document(doc)
+    load = lambda hashes: {h: blobs[h] for h in hashes}
+    key = f'n{nodes // 2}'
+    assert unpack_document(body, load) == doc
+    return {
+        'json': len(text),
+        'jsonb': jsonb_size(url, text) if url else None,
+        'packed': len(body) + sum(len(data) for data in blobs.values()),
+        'blobs': len(blobs),
+        'json_ms': best_of(lambda: json.loads(text)) * 1000,
+        'packed_ms': best_of(lambda: unpack_document(body, load)) * 1000,
+        'json_node_ms': best_of(lambda: next(n for n in json.loads(text)['nodes'] if n['id'] == key)) * 1000,
+        'packed_node_ms': best_of(lambda: unpack_node(body, key, load)) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('nodes', nargs='*', type=int, default=[1000, 10000])
+    parser.add_argument('--database-url', help='measure stored JSONB size in this database')
+    args = parser.parse_args(argv)
+    print(f"{'nodes':>7} {'json KB':>9} {'jsonb KB':>9} {'packed KB':>10} {'blobs':>6} "
+          f"{'json ms':>8} {'packed ms':>10} {'node json ms':>13} {'node packed ms':>15}")
+    for nodes in args.nodes:
+        r = run(nodes, args.database_url)
+        jsonb = f"{r['jsonb'] / 1024:>9.1f}" if r['jsonb'] is not None else f"{'-':>9}"
+        print(f"{nodes:>7} {r['json'] / 1024:>9.1f} {jsonb} {r['packed'] / 1024:>10.1f} {r['blobs']:>6} "
+              f"{r['json_ms']:>8.1f} {r['packed_ms']:>10.1f} {r['json_node_ms']:>13.2f} {r['packed_node_ms']:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
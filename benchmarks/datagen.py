@@ -0,0 +1,137 @@
+# benchmarks/datagen.py
+"""Synthetic data for the application benchmarks.
+
+Run from the repo root against a scratch database (not the dev one):
+
+    DATABASE_URL=postgresql://.../av_bench PYTHONPATH=. python benchmarks/datagen.py 100k [--diagrams 20]
+    DATABASE_URL=... PYTHONPATH=. python benchmarks/datagen.py --cleanup
+
+Every generated row is named ``bench-...`` so a run can be repeated (existing
+rows are kept) or removed without touching real data. Users share one
+password hash, computed once, so 1M users take seconds rather than hours of
+scrypt. Rows go in through multi-row INSERTs of ``batch`` rows each.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db, password_hasher
+from app.models.diagram import Diagram
+from app.models.master import DeviceType, Manufacturer
+from app.models.user import User
+from app.services.diagrams import save_document
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+PREFIX = 'bench-'
+ADMIN = f'{PREFIX}admin'
+PASSWORD = 'bench-password'
+SPECS = ['12G-SDI', '3G-SDI', '1GBASE-T', 'Dante', 'XLR']
+
+
+def scale_rows(scale):
+    """``'100k'`` -> 100000; plain integers are accepted too."""
+    return SCALES[scale.lower()] if scale.lower() in SCALES else int(scale)
+
+
+def _insert(model, make, count, batch):
+    # ON CONFLICT DO NOTHING: re-running a scale only adds what is missing.
+    for start in range(0, count, batch):
+        rows = [make(i) for i in range(start, min(start + batch, count))]
+        db.session.execute(insert(model).on_conflict_do_nothing(), rows)
+        db.session.commit()
+
+
+def _existing(column):
+    return db.session.execute(select(func.count()).where(column.like(f'{PREFIX}%'))).scalar()
+
+
+def populate(rows, batch=10_000, seed=0, log=print):
+    """Ensure ``rows`` device types, manufacturers and users exist, plus the admin."""
+    rng = random.Random(seed)
+    password_hash = password_hasher.hash(PASSWORD)  # the configured method, so logins never rehash
+
+    for model, column, make in (
+        (DeviceType, DeviceType.name,
+         lambda i: {'name': f'{PREFIX}type-{i:07d}', 'color': f'#{rng.randrange(0x1000000):06x}'}),
+        (Manufacturer, Manufacturer.name, lambda i: {'name': f'{PREFIX}maker-{i:07d}'}),
+        (User, User.username,
+         lambda i: {'username': f'{PREFIX}user-{i:07d}', 'password_hash': password_hash, 'role': 'user'}),
+    ):
+        have = _existing(column)
+        started = time.perf_counter()
+        if have < rows:
+            _insert(model, make, rows, batch)
+        log(f'{model.__tablename__:>13}: {rows} rows ({rows - min(have, rows)} new) '
+            f'in {time.perf_counter() - started:.1f}s')
+
+    _insert(User, lambda i: {'username': ADMIN, 'password_hash': password_hash, 'role': 'super_admin'}, 1, 1)
+    return db.session.execute(select(User.id).where(User.username == ADMIN)).scalar()
+
+
+def synthetic_document(nodes, seed=0):
+    """A diagram of ``nodes`` devices in a grid, each patched to the next one."""
+    rng = random.Random(seed)
+    specs = [rng.choice(SPECS) for _ in range(nodes + 1)]  # node i: in specs[i], out specs[i + 1]
+    doc_nodes = [{
+        'id': f'n{i}', 'type': 'device', 'position': {'x': (i % 50) * 200, 'y': (i // 50) * 150},
+        'pins': [{'id': 'in', 'label': 'In', 'type': 'input', 'spec': specs[i]},
+                 {'id': 'out', 'label': 'Out', 'type': 'output', 'spec': specs[i + 1]}],
+    } for i in range(nodes)]
+    edges = [{'id': f'e{i}', 'source': f'n{i - 1}', 'sourceHandle': 'out',
+              'target': f'n{i}', 'targetHandle': 'in'} for i in range(1, nodes)]
+    return {'nodes': doc_nodes, 'edges': edges}
+
+
+def populate_diagrams(owner_id, count, nodes, seed=0, log=print):
+    """Ensure ``count`` diagrams of ``nodes`` devices owned by the bench admin; return their ids."""
+    ids = list(db.session.execute(select(Diagram.id).where(
+        Diagram.owner_id == owner_id, Diagram.name.like(f'{PREFIX}diagram-%')).order_by(Diagram.id)).scalars())
+    started = time.perf_counter()
+    for i in range(len(ids), count):
+        diagram = Diagram(name=f'{PREFIX}diagram-{i:05d}', owner_id=owner_id, version=0)
+        db.session.add(diagram)
+        save_document(diagram, synthetic_document(nodes, seed + i))
+        db.session.commit()
+        ids.append(diagram.id)
+    log(f'{"diagram":>13}: {count} x {nodes} nodes in {time.perf_counter() - started:.1f}s')
+    return ids[:count]
+
+
+def cleanup(log=print):
+    """Delete every ``bench-`` row (diagrams go with their owners)."""
+    for model, column in ((User, User.username), (DeviceType, DeviceType.name),
+                          (Manufacturer, Manufacturer.name)):
+        deleted = db.session.execute(delete(model).where(column.like(f'{PREFIX}%'))).rowcount
+        db.session.commit()
+        log(f'{model.__tablename__:>13}: {deleted} rows deleted')
+
+
+def main(argv):
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scale', nargs='?', default='1k', help=f"rows per table: {', '.join(SCALES)} or a number")
+    parser.add_argument('--diagrams', type=int, default=0)
+    parser.add_argument('--nodes', type=int, default=200, help='nodes per diagram')
+    parser.add_argument('--batch', type=int, default=10_000)
+    parser.add_argument('--cleanup', action='store_true')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if args.cleanup:
+            cleanup()
+            return
+        owner_id = populate(scale_rows(args.scale), batch=args.batch)
+        if args.diagrams:
+            populate_diagrams(owner_id, args.diagrams, args.nodes)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,46 @@
+# gunicorn.conf.py
+"""Production server: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Worker model and sizing come from the environment (see app/server.py).
+Graceful restarts drain in-flight requests for up to ``graceful_timeout``:
+
+* ``kill -HUP <master>`` replaces the workers (same preloaded code, new
+  config);
+* ``kill -USR2 <master>`` then ``kill -TERM <old master>`` starts a new
+  master on new code next to the old one, for deploys without dropped
+  connections.
+"""
+
+import multiprocessing
+import os
+
+from app.server import after_fork, patch_psycopg_for_gevent, worker_settings
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+preload_app = True
+
+_workers = worker_settings(os.environ, multiprocessing.cpu_count())
+worker_class = _workers['worker_class']
+workers = _workers['workers']
+threads = _workers.get('threads', 1)
+worker_connections = _workers.get('worker_connections', 1000)
+
+timeout = int(os.environ.get('SERVER_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('SERVER_KEEPALIVE', 5))
+# Recycle workers now and then to bound slow leaks; jitter avoids all at once.
+max_requests = int(os.environ.get('SERVER_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Requests are logged by the app (app.access, see app/logs.py).
+accesslog = None
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        patch_psycopg_for_gevent()
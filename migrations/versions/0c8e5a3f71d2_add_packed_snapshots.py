@@ -0,0 +1,42 @@
+"""add packed diagram snapshots and the diagram_blob table
+
+Revision ID: 0c8e5a3f71d2
+Revises: f6b2d8e41c97
+Create Date: 2026-03-16 10:12:40.318275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0c8e5a3f71d2'
+down_revision = 'f6b2d8e41c97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('diagram_blob',
+    sa.Column('hash', sa.LargeBinary(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('diagram_snapshot', sa.Column('packed', sa.LargeBinary(), nullable=True))
+    op.add_column('diagram_snapshot', sa.Column('blobs', postgresql.ARRAY(sa.LargeBinary()), nullable=True))
+    op.alter_column('diagram_snapshot', 'document', existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                    nullable=True)
+    op.create_index('ix_diagram_snapshot_blobs', 'diagram_snapshot', ['blobs'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    # Packed snapshots cannot be expressed in the old schema.
+    op.execute('DELETE FROM diagram_snapshot WHERE document IS NULL')
+    op.drop_index('ix_diagram_snapshot_blobs', table_name='diagram_snapshot', postgresql_using='gin')
+    op.alter_column('diagram_snapshot', 'document', existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                    nullable=False)
+    op.drop_column('diagram_snapshot', 'blobs')
+    op.drop_column('diagram_snapshot', 'packed')
+    op.drop_table('diagram_blob')
@@ -0,0 +1,32 @@
+"""add pg_trgm GIN indexes on catalog names
+
+Revision ID: 3b7d9e2c4f18
+Revises: 8c3e1f7a9b25
+Create Date: 2026-02-24 16:05:31.742210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d9e2c4f18'
+down_revision = '8c3e1f7a9b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_device_type_name_trgm', 'device_type', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_manufacturer_name_trgm', 'manufacturer', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_manufacturer_name_trgm', table_name='manufacturer',
+                  postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.drop_index('ix_device_type_name_trgm', table_name='device_type',
+                  postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    # The extension is left installed; other objects may depend on it.
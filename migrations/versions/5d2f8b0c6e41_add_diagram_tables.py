@@ -0,0 +1,90 @@
+"""add diagram, diagram_node, diagram_pin and diagram_edge tables
+
+Revision ID: 5d2f8b0c6e41
+Revises: a41c9e2b7d10
+Create Date: 2026-02-12 14:37:05.219844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8b0c6e41'
+down_revision = 'a41c9e2b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('diagram',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=128), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_diagram_owner_id'), 'diagram', ['owner_id'], unique=False)
+
+    op.create_table('diagram_node',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=128), nullable=False),
+    sa.Column('type', sa.String(length=64), nullable=True),
+    sa.Column('device_type', sa.String(length=64), nullable=True),
+    sa.Column('manufacturer', sa.String(length=64), nullable=True),
+    sa.Column('model', sa.String(length=128), nullable=True),
+    sa.Column('color', sa.String(length=7), nullable=True),
+    sa.Column('x', sa.Float(), nullable=False),
+    sa.Column('y', sa.Float(), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('thumbnail', sa.String(length=255), nullable=True),
+    sa.Column('extra', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id'], ['diagram.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('diagram_id', 'key', name='uq_diagram_node_key')
+    )
+
+    op.create_table('diagram_pin',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('node_key', sa.String(length=128), nullable=False),
+    sa.Column('key', sa.String(length=128), nullable=False),
+    sa.Column('ordinal', sa.Integer(), nullable=False),
+    sa.Column('label', sa.String(length=128), nullable=True),
+    sa.Column('type', sa.String(length=16), nullable=True),
+    sa.Column('spec', sa.String(length=64), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id', 'node_key'], ['diagram_node.diagram_id', 'diagram_node.key'], onupdate='CASCADE', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('diagram_id', 'node_key', 'key', name='uq_diagram_pin_key')
+    )
+
+    op.create_table('diagram_edge',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=128), nullable=False),
+    sa.Column('source_node', sa.String(length=128), nullable=False),
+    sa.Column('source_pin', sa.String(length=128), nullable=True),
+    sa.Column('target_node', sa.String(length=128), nullable=False),
+    sa.Column('target_pin', sa.String(length=128), nullable=True),
+    sa.Column('extra', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id', 'source_node'], ['diagram_node.diagram_id', 'diagram_node.key'], onupdate='CASCADE', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['diagram_id', 'target_node'], ['diagram_node.diagram_id', 'diagram_node.key'], onupdate='CASCADE', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('diagram_id', 'key', name='uq_diagram_edge_key')
+    )
+    op.create_index('ix_diagram_edge_source', 'diagram_edge', ['diagram_id', 'source_node'], unique=False)
+    op.create_index('ix_diagram_edge_target', 'diagram_edge', ['diagram_id', 'target_node'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_diagram_edge_target', table_name='diagram_edge')
+    op.drop_index('ix_diagram_edge_source', table_name='diagram_edge')
+    op.drop_table('diagram_edge')
+    op.drop_table('diagram_pin')
+    op.drop_table('diagram_node')
+    op.drop_index(op.f('ix_diagram_owner_id'), table_name='diagram')
+    op.drop_table('diagram')
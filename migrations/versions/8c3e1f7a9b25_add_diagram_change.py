@@ -0,0 +1,37 @@
+"""add diagram_change table
+
+Revision ID: 8c3e1f7a9b25
+Revises: 5d2f8b0c6e41
+Create Date: 2026-02-19 10:12:44.381027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '8c3e1f7a9b25'
+down_revision = '5d2f8b0c6e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('diagram_change',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('op', sa.String(length=32), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id'], ['diagram.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_diagram_change_diagram_version', 'diagram_change', ['diagram_id', 'version'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_diagram_change_diagram_version', table_name='diagram_change')
+    op.drop_table('diagram_change')
@@ -0,0 +1,30 @@
+"""add user.session_token
+
+Revision ID: b5e0d3a7c2f4
+Revises: 7e2d4b9a1c63
+Create Date: 2026-03-25 14:02:47.381905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e0d3a7c2f4'
+down_revision = '7e2d4b9a1c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('session_token', sa.String(length=12), nullable=True))
+    # Existing sessions were stamped from the password hash; they end once here.
+    op.execute('UPDATE "user" SET session_token = substr(md5(random()::text || id::text), 1, 12)')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('session_token', existing_type=sa.String(length=12), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('session_token')
@@ -0,0 +1,59 @@
+"""add device_model table and pin templates on diagram nodes
+
+Revision ID: e4a1c7d95b30
+Revises: 3b7d9e2c4f18
+Create Date: 2026-03-02 11:41:08.216534
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1c7d95b30'
+down_revision = '3b7d9e2c4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('device_model',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=128), nullable=False),
+    sa.Column('manufacturer_id', sa.Integer(), nullable=False),
+    sa.Column('device_type_id', sa.Integer(), nullable=True),
+    sa.Column('color', sa.String(length=7), nullable=True),
+    sa.Column('thumbnail', sa.String(length=128), nullable=True),
+    sa.Column('pins', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['device_type_id'], ['device_type.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['manufacturer_id'], ['manufacturer.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('manufacturer_id', 'name', name='uq_device_model_manufacturer_name')
+    )
+    with op.batch_alter_table('device_model', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_device_model_device_type_id'), ['device_type_id'], unique=False)
+
+    with op.batch_alter_table('diagram_node', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('device_model_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_diagram_node_device_model_id'), ['device_model_id'], unique=False)
+        batch_op.create_foreign_key('diagram_node_device_model_id_fkey', 'device_model', ['device_model_id'], ['id'])
+
+    with op.batch_alter_table('diagram_pin', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('removed', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('diagram_pin', schema=None) as batch_op:
+        batch_op.drop_column('removed')
+
+    with op.batch_alter_table('diagram_node', schema=None) as batch_op:
+        batch_op.drop_constraint('diagram_node_device_model_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_diagram_node_device_model_id'))
+        batch_op.drop_column('device_model_id')
+
+    with op.batch_alter_table('device_model', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_device_model_device_type_id'))
+
+    op.drop_table('device_model')
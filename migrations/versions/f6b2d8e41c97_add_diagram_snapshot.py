@@ -0,0 +1,33 @@
+"""add diagram_snapshot table for point-in-time history
+
+Revision ID: f6b2d8e41c97
+Revises: e4a1c7d95b30
+Create Date: 2026-03-09 15:27:51.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f6b2d8e41c97'
+down_revision = 'e4a1c7d95b30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('diagram_snapshot',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('document', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id'], ['diagram.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('diagram_id', 'version', name='uq_diagram_snapshot_version')
+    )
+
+
+def downgrade():
+    op.drop_table('diagram_snapshot')
@@ -0,0 +1,27 @@
+# tests/integration/test_cables_api.py
+
+def device(key, x, y):
+    return {'id': key, 'position': {'x': x, 'y': y},
+            'pins': [{'id': 'in', 'type': 'input', 'spec': '12G-SDI'},
+                     {'id': 'out', 'type': 'output', 'spec': '12G-SDI'},
+                     {'id': 'lan', 'type': 'control', 'spec': '1GBASE-T'}]}
+
+def test_cable_bom_and_schedule(user_client):
+    doc = {'name': 'Cables',
+           'nodes': [device('cam', 0, 0), device('atem', 300, 0), device('sw', 300, 400)],
+           'edges': [{'id': 'e1', 'source': 'cam', 'sourceHandle': 'out', 'target': 'atem', 'targetHandle': 'in'},
+                     {'id': 'e2', 'source': 'atem', 'sourceHandle': 'lan', 'target': 'sw', 'targetHandle': 'lan'}]}
+    diagram_id = user_client.post('/api/diagrams', json=doc).get_json()['id']
+
+    body = user_client.get(f'/api/diagrams/{diagram_id}/cables').get_json()
+    assert body['totals']['runs'] == 2
+    assert [(i['spec'], i['length'], i['count']) for i in body['bom']] == [('12G-SDI', 5.0, 1), ('1GBASE-T', 7.5, 1)]
+    assert [s['system'] for s in body['systems']] == ['atem']
+
+    csv = user_client.get(f'/api/diagrams/{diagram_id}/cables.csv?routing=direct')
+    assert csv.mimetype == 'text/csv'
+    lines = csv.get_data(as_text=True).splitlines()
+    assert lines[0] == 'edge,spec,system,run_m,stock_m,over_limit'
+    assert lines[2] == 'e2,1GBASE-T,atem,6.4,7.5,False'
+
+    assert user_client.get(f'/api/diagrams/{diagram_id}/cables?routing=bogus').status_code == 400
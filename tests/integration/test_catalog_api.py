@@ -0,0 +1,57 @@
+# tests/integration/test_catalog_api.py
+import pytest
+import uuid
+from app import db
+from app.models.master import DeviceType
+
+pytestmark = pytest.mark.usefixtures('clean_catalog')
+
+def _add_device_types(app, names):
+    with app.app_context():
+        for name in names:
+            db.session.add(DeviceType(name=name, color='#112233'))
+        db.session.commit()
+
+def test_catalog_pages_in_name_order(user_client, app):
+    prefix = f"Api {uuid.uuid4().hex[:6]}"
+    names = [f"{prefix} {letter}" for letter in 'edcba']
+    _add_device_types(app, names)
+
+    seen, cursor = [], None
+    while True:
+        url = '/api/catalog/device-types?fields=name&limit=2'
+        if cursor:
+            url += f'&after={cursor}'
+        response = user_client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['items']) <= 2
+        assert all(set(item) == {'name'} for item in body['items'])
+        seen.extend(item['name'] for item in body['items'])
+        cursor = body['next']
+        if not cursor:
+            break
+
+    assert [n for n in seen if n.startswith(prefix)] == sorted(names)
+
+def test_catalog_etag_returns_304_until_catalog_changes(user_client, app):
+    _add_device_types(app, [f"Etag {uuid.uuid4().hex[:8]}"])
+
+    first = user_client.get('/api/catalog/device-types')
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+
+    cached = user_client.get('/api/catalog/device-types', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    _add_device_types(app, [f"Etag {uuid.uuid4().hex[:8]}"])
+    changed = user_client.get('/api/catalog/device-types', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_catalog_rejects_bad_parameters(user_client):
+    assert user_client.get('/api/catalog/device-types?fields=password').status_code == 400
+    assert user_client.get('/api/catalog/device-types?after=!!!').status_code == 400
+    assert user_client.get('/api/catalog/device-types?limit=0').status_code == 400
+    assert user_client.get('/api/catalog/widgets').status_code == 404
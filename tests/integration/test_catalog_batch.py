@@ -0,0 +1,111 @@
+# tests/integration/test_catalog_batch.py
+import pytest
+import uuid
+from app import db
+from app.models.master import DeviceModel, DeviceType, Manufacturer
+
+pytestmark = pytest.mark.usefixtures('clean_catalog')
+
+def test_batch_applies_mixed_operations(superadmin_client, app):
+    prefix = uuid.uuid4().hex[:6]
+    with app.app_context():
+        old = DeviceType(name=f"{prefix} Old", color='#000000')
+        keep = DeviceType(name=f"{prefix} Keep", color='#000000')
+        taken = Manufacturer(name=f"{prefix} Maker")
+        db.session.add_all([old, keep, taken])
+        db.session.commit()
+        old_id, keep_id = old.id, keep.id
+
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'delete', 'catalog': 'device-types', 'id': old_id},
+        {'op': 'update', 'catalog': 'device-types', 'id': keep_id, 'color': '#ABCDEF'},
+        {'op': 'add', 'catalog': 'device-types', 'name': f"{prefix} Old", 'color': '#111111'},
+        {'op': 'add', 'catalog': 'manufacturers', 'name': f"{prefix} Maker"},
+        {'op': 'delete', 'catalog': 'manufacturers', 'id': -1},
+    ]})
+    assert response.status_code == 200
+    statuses = [r['status'] for r in response.get_json()['results']]
+    assert statuses == ['deleted', 'updated', 'added', 'exists', 'not_found']
+
+    with app.app_context():
+        assert db.session.get(DeviceType, keep_id).color == '#ABCDEF'
+        reused = DeviceType.query.filter_by(name=f"{prefix} Old").one()
+        assert reused.id != old_id and reused.color == '#111111'
+
+def test_batch_rejects_invalid_operations_atomically(superadmin_client, app):
+    name = f"Batch {uuid.uuid4().hex[:6]}"
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'add', 'catalog': 'device-types', 'name': name},
+        {'op': 'add', 'catalog': 'device-types', 'name': ''},
+        {'op': 'explode', 'catalog': 'device-types'},
+    ]})
+    assert response.status_code == 400
+    assert [r['index'] for r in response.get_json()['results']] == [1, 2]
+
+    with app.app_context():
+        assert DeviceType.query.filter_by(name=name).first() is None
+
+def test_batch_rejects_malformed_bodies_and_values(superadmin_client):
+    assert superadmin_client.post('/super_admin/batch', json=[{'op': 'add'}]).status_code == 400
+    assert superadmin_client.post('/super_admin/batch', data='nope', content_type='application/json').status_code == 400
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'add', 'catalog': 'device-types', 'name': 5},
+        {'op': 'add', 'catalog': ['device-types'], 'name': 'x'},
+        {'op': 'update', 'catalog': 'device-types', 'id': 1, 'color': {'hex': '#FFFFFF'}},
+    ]})
+    assert response.status_code == 400
+    assert [r['error'] for r in response.get_json()['results']] == [
+        'Name must be a string.', 'catalog must be one of: device-types, manufacturers', 'Color must be a string.']
+
+def test_batch_update_name_collision_rolls_back(superadmin_client, app):
+    prefix = uuid.uuid4().hex[:6]
+    with app.app_context():
+        a = DeviceType(name=f"{prefix} A")
+        b = DeviceType(name=f"{prefix} B")
+        db.session.add_all([a, b])
+        db.session.commit()
+        a_id, b_id = a.id, b.id
+
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'delete', 'catalog': 'device-types', 'id': a_id},
+        {'op': 'update', 'catalog': 'device-types', 'id': b_id, 'name': f"{prefix} Taken"},
+        {'op': 'add', 'catalog': 'device-types', 'name': f"{prefix} Taken"},
+    ]})
+    assert response.status_code == 400
+
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'delete', 'catalog': 'device-types', 'id': b_id},
+        {'op': 'update', 'catalog': 'device-types', 'id': a_id, 'name': f"{prefix} B"},
+    ]})
+    assert response.status_code == 200
+
+    with app.app_context():
+        db.session.add(DeviceType(name=f"{prefix} C"))
+        db.session.commit()
+
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'add', 'catalog': 'device-types', 'name': f"{prefix} D"},
+        {'op': 'update', 'catalog': 'device-types', 'id': a_id, 'name': f"{prefix} C"},
+    ]})
+    assert response.status_code == 409
+    with app.app_context():
+        assert DeviceType.query.filter_by(name=f"{prefix} D").first() is None
+
+def test_batch_reports_deletes_of_referenced_entries(superadmin_client, app):
+    with app.app_context():
+        maker = Manufacturer(name=f"Maker {uuid.uuid4().hex[:6]}")
+        db.session.add(maker)
+        db.session.flush()
+        model = DeviceModel(name='Camera', manufacturer_id=maker.id, pins=[])
+        db.session.add(model)
+        db.session.commit()
+        maker_id, model_id = maker.id, model.id
+    superadmin_client.post('/api/diagrams', json={'name': 'Uses it', 'nodes': [
+        {'id': 'cam', 'type': 'camera', 'device_model_id': model_id, 'position': {'x': 0, 'y': 0}}]})
+
+    response = superadmin_client.post('/super_admin/batch', json={'operations': [
+        {'op': 'delete', 'catalog': 'manufacturers', 'id': maker_id}]})
+    assert response.status_code == 409
+    assert 'still referenced' in response.get_json()['error']
+    with app.app_context():
+        assert db.session.get(Manufacturer, maker_id) is not None
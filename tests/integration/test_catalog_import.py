@@ -0,0 +1,101 @@
+# tests/integration/test_catalog_import.py
+import io
+import json
+import pytest
+import uuid
+from app import db
+from app.models.master import DeviceType, Manufacturer
+
+pytestmark = pytest.mark.usefixtures('clean_catalog')
+
+def test_csv_import_upserts_and_reports_errors(superadmin_client, app):
+    prefix = uuid.uuid4().hex[:6]
+    csv_data = (
+        "name,color\n"
+        f"{prefix} Switcher,#0A1F44\n"
+        f"{prefix} Router,not-a-color\n"
+        ",#FFFFFF\n"
+        f"{prefix} Camera,#00AA00\n"
+    )
+    response = superadmin_client.post(
+        '/super_admin/import/device-types?chunk_size=2',
+        data={'file': (io.BytesIO(csv_data.encode()), 'types.csv')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['inserted'] == 2
+    assert report['failed'] == 2
+    assert [e['line'] for e in report['errors']] == [3, 4]
+
+    # Re-import: one changed color, one unchanged row
+    csv_data = f"name,color\n{prefix} Switcher,#FFFFFF\n{prefix} Camera,#00AA00\n"
+    report = superadmin_client.post(
+        '/super_admin/import/device-types',
+        data=csv_data, content_type='text/csv',
+    ).get_json()
+    assert report['updated'] == 1
+    assert report['unchanged'] == 1
+
+    with app.app_context():
+        assert DeviceType.query.filter_by(name=f"{prefix} Switcher").one().color == '#FFFFFF'
+
+def test_ndjson_import_keeps_existing_columns(superadmin_client, app):
+    name = f"Keep {uuid.uuid4().hex[:6]}"
+    with app.app_context():
+        db.session.add(DeviceType(name=name, color='#123456', thumbnail='keep.png'))
+        db.session.commit()
+
+    body = "\n".join([json.dumps({'name': name}), "[1, 2]", ""])
+    report = superadmin_client.post(
+        '/super_admin/import/device-types?format=ndjson',
+        data=body, content_type='application/octet-stream',
+    ).get_json()
+    assert report['unchanged'] == 1
+    assert report['errors'] == [{'line': 2, 'error': 'Each line must be a JSON object'}]
+
+    with app.app_context():
+        dt = DeviceType.query.filter_by(name=name).one()
+        assert (dt.color, dt.thumbnail) == ('#123456', 'keep.png')
+
+def test_non_string_values_are_row_errors(superadmin_client):
+    name = f"Typed {uuid.uuid4().hex[:6]}"
+    body = "\n".join([json.dumps({'name': 5}), json.dumps({'name': name, 'color': 255}),
+                      json.dumps({'name': name, 'thumbnail': ['a.png']}), json.dumps({'name': name}), ""])
+    report = superadmin_client.post(
+        '/super_admin/import/device-types?format=ndjson', data=body, content_type='application/x-ndjson',
+    ).get_json()
+    assert report['inserted'] == 1
+    assert report['errors'] == [{'line': 1, 'error': 'Name must be a string.'},
+                                {'line': 2, 'error': 'Color must be a string.'},
+                                {'line': 3, 'error': 'Thumbnail must be a string.'}]
+
+def test_unreadable_uploads_are_rejected(superadmin_client):
+    prefix = uuid.uuid4().hex[:6]
+    body = f'name\n"{"x" * 200_000}"\n{prefix} Bad\x00Row\n{prefix} Fine\n'.encode()
+    report = superadmin_client.post('/super_admin/import/device-types', data=body,
+                                    content_type='text/csv').get_json()
+    assert report['inserted'] == 1
+    assert [e['line'] for e in report['errors']] == [2, 3]
+    assert report['errors'][0]['error'].startswith('Invalid CSV')
+
+    response = superadmin_client.post('/super_admin/import/device-types', data=b'name\n\xff\xfe\xfa\n',
+                                      content_type='text/csv')
+    assert response.status_code == 400
+    assert 'UTF-8' in response.get_json()['error']
+
+def test_import_cli_command(runner, app, tmp_path):
+    name = f"Cli Maker {uuid.uuid4().hex[:6]}"
+    path = tmp_path / 'makers.ndjson'
+    path.write_text(json.dumps({'name': name}) + "\n" + json.dumps({'name': name}) + "\n")
+
+    result = runner.invoke(args=['catalog', 'import', 'manufacturers', str(path)])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.output)
+    assert report['inserted'] == 1
+    assert report['superseded'] == 1
+
+    with app.app_context():
+        assert Manufacturer.query.filter_by(name=name).count() == 1
+        Manufacturer.query.delete()
+        db.session.commit()
@@ -0,0 +1,51 @@
+# tests/integration/test_catalog_search.py
+import pytest
+import uuid
+from sqlalchemy import text
+from app import db, catalog_autocomplete
+from app.models.master import DeviceType
+
+@pytest.fixture
+def device_types(app):
+    tag = uuid.uuid4().hex[:6]
+    names = [f'Zq{tag} Constellation Switcher', f'Zq{tag} Mini Converter', f'Zq{tag} Router']
+    rows = [DeviceType(name=name) for name in names]
+    db.session.add_all(rows)
+    db.session.commit()
+    yield tag, rows
+    DeviceType.query.filter(DeviceType.name.like(f'Zq{tag}%')).delete(synchronize_session=False)
+    db.session.commit()
+
+def test_autocomplete_follows_catalog_changes(user_client, device_types):
+    tag, rows = device_types
+    body = user_client.get(f'/api/catalog/autocomplete?q=zq{tag}&catalog=device-types').get_json()
+    assert [i['name'] for i in body['items']] == [f'Zq{tag} Router', f'Zq{tag} Mini Converter',
+                                                  f'Zq{tag} Constellation Switcher']
+    reloads = catalog_autocomplete.stats()['full_reloads']
+
+    rows[2].name = f'Zq{tag} Matrix Router'
+    db.session.commit()
+    body = user_client.get(f'/api/catalog/autocomplete?q=zq{tag} ma').get_json()
+    assert [i['name'] for i in body['items']] == [f'Zq{tag} Matrix Router']
+    assert catalog_autocomplete.stats()['full_reloads'] == reloads
+
+    db.session.delete(rows[1])
+    db.session.commit()
+    body = user_client.get(f'/api/catalog/autocomplete?q=mini').get_json()
+    assert f'Zq{tag} Mini Converter' not in [i['name'] for i in body['items']]
+
+    body = user_client.get(f'/api/catalog/autocomplete?q=zq{tag}&limit=1').get_json()
+    assert len(body['items']) == 1
+    assert user_client.get('/api/catalog/autocomplete?q=a&catalog=bogus').status_code == 400
+
+def test_trigram_search_tolerates_typos(user_client, device_types):
+    installed = db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+    if not installed:
+        pytest.skip('pg_trgm is not installed in the test database')
+    tag, _ = device_types
+    body = user_client.get(f'/api/catalog/search?q=zq{tag} constelation').get_json()
+    assert body['items'][0]['name'] == f'Zq{tag} Constellation Switcher'
+
+def test_search_rejects_bad_queries(user_client):
+    assert user_client.get('/api/catalog/search?q=').status_code == 400
+    assert user_client.get('/api/catalog/search?q=x&catalog=nope').status_code == 400
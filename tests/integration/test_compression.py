@@ -0,0 +1,113 @@
+# tests/integration/test_compression.py
+import gzip
+import brotli
+import pytest
+from flask import Response, stream_with_context
+
+def make_diagram(client, count=40):
+    nodes = [{'id': f'n{i}', 'type': 'switcher', 'label': f'Switcher {i}', 'position': {'x': i, 'y': 0},
+              'pins': [{'id': 'in-1', 'type': 'input', 'spec': '12G-SDI'}]} for i in range(count)]
+    return client.post('/api/diagrams', json={'name': 'Compressed', 'nodes': nodes, 'edges': []}).get_json()['id']
+
+@pytest.mark.parametrize('encoding, decode', [('br', brotli.decompress), ('gzip', gzip.decompress)])
+def test_json_is_compressed_for_clients_that_accept_it(user_client, encoding, decode):
+    diagram_id = make_diagram(user_client)
+    plain = user_client.get(f'/api/diagrams/{diagram_id}')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = user_client.get(f'/api/diagrams/{diagram_id}', headers={'Accept-Encoding': encoding})
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.data) < len(plain.data)
+    assert decode(response.data) == plain.data
+
+def test_brotli_is_preferred_and_small_bodies_are_left_alone(user_client):
+    diagram_id = make_diagram(user_client)
+    response = user_client.get(f'/api/diagrams/{diagram_id}', headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    response = user_client.get(f'/api/diagrams/{diagram_id}', headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    small = user_client.get('/api/diagrams/999999999', headers={'Accept-Encoding': 'br'})
+    assert small.status_code == 404 and 'Content-Encoding' not in small.headers
+
+def test_compressed_etags_are_distinct_and_revalidate(user_client):
+    diagram_id = make_diagram(user_client)
+    plain_etag = user_client.get(f'/api/diagrams/{diagram_id}').headers['ETag']
+    response = user_client.get(f'/api/diagrams/{diagram_id}', headers={'Accept-Encoding': 'br'})
+    etag = response.headers['ETag']
+    assert etag == plain_etag[:-1] + '-br"'
+
+    cached = user_client.get(f'/api/diagrams/{diagram_id}', headers={'Accept-Encoding': 'br', 'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.headers['ETag'] == etag
+    assert user_client.get(f'/api/diagrams/{diagram_id}',
+                           headers={'If-None-Match': plain_etag}).status_code == 304
+    # The compressed tag is still good for a conditional write
+    assert user_client.put(f'/api/diagrams/{diagram_id}', json={'nodes': [], 'edges': []},
+                           headers={'If-Match': etag}).status_code == 200
+
+def test_streams_are_compressed_as_they_go_and_events_not_at_all(make_app):
+    app = make_app()
+    closed = []
+
+    @app.route('/stream-test')
+    def stream_test():
+        def rows():
+            try:
+                yield from ['name,length\n'] + [f'cable {i},{i}\n' for i in range(500)]
+            finally:
+                closed.append(True)
+        return Response(stream_with_context(rows()), mimetype='text/csv')
+
+    @app.route('/events-test')
+    def events_test():
+        return Response(iter(['data: {}\n\n'] * 200), mimetype='text/event-stream')
+
+    client = app.test_client()
+    response = client.get('/stream-test', headers={'Accept-Encoding': 'gzip'})
+    assert response.is_streamed and response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).decode().count('\n') == 501
+    assert closed == [True]
+
+    events = client.get('/events-test', headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in events.headers
+
+def test_compression_can_be_turned_off(make_app):
+    app = make_app(COMPRESS_ENABLED=False)
+    with app.test_request_context():
+        from flask import jsonify
+        response = app.process_response(jsonify(data='x' * 4096))
+    assert 'Content-Encoding' not in response.headers
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_text('<script type="module" src="/assets/index-abc12345.js"></script>')
+    script = b'console.log("diagram");\n' * 500
+    (tmp_path / 'assets' / 'index-abc12345.js').write_bytes(script)
+    (tmp_path / 'assets' / 'index-abc12345.js.br').write_bytes(brotli.compress(script))
+    return tmp_path
+
+def test_built_frontend_is_served_with_precompressed_siblings(make_app, dist):
+    client = make_app(FRONTEND_DIST=str(dist)).test_client()
+    index = client.get('/')
+    assert index.status_code == 200 and b'index-abc12345.js' in index.data
+    assert index.headers['Cache-Control'] == 'no-cache'
+
+    script = client.get('/assets/index-abc12345.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert script.headers['Content-Encoding'] == 'br'
+    assert script.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert script.mimetype == 'text/javascript'
+    assert 'Accept-Encoding' in script.headers['Vary']
+    assert brotli.decompress(script.data) == (dist / 'assets' / 'index-abc12345.js').read_bytes()
+
+    # No gzip sibling: the file itself, not compressed again per request
+    plain = client.get('/assets/index-abc12345.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == (dist / 'assets' / 'index-abc12345.js').read_bytes()
+    assert plain.headers['ETag'] != script.headers['ETag']
+
+    assert client.get('/assets/missing-00000000.js').status_code == 404
+    assert client.get('/../secret').status_code == 404
+    assert client.get('/healthz').status_code == 200  # app routes still win
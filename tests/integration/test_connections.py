@@ -0,0 +1,45 @@
+# tests/integration/test_connections.py
+import pytest
+
+NODES = [
+    {'id': 'cam', 'pins': [{'id': 'out', 'type': 'output', 'spec': '12G-SDI'}]},
+    {'id': 'atem', 'pins': [{'id': 'in-1', 'type': 'input', 'spec': '12G-SDI'},
+                            {'id': 'ref', 'type': 'input', 'spec': 'Tri-Level / Black Burst'}]},
+]
+
+@pytest.fixture
+def diagram_id(user_client):
+    return user_client.post('/api/diagrams', json={'name': 'Rules', 'nodes': NODES}).get_json()['id']
+
+def test_check_single_connection(user_client, diagram_id):
+    url = f'/api/diagrams/{diagram_id}/connections/check'
+    ok = user_client.get(url, query_string={'source': 'cam', 'sourceHandle': 'out',
+                                            'target': 'atem', 'targetHandle': 'in-1'}).get_json()
+    assert ok == {'valid': True, 'reason': None, 'version': 1}
+    bad = user_client.get(url, query_string={'source': 'cam', 'sourceHandle': 'out',
+                                             'target': 'atem', 'targetHandle': 'ref'}).get_json()
+    assert bad['reason'] == 'spec_mismatch'
+
+def test_patch_connect_is_validated(user_client, diagram_id):
+    url = f'/api/diagrams/{diagram_id}/changes'
+    response = user_client.post(url, json={'base_version': 1, 'ops': [
+        {'op': 'connect', 'edge': {'id': 'e1', 'source': 'cam', 'sourceHandle': 'out',
+                                   'target': 'atem', 'targetHandle': 'ref'}}]})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'spec_mismatch'
+
+    response = user_client.post(url, json={'base_version': 1, 'ops': [
+        {'op': 'add_pin', 'node': 'cam', 'pin': {'id': 'bb', 'type': 'output', 'spec': 'Black Burst'}},
+        {'op': 'connect', 'edge': {'id': 'e1', 'source': 'cam', 'sourceHandle': 'bb',
+                                   'target': 'atem', 'targetHandle': 'ref'}}]})
+    assert response.status_code == 200
+
+    assert user_client.get(f'/api/diagrams/{diagram_id}/validation').get_json()['valid'] is True
+
+def test_validate_whole_document(user_client):
+    edges = [
+        {'id': 'e1', 'source': 'cam', 'sourceHandle': 'out', 'target': 'atem', 'targetHandle': 'in-1'},
+        {'id': 'e2', 'source': 'cam', 'sourceHandle': 'out', 'target': 'ghost', 'targetHandle': 'in-1'},
+    ]
+    body = user_client.post('/api/diagrams/validate', json={'nodes': NODES, 'edges': edges}).get_json()
+    assert body == {'valid': False, 'edges': 2, 'errors': [{'edge': 'e2', 'reason': 'unknown_node'}]}
@@ -0,0 +1,40 @@
+# tests/integration/test_db_pool.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from app import db, metrics
+from app.database import InstrumentedQueuePool
+
+def test_pool_timeouts_and_checkouts_are_counted(app):
+    engine = create_engine(db.engine.url, poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    timeouts = metrics.registry.get('db_pool_timeouts_total')
+    checkouts = metrics.registry.get('db_pool_checkout_seconds')
+    before = timeouts.value(), checkouts.count()
+    try:
+        with engine.connect():
+            with pytest.raises(PoolTimeout):
+                engine.connect()
+    finally:
+        engine.dispose()
+    assert timeouts.value() == before[0] + 1
+    assert checkouts.count() == before[1] + 2
+
+def test_pool_occupancy_is_scraped(app, client):
+    db.session.execute(text('SELECT 1'))
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'db_pool_checked_out{bind="default"} 1' in body
+    assert 'db_pool_size{bind="default"} 5' in body
+    assert 'db_pool_connections_opened_total' in body
+
+def test_pgbouncer_mode_sets_the_timeout_per_transaction(app):
+    app.config.update(DB_PGBOUNCER=True, DB_STATEMENT_TIMEOUT_MS=1234)
+    with db.engine.connect() as conn:
+        assert conn.execute(text('SHOW statement_timeout')).scalar() == '1234ms'
+        conn.commit()
+        # A second transaction on the same checkout gets its own SET LOCAL...
+        assert conn.execute(text('SHOW statement_timeout')).scalar() == '1234ms'
+        conn.commit()
+        # ...and none of it outlives the transaction on the server session.
+        app.config['DB_PGBOUNCER'] = False
+        assert conn.execute(text('SHOW statement_timeout')).scalar() == '0'
@@ -0,0 +1,157 @@
+# tests/integration/test_device_models_api.py
+import pytest
+import uuid
+from app import db
+from app.models.diagram import DiagramPin
+from app.models.master import DeviceModel, DeviceType, Manufacturer
+
+pytestmark = pytest.mark.usefixtures('clean_catalog')
+
+TEMPLATE = [
+    {"id": "sdi-in-1", "label": "SDI In 1", "type": "input", "spec": "12G-SDI"},
+    {"id": "sdi-in-2", "label": "SDI In 2", "type": "input", "spec": "12G-SDI"},
+    {"id": "sdi-aux-out-1", "label": "SDI Aux Out 1", "type": "output", "spec": "12G-SDI"},
+    {"id": "ethernet-ctrl-1", "label": "Control Ethernet 1", "type": "control", "spec": "1GBASE-T"},
+]
+
+@pytest.fixture
+def model_id(superadmin_client, app):
+    with app.app_context():
+        maker = Manufacturer(name=f"Blackmagic Design {uuid.uuid4().hex[:6]}")
+        kind = DeviceType(name=f"Switcher {uuid.uuid4().hex[:6]}", color='#0a1f44')
+        db.session.add_all([maker, kind])
+        db.session.commit()
+        maker_id, kind_id = maker.id, kind.id
+    response = superadmin_client.post('/super_admin/device-models', json={
+        'name': 'ATEM Constellation 2 M/E', 'manufacturer_id': maker_id,
+        'device_type_id': kind_id, 'pins': TEMPLATE})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def placed(key, model_id, x=0, **fields):
+    return dict({"id": key, "type": "switcher", "device_model_id": model_id, "position": {"x": x, "y": 0}}, **fields)
+
+def test_models_store_compact_templates(superadmin_client, model_id, app):
+    with app.app_context():
+        assert db.session.get(DeviceModel, model_id).pins[0] == ['sdi-in-1', 'SDI In 1', 'input', '12G-SDI']
+
+    listing = superadmin_client.get('/api/device-models').get_json()['items']
+    assert [(m['id'], m['pin_count']) for m in listing] == [(model_id, 4)]
+    assert 'pins' not in listing[0]
+    assert superadmin_client.get(f'/api/device-models/{model_id}').get_json()['pins'] == TEMPLATE
+    assert superadmin_client.get('/api/device-models/0').status_code == 404
+
+    duplicate = superadmin_client.post('/super_admin/device-models', json={
+        'name': 'ATEM Constellation 2 M/E', 'manufacturer_id': listing[0]['manufacturer_id']})
+    assert duplicate.status_code == 409
+    bad = superadmin_client.post('/super_admin/device-models', json={
+        'name': 'X', 'manufacturer_id': listing[0]['manufacturer_id'], 'pins': [{'id': 'a'}, {'id': 'a'}]})
+    assert bad.status_code == 400
+
+def test_placed_nodes_store_no_pins_and_load_lazily(superadmin_client, model_id, app):
+    nodes = [placed(f"sw{i}", model_id, x=i * 100) for i in range(10)]
+    diagram_id = superadmin_client.post('/api/diagrams', json={'name': 'Truck', 'nodes': nodes}).get_json()['id']
+    with app.app_context():
+        assert DiagramPin.query.filter_by(diagram_id=diagram_id).count() == 0
+
+    summary = superadmin_client.get(f'/api/diagrams/{diagram_id}').get_json()
+    assert summary['nodes'][0]['pin_count'] == 4 and 'pins' not in summary['nodes'][0]
+    assert summary['nodes'][0]['device_model_id'] == model_id
+
+    full = superadmin_client.get(f'/api/diagrams/{diagram_id}?include=pins').get_json()
+    assert all(n['pins'] == TEMPLATE for n in full['nodes'])
+
+    one = superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/sw3/pins')
+    assert one.status_code == 200 and one.get_json() == TEMPLATE
+    assert superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/nope/pins').status_code == 404
+
+    batch = superadmin_client.get(f'/api/diagrams/{diagram_id}/pins?nodes=sw1,nope,sw2').get_json()
+    assert batch['pins'] == {'sw1': TEMPLATE, 'sw2': TEMPLATE}
+    assert superadmin_client.get(f'/api/diagrams/{diagram_id}/pins').status_code == 400
+
+def test_node_pin_lists_are_stored_as_overrides(superadmin_client, model_id, app):
+    custom = [dict(TEMPLATE[0], label='Camera 1'), TEMPLATE[2], TEMPLATE[3],
+              {"id": "tally", "label": "Tally", "type": "control", "spec": "GPI"}]
+    nodes = [placed('sw', model_id, pins=custom), placed('plain', model_id)]
+    diagram_id = superadmin_client.post('/api/diagrams', json={'name': 'Override', 'nodes': nodes}).get_json()['id']
+    with app.app_context():
+        rows = {p.key: p.removed for p in DiagramPin.query.filter_by(diagram_id=diagram_id)}
+    assert rows == {'sdi-in-1': False, 'sdi-in-2': True, 'tally': False}
+
+    pins = superadmin_client.get(f'/api/diagrams/{diagram_id}/pins?nodes=sw,plain').get_json()['pins']
+    assert pins['sw'] == custom
+    assert pins['plain'] == TEMPLATE
+
+    # Saving the summary document back (no pins keys) keeps every override.
+    summary = superadmin_client.get(f'/api/diagrams/{diagram_id}').get_json()
+    nodes = [{k: v for k, v in n.items() if k != 'pin_count'} for n in summary['nodes']]
+    assert superadmin_client.put(f'/api/diagrams/{diagram_id}', json={'nodes': nodes}).status_code == 200
+    assert superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/sw/pins').get_json() == custom
+
+def test_template_pins_drive_connections_and_patches(superadmin_client, model_id):
+    nodes = [placed('a', model_id), placed('b', model_id, x=500)]
+    edges = [{"id": "e1", "source": "a", "sourceHandle": "sdi-aux-out-1", "target": "b", "targetHandle": "sdi-in-1"}]
+    diagram_id = superadmin_client.post('/api/diagrams', json={'name': 'Rules', 'nodes': nodes,
+                                                               'edges': edges}).get_json()['id']
+    assert superadmin_client.get(f'/api/diagrams/{diagram_id}/validation').get_json()['valid'] is True
+    bom = superadmin_client.get(f'/api/diagrams/{diagram_id}/cables').get_json()['bom']
+    assert [item['spec'] for item in bom] == ['12G-SDI']
+
+    def patch(version, *ops):
+        return superadmin_client.post(f'/api/diagrams/{diagram_id}/changes',
+                                      json={'base_version': version, 'ops': list(ops)})
+
+    assert patch(1, {'op': 'remove_pin', 'node': 'b', 'pin': 'sdi-in-2'}).status_code == 200
+    assert patch(2, {'op': 'remove_pin', 'node': 'b', 'pin': 'sdi-in-2'}).status_code == 409
+    pins = superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/b/pins').get_json()
+    assert [p['id'] for p in pins] == ['sdi-in-1', 'sdi-aux-out-1', 'ethernet-ctrl-1']
+
+    connect = {'op': 'connect', 'edge': {'id': 'e2', 'source': 'a', 'sourceHandle': 'sdi-aux-out-1',
+                                         'target': 'b', 'targetHandle': 'sdi-in-2'}}
+    assert patch(2, connect).get_json()['reason'] == 'unknown_pin'
+    revived = {'op': 'add_pin', 'node': 'b', 'pin': dict(TEMPLATE[1], label='ISO')}
+    assert patch(2, revived).status_code == 200
+    assert patch(3, {'op': 'add_pin', 'node': 'b', 'pin': TEMPLATE[1]}).status_code == 409
+    assert patch(3, {'op': 'add_node', 'node': placed('c', model_id)}, dict(connect, edge=dict(
+        connect['edge'], source='c'))).status_code == 200
+
+    pins = superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/b/pins').get_json()
+    assert pins[1] == dict(TEMPLATE[1], label='ISO')
+
+def test_template_changes_reach_placed_nodes(superadmin_client, model_id):
+    diagram_id = superadmin_client.post('/api/diagrams', json={
+        'name': 'Upgrade', 'nodes': [placed('a', model_id), placed('b', model_id)]}).get_json()['id']
+
+    def check():
+        return superadmin_client.get(f'/api/diagrams/{diagram_id}/connections/check', query_string={
+            'source': 'a', 'sourceHandle': 'sdi-aux-out-1', 'target': 'b', 'targetHandle': 'sdi-in-3',
+        }).get_json()['reason']
+    assert check() == 'unknown_pin'
+    summary = superadmin_client.get(f'/api/diagrams/{diagram_id}')
+
+    extra = {"id": "sdi-in-3", "label": "SDI In 3", "type": "input", "spec": "12G-SDI"}
+    response = superadmin_client.put(f'/super_admin/device-models/{model_id}', json={'pins': TEMPLATE + [extra]})
+    assert response.status_code == 200
+    refreshed = superadmin_client.get(f'/api/diagrams/{diagram_id}', headers={'If-None-Match': summary.headers['ETag']})
+    assert refreshed.status_code == 200
+    assert [n['pin_count'] for n in refreshed.get_json()['nodes']] == [5, 5]
+    assert superadmin_client.get(f'/api/diagrams/{diagram_id}/nodes/b/pins').get_json()[-1] == extra
+    assert check() is None
+
+def test_bad_color_or_thumbnail_is_rejected(superadmin_client, model_id):
+    for field, value in (('color', '#0a1f44-too-long'), ('color', 12), ('thumbnail', 'x' * 200), ('thumbnail', [])):
+        response = superadmin_client.put(f'/super_admin/device-models/{model_id}', json={field: value})
+        assert response.status_code == 400, (field, value)
+    response = superadmin_client.put(f'/super_admin/device-models/{model_id}', json={'color': '#0A1F44'})
+    assert response.get_json()['color'] == '#0A1F44'
+
+def test_manufacturer_in_use_is_not_deleted(superadmin_client, model_id, app):
+    superadmin_client.post('/api/diagrams', json={'name': 'Uses it', 'nodes': [placed('a', model_id)]})
+    with app.app_context():
+        maker_id = db.session.get(DeviceModel, model_id).manufacturer_id
+    response = superadmin_client.post('/super_admin/super_admin/', data={
+        'action': 'manufacturer_delete', 'manufacturer_id': maker_id})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Manufacturer, maker_id) is not None
+        assert db.session.get(DeviceModel, model_id) is not None
@@ -0,0 +1,93 @@
+# tests/integration/test_diagram_events.py
+import json
+import time
+import pytest
+from app import diagram_push
+
+# NOTIFY is only sent on a real COMMIT, and the push threads need their own connections.
+pytestmark = pytest.mark.db_commit
+
+@pytest.fixture
+def user_client(user_client):
+    yield user_client
+    diagram_push.stop()
+
+@pytest.fixture
+def diagram_id(user_client):
+    nodes = [{'id': key, 'type': 'router', 'position': {'x': 0, 'y': 0}, 'pins': []} for key in 'ab']
+    response = user_client.post('/api/diagrams', json={'name': 'Live', 'nodes': nodes})
+    return response.get_json()['id']
+
+def patch(client, diagram_id, base_version, *ops):
+    response = client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': base_version, 'ops': list(ops)})
+    assert response.status_code == 200
+    return response
+
+def move(node, x):
+    return {'op': 'move_node', 'node': node, 'position': {'x': x, 'y': 0}}
+
+def next_event(stream, timeout=10):
+    """The next (event, id, data) frame, skipping comments and ``retry``."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        chunk = next(stream)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            return fields['event'], fields.get('id'), json.loads(fields['data'])
+    raise AssertionError('no event before the timeout')
+
+def test_committed_patches_are_pushed_coalesced(user_client, diagram_id, app):
+    app.config.update(PUSH_HEARTBEAT_SECONDS=0.5, PUSH_TICK_SECONDS=0.5)
+    response = user_client.get(f'/api/diagrams/{diagram_id}/events', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    try:
+        next(stream)  # retry: ... once the stream is subscribed
+        patch(user_client, diagram_id, 1, move('a', 1))
+        patch(user_client, diagram_id, 2, move('a', 2))
+        patch(user_client, diagram_id, 3, move('b', 3))
+
+        events = [next_event(stream)]
+        while events[-1][1] != '4':
+            events.append(next_event(stream))
+        ops = [c for _, _, data in events for c in data['changes']]
+        # Three commits, but at most one frame per tick and drags within a frame coalesced.
+        assert len(events) <= 2
+        assert len([op for op in ops if op['node'] == 'a']) == len(events)
+        assert ops[-1]['node'] == 'b' and ops[-1]['version'] == 4
+        assert [op for op in ops if op['node'] == 'a'][-1]['position'] == {'x': 2, 'y': 0}
+    finally:
+        response.close()
+    with app.app_context():
+        assert app.extensions['diagram_push'].subscriber_count() == 0
+
+def test_stream_catches_up_from_last_event_id(user_client, diagram_id):
+    patch(user_client, diagram_id, 1, move('a', 1))
+    patch(user_client, diagram_id, 2, move('a', 2))
+    patch(user_client, diagram_id, 3, {'op': 'remove_node', 'node': 'b'})
+
+    response = user_client.get(f'/api/diagrams/{diagram_id}/events', headers={'Last-Event-ID': '1'},
+                               buffered=False)
+    try:
+        event, event_id, data = next_event(iter(response.response))
+    finally:
+        response.close()
+    assert (event, event_id, data['version']) == ('changes', '4', 4)
+    assert [(c['version'], c['op']) for c in data['changes']] == [(3, 'move_node'), (4, 'remove_node')]
+
+def test_stream_rejects_unknown_versions(user_client, diagram_id):
+    response = user_client.get(f'/api/diagrams/{diagram_id}/events?since=9')
+    assert response.status_code == 400
+    assert response.get_json()['version'] == 1
+
+def test_stream_is_refused_when_the_process_is_full(user_client, diagram_id, app):
+    app.config['PUSH_MAX_SUBSCRIBERS'] = 0
+    response = user_client.get(f'/api/diagrams/{diagram_id}/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+
+def test_stream_requires_login(user_client, diagram_id):
+    user_client.get('/logout')
+    assert user_client.get(f'/api/diagrams/{diagram_id}/events').status_code in (302, 401)
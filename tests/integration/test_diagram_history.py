@@ -0,0 +1,124 @@
+# tests/integration/test_diagram_history.py
+import io
+import json
+import pytest
+from datetime import datetime, timedelta
+from app import db
+from app.models.diagram import DiagramBlob, DiagramChange, DiagramSnapshot
+from app.services.history import prune_history
+
+@pytest.fixture
+def user_client(client, login):
+    return client, login()
+
+def make_node(key, x=0):
+    return {'id': key, 'type': 'router', 'position': {'x': x, 'y': 0},
+            'pins': [{'id': 'in', 'type': 'input', 'spec': 'XLR'}, {'id': 'out', 'type': 'output', 'spec': 'XLR'}]}
+
+@pytest.fixture
+def diagram_id(user_client):
+    client, _ = user_client
+    response = client.post('/api/diagrams', json={'name': 'History', 'nodes': [make_node('a'), make_node('b', 100)]})
+    return response.get_json()['id']
+
+def patch(client, diagram_id, base_version, *ops):
+    response = client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': base_version, 'ops': list(ops)})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['version']
+
+PATCHES = [
+    [{'op': 'move_node', 'node': 'a', 'position': {'x': 5, 'y': 6}}],
+    [{'op': 'connect', 'edge': {'id': 'e1', 'source': 'a', 'sourceHandle': 'out', 'target': 'b', 'targetHandle': 'in'}}],
+    [{'op': 'add_node', 'node': make_node('c', 200)}, {'op': 'update_node', 'node': 'b', 'fields': {'color': '#00ff00'}}],
+    [{'op': 'add_pin', 'node': 'c', 'pin': {'id': 'out-2', 'type': 'output', 'spec': 'XLR'}}],
+    [{'op': 'remove_node', 'node': 'b'}],
+]
+
+@pytest.fixture(params=['packed', 'jsonb'])
+def versions(request, user_client, diagram_id, app):
+    """Apply PATCHES with a snapshot every 3 ops; return {version: loaded document}."""
+    client, _ = user_client
+    app.config.update(HISTORY_SNAPSHOT_EVENTS=3, HISTORY_SNAPSHOT_FORMAT=request.param)
+    load = lambda: client.get(f'/api/diagrams/{diagram_id}?include=pins').get_json()
+    docs = {1: load()}
+    for version, ops in enumerate(PATCHES, start=1):
+        patch(client, diagram_id, version, *ops)
+        docs[version + 1] = load()
+    return docs
+
+def test_snapshots_on_saves_and_every_n_events(diagram_id, versions, app):
+    with app.app_context():
+        snapshots = [s.version for s in DiagramSnapshot.query.filter_by(diagram_id=diagram_id)
+                     .order_by(DiagramSnapshot.version)]
+    # v1 is a full save; v2-v4 add 1 + 1 + 2 ops, reaching 3 at v4; v5-v6 only 2 more.
+    assert snapshots == [1, 4]
+
+def test_every_version_is_rebuilt_as_it_was_loaded(user_client, diagram_id, versions):
+    client, _ = user_client
+    for version, loaded in versions.items():
+        rebuilt = client.get(f'/api/diagrams/{diagram_id}/versions/{version}').get_json()
+        assert rebuilt == loaded, version
+    assert client.get(f'/api/diagrams/{diagram_id}/versions/99').status_code == 404
+
+def test_single_node_at_a_version(user_client, diagram_id, versions):
+    client, _ = user_client
+    for version, loaded in versions.items():
+        for node in loaded['nodes']:
+            assert client.get(f'/api/diagrams/{diagram_id}/versions/{version}/nodes/{node["id"]}').get_json() == node
+    assert client.get(f'/api/diagrams/{diagram_id}/versions/6/nodes/b').status_code == 404
+    assert client.get(f'/api/diagrams/{diagram_id}/versions/2/nodes/c').status_code == 404
+
+def test_packed_snapshots_share_device_blobs(user_client, diagram_id, app):
+    client, _ = user_client
+    other = client.post('/api/diagrams', json={'name': 'Copy', 'nodes': [make_node('x'), make_node('y', 50)]})
+    with app.app_context():
+        packed = DiagramSnapshot.query.filter(DiagramSnapshot.diagram_id.in_(
+            [diagram_id, other.get_json()['id']])).all()
+        assert len(packed) == 2 and all(s.document is None for s in packed)
+        # Same device type and pins on every node: one metadata blob, one pin list.
+        assert {bytes(h) for s in packed for h in s.blobs} == {bytes(h) for h in packed[0].blobs}
+        assert len(packed[0].blobs) == 2
+        assert DiagramBlob.query.filter(DiagramBlob.hash.in_(packed[0].blobs)).count() == 2
+
+def test_restore_saves_an_old_version_as_a_new_one(user_client, diagram_id, versions):
+    client, _ = user_client
+    response = client.post(f'/api/diagrams/{diagram_id}/versions/2/restore', headers={'If-Match': '"d0v1"'})
+    assert response.status_code == 412
+
+    response = client.post(f'/api/diagrams/{diagram_id}/versions/2/restore')
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 7
+    current = client.get(f'/api/diagrams/{diagram_id}?include=pins').get_json()
+    assert dict(current, version=2) == versions[2]
+
+def test_history_lists_who_changed_what_newest_first(user_client, diagram_id, versions):
+    client, username = user_client
+    page = client.get(f'/api/diagrams/{diagram_id}/history?limit=2').get_json()
+    assert [(i['version'], i['change']['op']) for i in page['items']] == [(6, 'remove_node'), (5, 'add_pin')]
+    assert page['items'][0]['username'] == username
+    assert page['restorable_from'] == 1
+
+    page = client.get(f'/api/diagrams/{diagram_id}/history?limit=100&before={page["next"]}').get_json()
+    assert [i['version'] for i in page['items']] == [4, 4, 3, 2, 1]
+    assert page['next'] is None
+
+def test_prune_keeps_the_newest_old_snapshot_and_what_follows(user_client, diagram_id, versions, app):
+    client, _ = user_client
+    archive = io.StringIO()
+    with app.app_context():
+        kept = db.session.query(db.func.max(DiagramSnapshot.version)).filter_by(diagram_id=diagram_id).scalar()
+        counts = prune_history(datetime.utcnow() + timedelta(minutes=1), archive=archive)
+        assert DiagramChange.query.filter(DiagramChange.diagram_id == diagram_id,
+                                          DiagramChange.version <= kept).count() == 0
+    assert counts['diagram_change'] >= kept
+    lines = [json.loads(line) for line in archive.getvalue().splitlines()]
+    assert {line['table'] for line in lines} == {'diagram_change', 'diagram_snapshot'}
+    assert all(line['document']['nodes'] for line in lines if line['table'] == 'diagram_snapshot')
+
+    assert client.get(f'/api/diagrams/{diagram_id}/versions/{kept}').get_json() == versions[kept]
+    assert client.get(f'/api/diagrams/{diagram_id}/versions/{kept - 1}').status_code == 410
+    # Clients behind the pruned part can no longer catch up or rebase.
+    assert client.get(f'/api/diagrams/{diagram_id}/changes?since={kept - 1}').status_code == 410
+    response = client.post(f'/api/diagrams/{diagram_id}/changes', json={
+        'base_version': kept - 1, 'ops': [{'op': 'move_node', 'node': 'a', 'position': {'x': 1, 'y': 1}}]})
+    assert response.status_code == 409
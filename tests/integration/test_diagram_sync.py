@@ -0,0 +1,116 @@
+# tests/integration/test_diagram_sync.py
+import pytest
+from app.models.diagram import DiagramChange, DiagramNode
+
+def make_node(key, x=0, y=0):
+    return {
+        "id": key,
+        "type": "router",
+        "position": {"x": x, "y": y},
+        "pins": [
+            {"id": "in-1", "label": "In 1", "type": "input", "spec": "12G-SDI"},
+            {"id": "out-1", "label": "Out 1", "type": "output", "spec": "12G-SDI"},
+        ],
+    }
+
+@pytest.fixture
+def diagram_id(user_client):
+    nodes = [make_node('a'), make_node('b', x=100), make_node('c', x=200)]
+    response = user_client.post('/api/diagrams', json={'name': 'Sync', 'nodes': nodes})
+    return response.get_json()['id']
+
+def patch(client, diagram_id, base_version, *ops):
+    return client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': base_version, 'ops': list(ops)})
+
+def test_patch_applies_ops_and_bumps_version(user_client, diagram_id, app):
+    response = patch(user_client, diagram_id, 1,
+                     {'op': 'move_node', 'node': 'a', 'position': {'x': 5, 'y': 6}},
+                     {'op': 'move_node', 'node': 'b', 'position': {'x': 7, 'y': 8}},
+                     {'op': 'add_pin', 'node': 'a', 'pin': {'id': 'out-2', 'type': 'output', 'spec': '12G-SDI'}},
+                     {'op': 'connect', 'edge': {'id': 'e1', 'source': 'a', 'sourceHandle': 'out-2',
+                                                'target': 'b', 'targetHandle': 'in-1'}},
+                     {'op': 'update_node', 'node': 'c', 'fields': {'color': '#ff0000', 'label': 'Monitor'}})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 2
+
+    doc = user_client.get(f'/api/diagrams/{diagram_id}?include=pins').get_json()
+    nodes = {n['id']: n for n in doc['nodes']}
+    assert nodes['a']['position'] == {'x': 5, 'y': 6}
+    assert nodes['b']['position'] == {'x': 7, 'y': 8}
+    assert [p['id'] for p in nodes['a']['pins']] == ['in-1', 'out-1', 'out-2']
+    assert nodes['c']['color'] == '#ff0000' and nodes['c']['label'] == 'Monitor'
+    assert doc['edges'] == [{'id': 'e1', 'source': 'a', 'sourceHandle': 'out-2', 'target': 'b', 'targetHandle': 'in-1'}]
+
+    with app.app_context():
+        assert DiagramChange.query.filter_by(diagram_id=diagram_id, version=2).count() == 5
+
+def test_changes_since_returns_ops_in_order(user_client, diagram_id):
+    patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'a', 'position': {'x': 1, 'y': 1}})
+    patch(user_client, diagram_id, 2, {'op': 'remove_node', 'node': 'c'})
+
+    feed = user_client.get(f'/api/diagrams/{diagram_id}/changes?since=1').get_json()
+    assert feed['version'] == 3
+    assert [(c['version'], c['op']) for c in feed['changes']] == [(2, 'move_node'), (3, 'remove_node')]
+    assert feed['more'] is False
+
+    feed = user_client.get(f'/api/diagrams/{diagram_id}/changes?since=0').get_json()
+    assert feed['changes'][0]['op'] == 'replace'
+
+def test_stale_patch_is_rebased_when_it_touches_other_nodes(user_client, diagram_id, app):
+    assert patch(user_client, diagram_id, 1, {'op': 'update_node', 'node': 'a', 'fields': {'notes': 'x'}}).status_code == 200
+
+    response = patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'b', 'position': {'x': 9, 'y': 9}})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 3
+
+    with app.app_context():
+        node = DiagramNode.query.filter_by(diagram_id=diagram_id, key='b').one()
+        assert (node.x, node.y) == (9, 9)
+
+def test_concurrent_moves_are_last_writer_wins(user_client, diagram_id, app):
+    patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'a', 'position': {'x': 1, 'y': 1}})
+    response = patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'a', 'position': {'x': 2, 'y': 2}})
+    assert response.status_code == 200
+
+    with app.app_context():
+        node = DiagramNode.query.filter_by(diagram_id=diagram_id, key='a').one()
+        assert (node.x, node.y) == (2, 2)
+
+def test_conflicting_stale_patch_is_rejected(user_client, diagram_id, app):
+    patch(user_client, diagram_id, 1, {'op': 'remove_node', 'node': 'a'})
+
+    response = patch(user_client, diagram_id, 1, {'op': 'add_pin', 'node': 'a', 'pin': {'id': 'p'}})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == 2
+
+    response = patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'a', 'position': {'x': 0, 'y': 0}})
+    assert response.status_code == 409
+
+    with app.app_context():
+        assert DiagramChange.query.filter_by(diagram_id=diagram_id).count() == 2
+
+def test_full_replace_forces_reload(user_client, diagram_id):
+    user_client.put(f'/api/diagrams/{diagram_id}', json={'nodes': [make_node('a')]})
+    response = patch(user_client, diagram_id, 1, {'op': 'move_node', 'node': 'a', 'position': {'x': 0, 'y': 0}})
+    assert response.status_code == 409
+
+def test_invalid_patches(user_client, diagram_id):
+    assert patch(user_client, diagram_id, 5, {'op': 'remove_node', 'node': 'a'}).status_code == 400
+    assert patch(user_client, diagram_id, 1, {'op': 'explode'}).status_code == 400
+    assert patch(user_client, diagram_id, 1).status_code == 400
+    response = patch(user_client, diagram_id, 1, {'op': 'connect', 'edge': {'id': 'e', 'source': 'a', 'target': 'zz'}})
+    assert response.status_code == 400
+    assert response.get_json()['reason'] == 'unknown_node'
+    assert patch(user_client, diagram_id, 1, {'op': 'disconnect', 'edge': 'missing'}).status_code == 409
+
+def test_non_string_column_values_are_rejected(user_client, diagram_id):
+    for op in ({'op': 'update_node', 'node': 'a', 'fields': {'type': {'nested': True}}},
+               {'op': 'update_node', 'node': 'a', 'fields': {'notes': ['x']}},
+               {'op': 'add_pin', 'node': 'a', 'pin': {'id': 'p9', 'label': {'text': 'x'}}},
+               {'op': 'add_node', 'node': {'id': 'z', 'model': 5}}):
+        response = patch(user_client, diagram_id, 1, op)
+        assert response.status_code == 400, op
+        assert 'must be a string' in response.get_json()['error']
+    # Other fields still go to extra, whatever their type
+    assert patch(user_client, diagram_id, 1, {'op': 'update_node', 'node': 'a',
+                                              'fields': {'rack': {'u': 12}}}).status_code == 200
@@ -0,0 +1,80 @@
+# tests/integration/test_diagrams.py
+from app import db
+from app.models.user import User
+from app.models.diagram import Diagram, DiagramPin
+
+def make_node(key, x=0, y=0, spec='12G-SDI'):
+    """A node shaped like build_constellation_2me_node() in python_generic_script.py."""
+    return {
+        "id": key,
+        "type": "switcher",
+        "device_type": "Switcher",
+        "manufacturer": "Blackmagic Design",
+        "model": "ATEM Constellation 2 M/E",
+        "color": "#0a1f44",
+        "position": {"x": x, "y": y},
+        "pins": [
+            {"id": "in-1", "label": "SDI In 1", "type": "input", "spec": spec},
+            {"id": "out-1", "label": "SDI Out 1", "type": "output", "spec": spec},
+        ],
+        "notes": None,
+        "thumbnail": None,
+        "label": f"Switcher {key}",
+    }
+
+def test_save_and_load_round_trip(user_client, app):
+    nodes = [make_node(f"n{i}", x=i * 10, y=5) for i in range(50)]
+    edges = [{"id": f"e{i}", "source": f"n{i}", "sourceHandle": "out-1",
+              "target": f"n{i + 1}", "targetHandle": "in-1", "animated": True}
+             for i in range(49)]
+
+    response = user_client.post('/api/diagrams', json={'name': 'Stage A', 'nodes': nodes, 'edges': edges})
+    assert response.status_code == 201
+    created = response.get_json()
+    assert created['version'] == 1
+
+    response = user_client.get(f"/api/diagrams/{created['id']}?include=pins")
+    assert response.status_code == 200
+    doc = response.get_json()
+    assert doc['name'] == 'Stage A'
+    assert doc['nodes'] == nodes
+    assert doc['edges'] == edges
+
+    with app.app_context():
+        assert DiagramPin.query.filter_by(diagram_id=created['id']).count() == 100
+
+def test_replace_bumps_version_and_honours_etags(user_client):
+    diagram_id = user_client.post('/api/diagrams', json={'name': 'Stage B', 'nodes': [make_node('a')]}).get_json()['id']
+
+    first = user_client.get(f'/api/diagrams/{diagram_id}')
+    etag = first.headers['ETag']
+    assert user_client.get(f'/api/diagrams/{diagram_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    response = user_client.put(f'/api/diagrams/{diagram_id}', json={'nodes': [make_node('a'), make_node('b')]},
+                               headers={'If-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 2
+
+    stale = user_client.put(f'/api/diagrams/{diagram_id}', json={'nodes': []}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+
+    doc = user_client.get(f'/api/diagrams/{diagram_id}').get_json()
+    assert [n['id'] for n in doc['nodes']] == ['a', 'b']
+
+def test_invalid_documents_are_rejected(user_client):
+    diagram_id = user_client.post('/api/diagrams', json={'name': 'Stage C'}).get_json()['id']
+    bad_edge = {'nodes': [make_node('a')], 'edges': [{'id': 'e', 'source': 'a', 'target': 'missing'}]}
+    assert user_client.put(f'/api/diagrams/{diagram_id}', json=bad_edge).status_code == 400
+    dup = {'nodes': [make_node('a'), make_node('a')]}
+    assert user_client.put(f'/api/diagrams/{diagram_id}', json=dup).status_code == 400
+
+def test_other_users_cannot_see_diagram(user_client, make_user, app):
+    other = make_user()
+    with app.app_context():
+        diagram = Diagram(name='Private', owner_id=User.query.filter_by(username=other).one().id,
+                          version=0)
+        db.session.add(diagram)
+        db.session.commit()
+        diagram_id = diagram.id
+
+    assert user_client.get(f'/api/diagrams/{diagram_id}').status_code == 404
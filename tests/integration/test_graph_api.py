@@ -0,0 +1,63 @@
+# tests/integration/test_graph_api.py
+import pytest
+from app import db
+from app.models.diagram import DiagramChange
+from app.services import graph as graph_service
+
+def device(key):
+    return {'id': key, 'pins': [{'id': 'in', 'type': 'input', 'spec': '12G-SDI'},
+                                {'id': 'out', 'type': 'output', 'spec': '12G-SDI'}]}
+
+def link(key, source, target):
+    return {'id': key, 'source': source, 'sourceHandle': 'out', 'target': target, 'targetHandle': 'in'}
+
+@pytest.fixture
+def diagram_id(user_client):
+    doc = {'name': 'Flow', 'nodes': [device(k) for k in ('cam', 'conv', 'atem', 'mon', 'spare')],
+           'edges': [link('e1', 'cam', 'conv'), link('e2', 'conv', 'atem'), link('e3', 'atem', 'mon')]}
+    return user_client.post('/api/diagrams', json=doc).get_json()['id']
+
+def test_trace_loops_and_systems(user_client, diagram_id):
+    trace = user_client.get(f'/api/diagrams/{diagram_id}/trace?node=mon&pin=in').get_json()
+    assert [n['id'] for n in trace['nodes']] == ['atem', 'conv', 'cam']
+    assert trace['edges'] == ['e3', 'e2', 'e1']
+
+    down = user_client.get(f'/api/diagrams/{diagram_id}/trace?node=cam&direction=downstream&max_depth=2').get_json()
+    assert [n['id'] for n in down['nodes']] == ['conv', 'atem']
+
+    assert user_client.get(f'/api/diagrams/{diagram_id}/loops').get_json()['loops'] == []
+    assert user_client.get(f'/api/diagrams/{diagram_id}/systems').get_json()['systems'] == [
+        ['atem', 'cam', 'conv', 'mon'], ['spare']]
+    assert user_client.get(f'/api/diagrams/{diagram_id}/trace?node=ghost').status_code == 404
+
+def test_graph_follows_patches_without_rebuild(user_client, diagram_id, monkeypatch):
+    assert user_client.get(f'/api/diagrams/{diagram_id}/systems').status_code == 200
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError('graph should be advanced from the change feed')
+    monkeypatch.setattr(graph_service.SignalGraph, 'from_index', no_rebuild)
+
+    user_client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': 1, 'ops': [
+        {'op': 'disconnect', 'edge': 'e2'},
+        {'op': 'connect', 'edge': link('e4', 'mon', 'spare')},
+    ]})
+    assert user_client.get(f'/api/diagrams/{diagram_id}/systems').get_json()['systems'] == [
+        ['atem', 'mon', 'spare'], ['cam', 'conv']]
+
+    user_client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': 2, 'ops': [
+        {'op': 'connect', 'edge': link('e5', 'spare', 'atem')},
+    ]})
+    loops = user_client.get(f'/api/diagrams/{diagram_id}/loops').get_json()['loops']
+    assert loops == [{'nodes': ['atem', 'mon', 'spare'], 'edges': ['e3', 'e4', 'e5']}]
+
+def test_graph_is_rebuilt_when_the_feed_was_pruned(user_client, diagram_id, app):
+    assert user_client.get(f'/api/diagrams/{diagram_id}/systems').status_code == 200
+    user_client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': 1, 'ops': [
+        {'op': 'disconnect', 'edge': 'e2'}]})
+    user_client.post(f'/api/diagrams/{diagram_id}/changes', json={'base_version': 2, 'ops': [
+        {'op': 'connect', 'edge': link('e4', 'mon', 'spare')}]})
+    DiagramChange.query.filter_by(diagram_id=diagram_id, version=2).delete()
+    db.session.commit()
+
+    assert user_client.get(f'/api/diagrams/{diagram_id}/systems').get_json()['systems'] == [
+        ['atem', 'mon', 'spare'], ['cam', 'conv']]
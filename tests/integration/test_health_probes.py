@@ -0,0 +1,23 @@
+# tests/integration/test_health_probes.py
+from app.controllers import ops
+
+def test_liveness_does_not_need_the_database(client, monkeypatch):
+    monkeypatch.setattr(ops, 'check_database', lambda engine, timeout_ms: 'OperationalError')
+    assert client.get('/healthz').get_json() == {'status': 'ok'}
+
+def test_readiness_checks_the_database(client, app, monkeypatch):
+    response = client.get('/readyz')
+    assert response.status_code == 200 and response.get_json()['database'] == 'ok'
+
+    calls = []
+    def down(engine, timeout_ms):
+        calls.append(timeout_ms)
+        return 'OperationalError'
+    monkeypatch.setattr(ops, 'check_database', down)
+    assert client.get('/readyz').status_code == 200  # answered from the cached check
+
+    app.config['READINESS_CACHE_SECONDS'] = 0
+    response = client.get('/readyz')
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    assert response.get_json() == {'status': 'unavailable', 'database': 'OperationalError'}
+    assert calls == [app.config['READINESS_DB_TIMEOUT_MS']]
@@ -0,0 +1,77 @@
+# tests/integration/test_identity_cache.py
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models.user import User
+
+@pytest.fixture
+def app(make_app):
+    # No app context is left pushed here: requests must each get a fresh `g`,
+    # otherwise Flask-Login reuses the user loaded by the first request.
+    return make_app(push_context=False)
+
+@pytest.fixture
+def logged_in(client, login):
+    return client, login()
+
+def _user_table_queries(app, fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "user"' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+def test_identity_is_served_from_cache(logged_in, app):
+    client, _ = logged_in
+    client.get('/api/catalog/manufacturers')
+
+    queries = _user_table_queries(app, lambda: [
+        client.get('/api/catalog/manufacturers') for _ in range(5)
+    ])
+    assert queries == []
+
+def test_role_change_is_seen_on_next_request(logged_in, app):
+    client, username = logged_in
+    assert client.get('/super_admin/cache-stats').status_code == 403
+
+    with app.app_context():
+        User.query.filter_by(username=username).one().role = 'super_admin'
+        db.session.commit()
+
+    assert client.get('/super_admin/cache-stats').status_code == 200
+
+def test_password_change_ends_existing_sessions(logged_in, app):
+    client, username = logged_in
+    assert client.get('/api/catalog/manufacturers').status_code == 200
+
+    with app.app_context():
+        User.query.filter_by(username=username).one().set_password('changed')
+        db.session.commit()
+
+    response = client.get('/api/catalog/manufacturers')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+def test_hash_upgrade_on_login_keeps_other_sessions(logged_in, app):
+    client, username = logged_in
+    with app.app_context():
+        User.query.filter_by(username=username).one().password_hash = generate_password_hash(
+            'test123', method='pbkdf2:sha256:1000')
+        db.session.commit()
+
+    upgraded = app.test_client()
+    assert upgraded.post('/login', data={'username': username, 'password': 'test123'}).status_code == 302
+    with app.app_context():
+        assert User.query.filter_by(username=username).one().password_hash.startswith('scrypt:')
+    assert client.get('/api/catalog/manufacturers').status_code == 200
+    assert upgraded.get('/api/catalog/manufacturers').status_code == 200
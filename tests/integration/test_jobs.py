@@ -0,0 +1,206 @@
+# tests/integration/test_jobs.py
+import os
+import threading
+import time
+import pytest
+import uuid
+from sqlalchemy import text
+from app import db
+from app.jobs import _SUCCEED, JobContext, JobFailed, LeaseLost, Worker, enqueue, handler
+from app.models.job import Job
+from app.models.master import DeviceType
+from app.models.user import User
+
+# Workers claim and report on their own connections, outside the test transaction.
+pytestmark = pytest.mark.db_commit
+
+@handler('test.echo')
+def echo(payload, job):
+    job.progress(0.5, 'halfway')
+    return {'echo': payload, 'attempt': job.attempt}
+
+@handler('test.flaky')
+def flaky(payload, job):
+    raise RuntimeError('temporarily broken')
+
+@handler('test.broken')
+def broken(payload, job):
+    raise JobFailed('bad input')
+
+@pytest.fixture
+def user_client(client, app, login):
+    yield client, login('super_admin')
+
+    with app.app_context():
+        Job.query.delete()
+        DeviceType.query.delete()
+        db.session.commit()
+
+@pytest.fixture
+def worker(app):
+    app.config.update(JOBS_BACKOFF_SECONDS=30, JOBS_BACKOFF_MAX_SECONDS=60)
+    return Worker(app, name='test-worker')
+
+def queue(app, kind, payload=None, **options):
+    with app.app_context():
+        job = enqueue(kind, payload, **options)
+        db.session.commit()
+        return job.id
+
+def job_row(app, job_id):
+    with app.app_context():
+        return db.session.get(Job, job_id)
+
+def test_async_request_is_run_by_a_worker(user_client, worker, app):
+    client, _ = user_client
+    diagram = client.post('/api/diagrams', json={'name': 'Big', 'nodes': [
+        {'id': 'a', 'type': 'router', 'position': {'x': 0, 'y': 0},
+         'pins': [{'id': 'out', 'type': 'output', 'spec': 'XLR'}]},
+        {'id': 'b', 'type': 'router', 'position': {'x': 0, 'y': 0},
+         'pins': [{'id': 'in', 'type': 'input', 'spec': 'XLR'}]},
+    ], 'edges': [{'id': 'e1', 'source': 'a', 'sourceHandle': 'out', 'target': 'b', 'targetHandle': 'in'}]})
+    response = client.get(f"/api/diagrams/{diagram.get_json()['id']}/validation",
+                          headers={'Prefer': 'respond-async'})
+    assert response.status_code == 202
+    location = response.headers['Location']
+    assert client.get(location).get_json()['status'] == 'queued'
+
+    assert worker.run_one()
+    assert not worker.run_one()
+    status = client.get(location).get_json()
+    assert status['status'] == 'succeeded' and status['progress'] == 1
+    assert status['result'] == {'valid': True, 'errors': [], 'version': 1}
+    assert 'Retry-After' not in client.get(location).headers
+
+def test_catalog_import_job_reports_progress_and_cleans_up(user_client, worker, app):
+    client, _ = user_client
+    prefix = uuid.uuid4().hex[:6]
+    body = 'name,color\n' + ''.join(f'{prefix} Type {i},#00AA00\n' for i in range(5))
+    response = client.post('/super_admin/import/device-types?format=csv&chunk_size=2', data=body,
+                           headers={'Prefer': 'respond-async'}, content_type='text/csv')
+    assert response.status_code == 202
+    job = job_row(app, response.get_json()['id'])
+    assert os.path.exists(job.payload['path'])
+
+    assert worker.run_one()
+    status = client.get(response.headers['Location']).get_json()
+    assert status['result']['inserted'] == 5
+    assert 'inserted' in status['message']
+    assert not os.path.exists(job.payload['path'])
+
+def test_jobs_are_claimed_by_priority_skipping_locked_rows(user_client, worker, app):
+    low = queue(app, 'test.echo', {'n': 'low'}, priority=-5)
+    first = queue(app, 'test.echo', {'n': 'first'}, priority=5)
+    second = queue(app, 'test.echo', {'n': 'second'}, priority=5)
+    with app.app_context():
+        # Another worker is mid-claim on the best job: skip it rather than wait.
+        with db.engine.connect() as other:
+            other.execute(text('SELECT id FROM job WHERE id = :id FOR UPDATE'), {'id': first})
+            assert worker.claim().id == second
+            other.rollback()
+        assert worker.claim().id == first
+        assert worker.claim().id == low
+        assert worker.claim() is None
+
+def test_failures_retry_with_backoff_then_fail(user_client, worker, app):
+    job_id = queue(app, 'test.flaky', max_attempts=2)
+    assert worker.run_one()
+    job = job_row(app, job_id)
+    assert (job.status, job.attempts, job.error) == ('queued', 1, 'RuntimeError: temporarily broken')
+    with app.app_context():
+        due_in = db.session.execute(text("SELECT extract(epoch FROM run_after - timezone('utc', now())) "
+                                         "FROM job WHERE id = :id"), {'id': job_id}).scalar()
+    assert 20 < due_in <= 40  # 30 s with jitter
+    assert not worker.run_one()  # not due yet
+
+    with app.app_context():
+        db.session.execute(text('UPDATE job SET run_after = run_after - interval \'1 hour\''))
+        db.session.commit()
+    assert worker.run_one()
+    job = job_row(app, job_id)
+    assert (job.status, job.attempts) == ('failed', 2) and job.finished_at is not None
+
+def test_job_failed_is_not_retried(user_client, worker, app):
+    job_id = queue(app, 'test.broken')
+    assert worker.run_one()
+    job = job_row(app, job_id)
+    assert (job.status, job.attempts, job.error) == ('failed', 1, 'bad input')
+
+def test_expired_leases_are_requeued_and_the_old_worker_fenced_off(user_client, worker, app):
+    job_id = queue(app, 'test.echo', {'n': 1})
+    dead = Worker(app, name='dead-worker')
+    with app.app_context():
+        claimed = dead.claim()
+        assert worker.expire_leases() == 0
+        db.session.execute(text("UPDATE job SET lease_until = lease_until - interval '1 hour'"))
+        db.session.commit()
+        assert worker.expire_leases() == 1
+    job = job_row(app, job_id)
+    assert (job.status, job.locked_by) == ('queued', None)
+    assert 'dead-worker' in job.error
+
+    with app.app_context():
+        db.session.execute(text("UPDATE job SET run_after = run_after - interval '1 hour'"))
+        db.session.commit()
+    assert worker.run_one()
+    job = job_row(app, job_id)
+    assert (job.status, job.result) == ('succeeded', {'echo': {'n': 1}, 'attempt': 2})
+    assert job.message == 'halfway'
+
+    # The first worker wakes up: it can neither report progress nor overwrite the result.
+    with app.app_context():
+        with pytest.raises(LeaseLost):
+            JobContext(dead, claimed).progress(0.9)
+        assert dead.write(_SUCCEED, id=job_id, result='{"stale": true}') == 0
+
+def test_staged_upload_is_removed_when_the_last_worker_dies(user_client, worker, app, tmp_path):
+    path = tmp_path / 'import-staged.csv'
+    path.write_text('name\nNever Imported\n')
+    job_id = queue(app, 'catalog.import', {'catalog': 'device-types', 'path': str(path),
+                                           'format': 'csv', 'chunk_size': 10}, max_attempts=1)
+    with app.app_context():
+        Worker(app, name='dead-worker').claim()
+        db.session.execute(text("UPDATE job SET lease_until = lease_until - interval '1 hour'"))
+        db.session.commit()
+        assert worker.expire_leases() == 1
+    assert job_row(app, job_id).status == 'failed'
+    assert not path.exists()
+
+def test_status_is_private_to_its_creator(user_client, make_user, login, app):
+    client, _ = user_client
+    owner = make_user()
+    with app.app_context():
+        owner_id = User.query.filter_by(username=owner).one().id
+    job_id = queue(app, 'test.echo', user_id=owner_id)
+    assert client.get(f'/api/jobs/{job_id}').status_code == 200  # super admin
+
+    client.get('/logout')
+    login()
+    assert client.get(f'/api/jobs/{job_id}').status_code == 404
+
+    client.get('/logout')
+    login(username=owner)
+    response = client.get(f'/api/jobs/{job_id}')
+    assert response.get_json()['status'] == 'queued'
+    assert response.headers['Retry-After'] == '2'
+    assert client.get('/api/jobs/999999999').status_code == 404
+
+def test_worker_threads_drain_the_queue(user_client, app):
+    app.config.update(JOBS_POLL_SECONDS=0.05, JOBS_LEASE_SECONDS=0.3)
+    job_ids = [queue(app, 'test.echo', {'n': n}) for n in range(6)]
+    worker = Worker(app, threads=3, name='threaded-worker')
+    runner = threading.Thread(target=worker.run)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with app.app_context():
+                if Job.query.filter(Job.id.in_(job_ids), Job.status == 'succeeded').count() == len(job_ids):
+                    break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+        runner.join(5)
+    assert not runner.is_alive()
+    with app.app_context():
+        assert {job.attempts for job in Job.query.filter(Job.id.in_(job_ids))} == {1}
@@ -0,0 +1,34 @@
+# tests/integration/test_metrics_endpoint.py
+import logging
+import pytest
+from sqlalchemy import text
+from app import db, metrics
+
+def test_requests_feed_prometheus_histograms(user_client, app):
+    assert user_client.get('/api/catalog/device-types').status_code == 200
+    body = user_client.get('/metrics').get_data(as_text=True)
+    assert 'http_requests_total{endpoint="api.catalog_list",method="GET",status="200"} 1' in body
+    assert 'db_queries_per_request_count{endpoint="api.catalog_list"} 1' in body
+    assert 'db_time_per_request_seconds_bucket{endpoint="api.catalog_list",le="+Inf"} 1' in body
+    assert 'db_slowest_statement_seconds{endpoint="auth.login"}' in body
+
+def test_metrics_are_local_only(client):
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 404
+
+@pytest.mark.db_commit
+def test_repeated_statements_are_reported(client, app, caplog):
+    app.config.update(DB_N_PLUS_ONE_THRESHOLD=5, SLOW_REQUEST_THRESHOLD=0.0, DB_QUERY_HEADERS=True)
+
+    @app.route('/_test/n-plus-one')
+    def n_plus_one():
+        for i in range(6):
+            db.session.execute(text(f'SELECT {i} AS n'))
+        return 'ok'
+
+    with caplog.at_level(logging.WARNING):
+        response = client.get('/_test/n-plus-one')
+    assert response.headers['X-DB-Queries'] == '6'
+    assert any('Possible N+1 in n_plus_one: 6 runs of SELECT ? AS n' in r.message for r in caplog.records)
+    assert any(r.name == 'app.slow_requests' for r in caplog.records)
+    with app.app_context():
+        assert metrics.registry.get('db_n_plus_one_total').value('n_plus_one') == 1
@@ -0,0 +1,40 @@
+# tests/integration/test_request_logging.py
+import io
+import json
+import pytest
+from app import db
+
+@pytest.fixture
+def log_lines(app):
+    state = app.extensions['structured_logging']
+    state.stream = io.StringIO()
+
+    def lines():
+        state.flush()
+        return [json.loads(l) for l in state.stream.getvalue().splitlines()]
+    return lines
+
+def test_requests_get_ids_and_access_lines(client, log_lines):
+    response = client.get('/api/catalog/device-types', headers={'X-Request-ID': 'trace-123'})
+    assert response.headers['X-Request-ID'] == 'trace-123'
+    generated = client.post('/login', data={'username': 'nobody', 'password': 'wrong'},
+                            headers={'X-Request-ID': 'not valid!'}).headers['X-Request-ID']
+    assert generated != 'not valid!' and len(generated) == 32
+
+    lines = log_lines()
+    failed = [e for e in lines if e['msg'] == 'Login failed']
+    assert [(e['username'], e['request_id']) for e in failed] == [('nobody', generated)]
+    access = [e for e in lines if e['logger'] == 'app.access']
+    assert [(e['request_id'], e['path'], e['status']) for e in access] == [
+        ('trace-123', '/api/catalog/device-types', response.status_code), (generated, '/login', 200)]
+    assert access[0]['duration_ms'] >= 0 and access[0]['db_queries'] is not None
+
+def test_auth_events_are_logged_and_grants_sampled(log_lines, superadmin_client, app):
+    for _ in range(3):
+        superadmin_client.get('/super_admin/db-stats')
+
+    events = [e for e in log_lines() if e['logger'].startswith('app.auth')]
+    assert any(e['msg'] == 'Login succeeded' and e['user_id'] for e in events)
+    granted = [e for e in events if e['logger'] == 'app.auth.granted']
+    assert len(granted) <= 1 and all(e['sample_rate'] == 0.01 for e in granted)
+    assert all(e['request_id'] for e in events)
@@ -0,0 +1,44 @@
+# tests/integration/test_thumbnails_api.py
+import io
+import pytest
+from PIL import Image
+from app import thumbnail_store
+
+@pytest.fixture
+def superadmin_client(superadmin_client, app, tmp_path):
+    app.config.update(THUMBNAIL_FOLDER=str(tmp_path), THUMBNAIL_WORKERS=0)
+    return superadmin_client
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (512, 512), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def test_upload_dedups_and_serves_immutable_renditions(superadmin_client, app):
+    data = png_bytes((200, 0, 0, 255))
+    first = superadmin_client.post('/super_admin/thumbnails', data=data, content_type='image/png')
+    assert first.status_code == 201
+    body = first.get_json()
+    again = superadmin_client.post('/super_admin/thumbnails', content_type='multipart/form-data',
+                                   data={'file': (io.BytesIO(data), 'switcher.png')})
+    assert again.status_code == 200 and again.get_json()['digest'] == body['digest']
+
+    response = superadmin_client.get(body['urls']['palette'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert Image.open(io.BytesIO(response.data)).size == (48, 48)
+    etag = response.headers['ETag']
+    assert superadmin_client.get(body['urls']['palette'], headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        assert thumbnail_store.stats()['duplicates'] == 1
+
+def test_unknown_and_invalid_thumbnails(superadmin_client):
+    assert superadmin_client.get(f"/thumbnails/{'0' * 64}/canvas.webp").status_code == 404
+    assert superadmin_client.get('/thumbnails/../canvas.webp').status_code == 404
+    digest = superadmin_client.post('/super_admin/thumbnails', data=png_bytes((0, 0, 200, 255)),
+                                    content_type='image/png').get_json()['digest']
+    assert superadmin_client.get(f'/thumbnails/{digest}/huge.webp').status_code == 404
+    bad = superadmin_client.post('/super_admin/thumbnails', data=b'<svg/>', content_type='image/svg+xml')
+    assert bad.status_code == 400
@@ -0,0 +1,34 @@
+# tests/unit/test_autocomplete.py
+from app.autocomplete import PrefixIndex, name_tokens
+
+def test_name_tokens_start_at_words():
+    assert name_tokens('ATEM Constellation 2 M/E') == {
+        'atem constellation 2 m/e', 'constellation 2 m/e', '2 m/e', 'm/e', 'e'}
+
+def test_prefix_search_ranks_whole_name_matches_first():
+    index = PrefixIndex()
+    index.replace('device-types', [(1, 'Switcher'), (2, 'Video Switcher'), (3, 'Router'), (4, 'Sw')])
+    index.replace('manufacturers', [(1, 'Blackmagic Design'), (2, 'Sony')])
+
+    names = [item['name'] for item in index.search('sw', limit=10)]
+    assert names == ['Sw', 'Switcher', 'Video Switcher']
+    assert index.search('design', limit=10) == [{'catalog': 'manufacturers', 'id': 1, 'name': 'Blackmagic Design'}]
+    assert index.search('s', limit=2, catalogs=['manufacturers']) == [{'catalog': 'manufacturers', 'id': 2, 'name': 'Sony'}]
+    assert len(index.search('s', limit=2)) == 2
+    assert index.search('  ', limit=5) == []
+
+def test_upsert_renames_and_checksum():
+    index = PrefixIndex()
+    index.replace('device-types', [(1, 'Camera'), (2, 'Router')])
+    index.upsert('device-types', [(2, 'Matrix Router'), (5, 'Monitor')])
+    assert [i['name'] for i in index.search('m', limit=5)] == ['Monitor', 'Matrix Router']
+    assert index.search('router', limit=5)[0]['name'] == 'Matrix Router'
+    assert index.checksum('device-types') == (3, 8)
+
+def test_bulk_upsert_matches_replace():
+    rows = [(n, f'Model {n:04d}') for n in range(2000)]
+    bulk, rebuilt = PrefixIndex(), PrefixIndex()
+    bulk.replace('device-types', rows[:10])
+    bulk.upsert('device-types', [(1, 'Renamed')] + rows[10:])
+    rebuilt.replace('device-types', [(1, 'Renamed')] + rows[:1] + rows[2:])
+    assert bulk._entries == rebuilt._entries
@@ -0,0 +1,27 @@
+# tests/unit/test_bench_app.py
+from benchmarks.bench_app import compare, summarize
+from benchmarks.datagen import scale_rows, synthetic_document
+
+def test_summaries_report_percentiles_in_ms():
+    summary = summarize([i / 1000 for i in range(1, 101)], errors=2)
+    assert summary['n'] == 100 and summary['errors'] == 2
+    assert summary['p50_ms'] == 50.5 and summary['max_ms'] == 100.0
+    assert summary['p95_ms'] == 95.05 and summary['mean_ms'] == 50.5
+    assert summarize([]) == {'n': 0, 'errors': 0}
+
+def test_comparison_flags_real_regressions_only():
+    baseline = {'scenarios': {'login': {'p95_ms': 100.0}, 'catalog_list': {'p95_ms': 0.5},
+                              'dashboard': {'p95_ms': 20.0}, 'gone': {'p95_ms': 1.0}}}
+    current = {'scenarios': {'login': {'p95_ms': 130.0}, 'catalog_list': {'p95_ms': 1.2},
+                             'dashboard': {'p95_ms': 21.0, 'errors': 1}}}
+    rows = {name: regressed for name, _, _, _, regressed in compare(current, baseline, threshold=0.2)}
+    # catalog_list more than doubled but by under a millisecond; dashboard started failing.
+    assert rows == {'login': True, 'catalog_list': False, 'dashboard': True}
+
+def test_generated_diagrams_are_valid_chains():
+    from app.services.diagrams import validate_document
+
+    doc = synthetic_document(120, seed=3)
+    nodes, edges = validate_document(doc)
+    assert len(nodes) == 120 and len(edges) == 119
+    assert scale_rows('100k') == 100_000 and scale_rows('2500') == 2500
@@ -0,0 +1,42 @@
+# tests/unit/test_cables.py
+import numpy as np
+from app.services.cables import compute_schedule
+
+SPECS = ['12G-SDI', '1GBASE-T', 'odd-spec']
+
+def schedule(routing='manhattan'):
+    # Four runs: 3 m and 120 m of 12G-SDI, 4.5 m of Cat (direct 5 m), 0 m of an unknown spec.
+    return compute_schedule(
+        ['a', 'b', 'c', 'd'],
+        sx=[0, 0, 0, 50], sy=[0, 0, 0, 50], tx=[300, 12000, 300, 50], ty=[0, 0, 400, 50],
+        spec_codes=[0, 0, 1, 2], specs=SPECS, system_codes=[0, 0, 1, 1], systems=['cam', 'net'],
+        units_per_meter=100, routing=routing,
+    )
+
+def test_lengths_slack_and_stock():
+    s = schedule()
+    np.testing.assert_allclose(s.length, [3 * 1.1 + 1, 120 * 1.1 + 1, 7 * 1.1 + 2, 1])
+    assert s.stock[0] == 5 and s.stock[2] == 10 and s.stock[3] == 1
+    assert np.isnan(s.stock[1])
+    assert s.over_limit.tolist() == [False, True, False, False]
+    assert s.totals()['custom_runs'] == 1
+
+    direct = schedule('direct')
+    assert direct.length[2] == 5 * 1.1 + 2
+
+def test_bom_per_spec_and_system():
+    s = schedule()
+    assert s.bom() == [
+        {'spec': '12G-SDI', 'length': None, 'count': 1, 'run_meters': 133.0, 'cable_meters': 133.0},
+        {'spec': '12G-SDI', 'length': 5.0, 'count': 1, 'run_meters': 4.3, 'cable_meters': 5.0},
+        {'spec': '1GBASE-T', 'length': 10.0, 'count': 1, 'run_meters': 9.7, 'cable_meters': 10.0},
+        {'spec': 'odd-spec', 'length': 1.0, 'count': 1, 'run_meters': 1.0, 'cable_meters': 1.0},
+    ]
+    systems = s.by_system()
+    assert [(e['system'], e['runs'], e['cable_meters']) for e in systems] == [('cam', 2, 138.0), ('net', 2, 11.0)]
+    assert list(s.rows())[1] == ('b', '12G-SDI', 'cam', 133.0, None, True)
+
+def test_empty_schedule():
+    s = compute_schedule([], [], [], [], [], [], [], [], [])
+    assert s.bom() == [] and s.by_system() == []
+    assert s.totals() == {'runs': 0, 'run_meters': 0.0, 'custom_runs': 0, 'over_limit': 0}
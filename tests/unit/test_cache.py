@@ -0,0 +1,74 @@
+# tests/unit/test_cache.py
+import pytest
+import uuid
+from sqlalchemy import text
+from app import db, catalog_cache
+from app.cache import TTLCache
+from app.models.master import DeviceType
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+@pytest.fixture
+def catalog_app(app):
+    yield app
+    with app.app_context():
+        DeviceType.query.delete()
+        db.session.commit()
+
+def test_catalog_cache_invalidated_by_commit(catalog_app):
+    with catalog_app.app_context():
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return DeviceType.query.count()
+
+        first = catalog_cache.get_or_load('count', loader)
+        assert catalog_cache.get_or_load('count', loader) == first
+        assert len(calls) == 1
+
+        db.session.add(DeviceType(name=f"Cache {uuid.uuid4().hex[:8]}"))
+        db.session.commit()
+
+        assert catalog_cache.get_or_load('count', loader) == first + 1
+        assert len(calls) == 2
+        assert catalog_cache.stats()['hits'] >= 1
+
+def test_catalog_cache_sees_version_bump_from_other_worker(catalog_app):
+    with catalog_app.app_context():
+        store = catalog_app.extensions['catalog_cache']
+        store.poll_interval = 0
+        catalog_cache.get_or_load('key', lambda: 'stale')
+
+        # Another process bumping the shared counter, bypassing this session's events
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO catalog_version (id, version) VALUES (1, 1) "
+                "ON CONFLICT (id) DO UPDATE SET version = catalog_version.version + 1"))
+
+        assert catalog_cache.get_or_load('key', lambda: 'fresh') == 'fresh'
@@ -0,0 +1,71 @@
+# tests/unit/test_connection_rules.py
+from app.services.connections import (
+    DIRECTION, DUPLICATE_EDGE, SELF_LOOP, SOURCE_IN_USE, SPEC_MISMATCH, TARGET_IN_USE,
+    UNKNOWN_NODE, UNKNOWN_PIN, CompatibilityIndex, DiagramIndex, validate_edges,
+)
+
+def node(key, *pins):
+    return {'id': key, 'pins': [{'id': p, 'type': t, 'spec': s} for p, t, s in pins]}
+
+NODES = [
+    node('cam', ('sdi-out', 'output', '12G-SDI'), ('lan', 'control', '1GBASE-T')),
+    node('atem', ('sdi-in-1', 'input', '12G-SDI'), ('sdi-in-2', 'input', '12G-SDI'),
+         ('ref-in', 'input', 'Tri-Level / Black Burst'), ('lan', 'control', '1GBASE-T')),
+    node('sync', ('bb-out', 'output', 'Black Burst'), ('hd-out', 'output', '3G-SDI')),
+]
+
+def edge(key, source, source_pin, target, target_pin):
+    return {'id': key, 'source': source, 'sourceHandle': source_pin,
+            'target': target, 'targetHandle': target_pin}
+
+def test_compatibility_rules():
+    index = CompatibilityIndex()
+    assert index.accepts(('output', '12G-SDI'), ('input', '12G-SDI'))
+    assert not index.accepts(('output', '12G-SDI'), ('input', '1GBASE-T'))
+    assert not index.accepts(('input', '12G-SDI'), ('output', '12G-SDI'))
+    assert index.accepts(('control', '1GBASE-T'), ('control', '1GBASE-T'))
+    assert index.accepts(('output', 'Black Burst'), ('input', 'Tri-Level / Black Burst'))
+    assert not index.accepts(('output', 'Black Burst'), ('input', 'Tri-Level'))
+
+def test_compatibility_memo_is_bounded():
+    index = CompatibilityIndex(maxsize=8)
+    for n in range(100):
+        assert index.accepts(('output', f'Spec {n}'), ('input', f'Spec {n}'))
+    assert index.accepts.cache_info().currsize == 8
+
+def test_single_edge_checks():
+    index = DiagramIndex.from_document(NODES, [edge('e1', 'cam', 'sdi-out', 'atem', 'sdi-in-1')])
+    assert index.check('sync', 'bb-out', 'atem', 'ref-in') is None
+    assert index.check('atem', 'lan', 'cam', 'lan') is None
+    assert index.check('cam', 'sdi-out', 'cam', 'lan') == SELF_LOOP
+    assert index.check('cam', 'sdi-out', 'nope', 'x') == UNKNOWN_NODE
+    assert index.check('sync', 'nope', 'atem', 'sdi-in-2') == UNKNOWN_PIN
+    assert index.check('atem', 'sdi-in-2', 'cam', 'sdi-out') == DIRECTION
+    assert index.check('sync', 'hd-out', 'atem', 'sdi-in-2') == SPEC_MISMATCH
+    assert index.check('cam', 'sdi-out', 'atem', 'sdi-in-2') == SOURCE_IN_USE
+    assert index.check('cam', 'sdi-out', 'atem', 'sdi-in-1', edge_key='e1') is None
+
+def test_index_follows_ops():
+    index = DiagramIndex.from_document(NODES, [edge('e1', 'cam', 'sdi-out', 'atem', 'sdi-in-1')])
+    assert index.apply_op({'op': 'disconnect', 'edge': 'e1'}) is None
+    assert index.check('cam', 'sdi-out', 'atem', 'sdi-in-2') is None
+    index.apply_op({'op': 'add_node', 'node': node('cam2', ('sdi-out', 'output', '12G-SDI'))})
+    assert index.apply_op({'op': 'connect', 'edge': edge('e2', 'cam2', 'sdi-out', 'atem', 'sdi-in-1')}) is None
+    assert index.apply_op({'op': 'connect', 'edge': edge('e3', 'cam', 'sdi-out', 'atem', 'sdi-in-1')}) == TARGET_IN_USE
+    index.apply_op({'op': 'remove_node', 'node': 'cam2'})
+    assert 'e2' not in index.edges
+    assert index.check('cam', 'sdi-out', 'atem', 'sdi-in-1') is None
+
+def test_validate_edges_reports_every_bad_edge_once():
+    edges = [
+        edge('e1', 'cam', 'sdi-out', 'atem', 'sdi-in-1'),
+        edge('e2', 'cam', 'sdi-out', 'atem', 'sdi-in-2'),
+        edge('e3', 'sync', 'hd-out', 'atem', 'sdi-in-2'),
+        edge('e1', 'sync', 'bb-out', 'atem', 'ref-in'),
+        edge('e4', 'sync', 'bb-out', 'atem', 'ref-in'),
+    ]
+    assert validate_edges(NODES, edges) == [
+        {'edge': 'e2', 'reason': SOURCE_IN_USE},
+        {'edge': 'e3', 'reason': SPEC_MISMATCH},
+        {'edge': 'e1', 'reason': DUPLICATE_EDGE},
+    ]
@@ -0,0 +1,22 @@
+# tests/unit/test_database.py
+from app.database import InstrumentedQueuePool, engine_options
+
+CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'postgresql://u:p@db/app',
+    'DB_POOL_SIZE': 8, 'DB_MAX_OVERFLOW': 4, 'DB_POOL_TIMEOUT': 2.5, 'DB_POOL_RECYCLE': 600,
+    'DB_POOL_PRE_PING': True, 'DB_STATEMENT_TIMEOUT_MS': 15000, 'DB_PGBOUNCER': False,
+}
+
+def test_direct_connections_send_the_timeout_at_startup():
+    options = engine_options(CONFIG)
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert (options['pool_size'], options['max_overflow'], options['pool_timeout'],
+            options['pool_recycle'], options['pool_pre_ping']) == (8, 4, 2.5, 600, True)
+    assert options['connect_args'] == {'options': '-c statement_timeout=15000'}
+
+def test_pgbouncer_mode_avoids_startup_options_and_prepared_statements():
+    assert 'connect_args' not in engine_options(dict(CONFIG, DB_PGBOUNCER=True))
+    psycopg3 = engine_options(dict(CONFIG, DB_PGBOUNCER=True,
+                                   SQLALCHEMY_DATABASE_URI='postgresql+psycopg://u:p@db/app'))
+    assert psycopg3['connect_args'] == {'prepare_threshold': None}
+    assert 'connect_args' not in engine_options(dict(CONFIG, DB_STATEMENT_TIMEOUT_MS=0))
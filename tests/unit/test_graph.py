@@ -0,0 +1,58 @@
+# tests/unit/test_graph.py
+from app.services.graph import DOWNSTREAM, UPSTREAM, SignalGraph
+
+def build(*edges, control=()):
+    graph = SignalGraph()
+    for key, source, target in edges:
+        pin_type = 'control' if key in control else 'output'
+        graph.pin_types[source, f'{key}-out'] = pin_type
+        graph.pin_types[target, f'{key}-in'] = 'control' if key in control else 'input'
+        graph.connect(key, source, f'{key}-out', target, f'{key}-in')
+    return graph
+
+def test_trace_up_and_downstream():
+    graph = build(('e1', 'cam', 'router'), ('e2', 'router', 'atem'), ('e3', 'atem', 'mon'),
+                  ('e4', 'atem', 'rec'), ('e5', 'atem', 'switch'), control={'e5'})
+    up = graph.trace('mon', 'e3-in', UPSTREAM)
+    assert [(n['id'], n['depth']) for n in up['nodes']] == [('atem', 1), ('router', 2), ('cam', 3)]
+    assert up['edges'] == ['e3', 'e2', 'e1']
+
+    down = graph.trace('router', direction=DOWNSTREAM)
+    assert sorted(n['id'] for n in down['nodes']) == ['atem', 'mon', 'rec']
+    assert graph.trace('atem', 'e3-out', DOWNSTREAM)['nodes'] == [{'id': 'mon', 'depth': 1}]
+    assert graph.trace('mon', 'unused-in', UPSTREAM, max_depth=1)['nodes'] == [{'id': 'atem', 'depth': 1}]
+
+def test_unconnected_input_pin_has_nothing_upstream():
+    graph = build(('e1', 'cam', 'atem'))
+    graph.pin_types['atem', 'spare-in'] = 'input'
+    assert graph.trace('atem', 'spare-in', UPSTREAM) == {'nodes': [], 'edges': []}
+
+def test_loops_ignore_control_links():
+    graph = build(('e1', 'a', 'b'), ('e2', 'b', 'c'), ('e3', 'c', 'a'), ('e4', 'c', 'd'),
+                  ('e5', 'd', 'e'), ('e6', 'e', 'd'), ('e7', 'x', 'y'), ('e8', 'y', 'x'), control={'e8'})
+    assert sorted(graph.loops(), key=lambda loop: loop['nodes']) == [
+        {'nodes': ['a', 'b', 'c'], 'edges': ['e1', 'e2', 'e3']},
+        {'nodes': ['d', 'e'], 'edges': ['e5', 'e6']},
+    ]
+
+def test_systems_split_and_merge_incrementally():
+    graph = build(('e1', 'a', 'b'), ('e2', 'b', 'c'), ('e3', 'x', 'y'))
+    graph.add_node('lonely')
+    assert graph.systems() == [['a', 'b', 'c'], ['x', 'y'], ['lonely']]
+
+    graph.apply_op({'op': 'connect', 'edge': {'id': 'e4', 'source': 'c', 'target': 'x'}})
+    assert graph.system_of('y') == ['a', 'b', 'c', 'x', 'y']
+
+    graph.apply_op({'op': 'disconnect', 'edge': 'e2'})
+    assert graph.systems() == [['c', 'x', 'y'], ['a', 'b'], ['lonely']]
+
+    graph.apply_op({'op': 'remove_node', 'node': 'x'})
+    assert graph.systems() == [['a', 'b'], ['c'], ['lonely'], ['y']]
+    assert 'e3' not in graph.edges and 'e4' not in graph.edges
+
+def test_copy_is_independent():
+    graph = build(('e1', 'a', 'b'))
+    other = graph.copy()
+    other.disconnect('e1')
+    assert graph.system_of('a') == ['a', 'b']
+    assert other.system_of('a') == ['a']
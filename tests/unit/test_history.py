@@ -0,0 +1,50 @@
+# tests/unit/test_history.py
+import pytest
+from app.services.history import HistoryUnavailable, replay
+
+def node(key, *pins):
+    return {'id': key, 'type': 'router', 'position': {'x': 0, 'y': 0}, 'notes': None,
+            'pins': [{'id': p, 'label': None, 'type': None, 'spec': None} for p in pins]}
+
+def edge(key, source, source_pin, target, target_pin):
+    return {'id': key, 'source': source, 'sourceHandle': source_pin, 'target': target, 'targetHandle': target_pin}
+
+def document():
+    return {'nodes': [node('a', 'out'), node('b', 'in', 'in-2')],
+            'edges': [edge('e1', 'a', 'out', 'b', 'in'), edge('e2', 'a', 'out', 'b', 'in-2')]}
+
+def test_replay_moves_and_updates_nodes():
+    doc = replay(document(), [
+        {'op': 'move_node', 'node': 'a', 'position': {'x': 5, 'y': 6}},
+        {'op': 'update_node', 'node': 'b', 'fields': {'color': '#ff0000', 'label': 'Monitor'}},
+    ])
+    a, b = doc['nodes']
+    assert a['position'] == {'x': 5, 'y': 6}
+    assert b['color'] == '#ff0000' and b['label'] == 'Monitor'
+
+def test_replay_removes_edges_with_their_node_or_pin():
+    doc = replay(document(), [{'op': 'remove_pin', 'node': 'b', 'pin': 'in'}])
+    assert [p['id'] for p in doc['nodes'][1]['pins']] == ['in-2']
+    assert [e['id'] for e in doc['edges']] == ['e2']
+
+    doc = replay(document(), [{'op': 'remove_node', 'node': 'a'}])
+    assert [n['id'] for n in doc['nodes']] == ['b']
+    assert doc['edges'] == []
+
+def test_replay_adds_nodes_pins_and_edges_in_loaded_shape():
+    doc = replay(document(), [
+        {'op': 'add_node', 'node': {'id': 'c', 'position': {'x': 1, 'y': 2}, 'pins': [{'id': 'in', 'spec': 'XLR'}]}},
+        {'op': 'add_pin', 'node': 'a', 'pin': {'id': 'out-2', 'type': 'output'}},
+        {'op': 'connect', 'edge': {'id': 'e3', 'source': 'a', 'target': 'c', 'targetHandle': 'in'}},
+        {'op': 'disconnect', 'edge': 'e1'},
+    ])
+    c = doc['nodes'][-1]
+    assert c['color'] is None and c['position'] == {'x': 1, 'y': 2}
+    assert c['pins'] == [{'id': 'in', 'label': None, 'type': None, 'spec': 'XLR'}]
+    assert doc['nodes'][0]['pins'][-1] == {'id': 'out-2', 'label': None, 'type': 'output', 'spec': None}
+    assert [e['id'] for e in doc['edges']] == ['e2', 'e3']
+    assert doc['edges'][-1]['sourceHandle'] is None
+
+def test_replay_cannot_cross_a_full_save():
+    with pytest.raises(HistoryUnavailable):
+        replay(document(), [{'op': 'replace'}])
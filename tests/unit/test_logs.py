@@ -0,0 +1,37 @@
+# tests/unit/test_logs.py
+import io
+import json
+import logging
+from app.logs import JsonFormatter, SamplingFilter
+
+def record(name, msg='event', **extra):
+    return logging.makeLogRecord(dict({'name': name, 'msg': msg, 'levelname': 'INFO'}, **extra))
+
+def test_sampling_keeps_one_in_n_per_logger():
+    sampler = SamplingFilter({'app.auth.granted': 0.1, 'app.noisy': 0})
+    kept = [r for r in (record('app.auth.granted') for _ in range(30)) if sampler.filter(r)]
+    assert len(kept) == 3 and all(r.sample_rate == 0.1 for r in kept)
+    assert not sampler.filter(record('app.noisy.child'))
+    assert sampler.filter(record('app.auth'))
+    assert not hasattr(record('app.auth'), 'sample_rate')
+
+def test_json_lines_carry_extra_fields():
+    line = JsonFormatter().format(record('app.access', 'GET /x %s', args=(200,),
+                                         request_id='abc', duration_ms=1.5))
+    entry = json.loads(line)
+    assert entry['msg'] == 'GET /x 200' and entry['logger'] == 'app.access'
+    assert entry['request_id'] == 'abc' and entry['duration_ms'] == 1.5
+    assert 'args' not in entry and 'levelno' not in entry
+
+def test_records_are_written_by_the_listener(app):
+    state = app.extensions['structured_logging']
+    state.stream = io.StringIO()
+    try:
+        raise RuntimeError('boom')
+    except RuntimeError:
+        logging.getLogger('app.test').exception('failed %s', 'thing', extra={'diagram_id': 7})
+    logging.getLogger('app.test').debug('below the level')
+    state.flush()
+    lines = [json.loads(l) for l in state.stream.getvalue().splitlines()]
+    assert [(e['msg'], e['diagram_id']) for e in lines] == [('failed thing', 7)]
+    assert 'RuntimeError: boom' in lines[0]['exc']
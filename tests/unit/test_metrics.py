@@ -0,0 +1,39 @@
+# tests/unit/test_metrics.py
+from app.instrumentation import RequestQueries, statement_shape
+from app.metrics import MetricsRegistry
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram('req_seconds', 'Request time.', ('endpoint',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe('api.catalog_list', value=value)
+    registry.counter('hits_total', 'Hits.').inc(amount=2)
+
+    text = registry.render()
+    assert '# TYPE req_seconds histogram' in text
+    assert 'req_seconds_bucket{endpoint="api.catalog_list",le="0.1"} 2' in text
+    assert 'req_seconds_bucket{endpoint="api.catalog_list",le="1.0"} 3' in text
+    assert 'req_seconds_bucket{endpoint="api.catalog_list",le="+Inf"} 4' in text
+    assert 'req_seconds_count{endpoint="api.catalog_list"} 4' in text
+    assert 'hits_total 2' in text
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.gauge('g', 'G.', ('path',)).set('a"b\\c', value=1)
+    assert 'g{path="a\\"b\\\\c"} 1' in registry.render()
+
+def test_statement_shapes_ignore_values():
+    a = statement_shape("SELECT * FROM device_type WHERE id = 5 AND name = 'x'")
+    b = statement_shape("SELECT *\n FROM device_type WHERE id = 12 AND name = 'it''s'")
+    assert a == b == 'SELECT * FROM device_type WHERE id = ? AND name = ?'
+    assert statement_shape('SELECT 1 WHERE id IN (%(p_1)s, %(p_2)s, %(p_3)s)') == \
+        statement_shape('SELECT 1 WHERE id IN (%(p_1)s)')
+
+def test_repeated_shapes_are_flagged():
+    queries = RequestQueries()
+    for i in range(12):
+        queries.record(f'SELECT name FROM manufacturer WHERE id = {i}', 0.001)
+    queries.record('SELECT 1', 0.5)
+    assert queries.count == 13 and queries.slowest_statement == 'SELECT 1'
+    assert queries.repeated(10) == [('SELECT name FROM manufacturer WHERE id = ?', 12)]
+    assert queries.repeated(20) == []
@@ -0,0 +1,45 @@
+# tests/unit/test_packing.py
+import pytest
+from app.services.packing import PackError, blob_refs, pack_document, unpack_document, unpack_node
+
+def node(key, x, model='DM-1000', pins=('in', 'out')):
+    return {'id': key, 'type': 'router', 'device_type': 'Router', 'manufacturer': 'Acme', 'model': model,
+            'color': '#3366ff', 'position': {'x': x, 'y': 2.5}, 'notes': None, 'thumbnail': None,
+            'pins': [{'id': p, 'label': None, 'type': 'input', 'spec': 'XLR'} for p in pins]}
+
+def document(count=600):
+    return {'id': 7, 'name': 'Stage',
+            'nodes': [node(f'n{i}', i, model=f'DM-{i % 3}') for i in range(count)] + [
+                dict(node('odd', 0, pins=()), device_model_id=4, label='Spare')],
+            'edges': [{'id': 'e1', 'source': 'n0', 'sourceHandle': 'out', 'target': 'n1', 'targetHandle': 'in'},
+                      {'id': 'e2', 'source': 'n1', 'sourceHandle': None, 'target': 'odd', 'targetHandle': None,
+                       'type': 'smoothstep'}]}
+
+def test_round_trip_interns_repeated_metadata_and_pins():
+    doc = document()
+    body, blobs = pack_document(doc)
+    # Three models plus the odd node's metadata; two distinct pin lists.
+    assert len(blobs) == 4 + 2
+    assert sorted(blob_refs(body)) == sorted(blobs)
+    assert unpack_document(body, lambda hashes: {h: blobs[h] for h in hashes}) == doc
+
+def test_single_node_decodes_one_block_and_its_blobs():
+    doc = document()
+    body, blobs = pack_document(doc, block_size=64)
+    requested = []
+    def load(hashes):
+        requested.extend(hashes)
+        return {h: blobs[h] for h in hashes}
+    assert unpack_node(body, 'n500', load) == doc['nodes'][500]
+    assert len(requested) == 2
+    assert unpack_node(body, 'odd', load) == doc['nodes'][-1]
+    assert unpack_node(body, 'missing', load) is None
+
+def test_empty_document():
+    body, blobs = pack_document({'name': 'Empty', 'nodes': [], 'edges': []})
+    assert blobs == {}
+    assert unpack_document(body, lambda hashes: {}) == {'name': 'Empty', 'nodes': [], 'edges': []}
+
+def test_rejects_other_formats():
+    with pytest.raises(PackError):
+        unpack_document(b'{"nodes": []}', lambda hashes: {})
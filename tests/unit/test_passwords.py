@@ -0,0 +1,72 @@
+# tests/unit/test_passwords.py
+import os
+import threading
+import time
+import pytest
+from werkzeug.security import generate_password_hash
+from app import db, password_hasher
+from app.models.user import User
+from app.passwords import HasherBusy
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+def test_hash_and_verify_in_pool(app):
+    with app.app_context():
+        pwhash = password_hasher.hash('secret')
+        assert pwhash.startswith('scrypt:32768:8:1$')
+        assert password_hasher.verify(pwhash, 'secret')
+        assert not password_hasher.verify(pwhash, 'wrong')
+        assert not password_hasher.needs_rehash(pwhash)
+        assert password_hasher.needs_rehash(generate_password_hash('x', method='pbkdf2:sha256:1000'))
+
+def test_saturated_pool_rejects_fast(app):
+    with app.app_context():
+        state = app.extensions['password_hasher']
+        state.slots = threading.BoundedSemaphore(1)
+        state.slots.acquire()
+        with pytest.raises(HasherBusy):
+            password_hasher.verify('scrypt:32768:8:1$x$y', 'secret')
+
+def test_slow_or_crashed_pool_is_busy_not_an_error(app):
+    with app.app_context():
+        state = app.extensions['password_hasher']
+        state.timeout = 0.05
+        with pytest.raises(HasherBusy):
+            password_hasher._run(time.sleep, 1)
+        state.timeout = 10
+        pool = state.executor()
+        with pytest.raises(HasherBusy):
+            password_hasher._run(os._exit, 1)  # kills a pool process
+        assert state.executor() is not pool
+        assert password_hasher.verify(password_hasher.hash('secret'), 'secret')
+
+def test_login_upgrades_outdated_hash(client, app, user):
+    with app.app_context():
+        u = User.query.filter_by(username=user).one()
+        u.password_hash = generate_password_hash('test123', method='pbkdf2:sha256:1000')
+        db.session.commit()
+
+    response = client.post('/login', data={'username': user, 'password': 'test123'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        u = User.query.filter_by(username=user).one()
+        db.session.refresh(u)
+        assert u.password_hash.startswith('scrypt:')
+
+def test_repeated_failures_are_throttled_before_hashing(client, app, user):
+    app.config['LOGIN_THROTTLE_ATTEMPTS'] = 3
+    for _ in range(3):
+        assert client.post('/login', data={'username': user, 'password': 'nope'}).status_code == 200
+
+    calls = []
+    state = app.extensions['password_hasher']
+    original = state.executor
+    state.executor = lambda: calls.append(1) or original()
+
+    response = client.post('/login', data={'username': user, 'password': 'test123'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert calls == []
@@ -0,0 +1,31 @@
+# tests/unit/test_precompress.py
+import gzip
+import os
+import brotli
+from app.compression import precompress_file, precompress_tree
+
+def test_siblings_are_written_once_and_decode_to_the_file(tmp_path):
+    path = tmp_path / 'index-abc12345.js'
+    data = b'export const palette = ["switcher", "router", "camera"];\n' * 200
+    path.write_bytes(data)
+    written = precompress_file(str(path))
+    assert sorted(written) == [f'{path}.br', f'{path}.gz']
+    assert brotli.decompress((tmp_path / 'index-abc12345.js.br').read_bytes()) == data
+    assert gzip.decompress((tmp_path / 'index-abc12345.js.gz').read_bytes()) == data
+    assert precompress_file(str(path)) == []  # up to date
+
+    # Rebuilt in place: stale siblings are replaced
+    path.write_bytes(data * 2)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert len(precompress_file(str(path))) == 2
+    assert gzip.decompress((tmp_path / 'index-abc12345.js.gz').read_bytes()) == data * 2
+
+def test_only_compressible_files_worth_it_get_siblings(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'assets' / 'logo-1a2b3c4d.png').write_bytes(os.urandom(4096))
+    (tmp_path / 'assets' / 'tiny-1a2b3c4d.css').write_bytes(b'a{}')
+    (tmp_path / 'assets' / 'noise-1a2b3c4d.js').write_bytes(os.urandom(4096).hex().encode()[:1])
+    (tmp_path / 'index.html').write_text('<div id="root"></div>' * 100)
+    written = precompress_tree(str(tmp_path), min_bytes=64)
+    assert sorted(os.path.relpath(p, tmp_path) for p in written) == ['index.html.br', 'index.html.gz']
+    assert precompress_tree(str(tmp_path), min_bytes=64) == []
@@ -0,0 +1,47 @@
+# tests/unit/test_push.py
+import json
+from app.push import Subscriber, coalesce, format_event
+
+def move(node, x, version):
+    return {'op': 'move_node', 'node': node, 'position': {'x': x, 'y': 0}, 'version': version}
+
+def test_coalesce_keeps_the_last_move_of_each_node():
+    changes = [move('a', 1, 2), move('b', 1, 2), move('a', 2, 3), move('a', 3, 4)]
+    assert coalesce(changes) == [move('b', 1, 2), move('a', 3, 4)]
+
+def test_coalesce_keeps_moves_around_other_ops_on_the_node():
+    remove = {'op': 'remove_node', 'node': 'a', 'version': 3}
+    add = {'op': 'add_node', 'node': {'id': 'a'}, 'version': 4}
+    changes = [move('a', 1, 2), remove, add, move('a', 2, 5), move('a', 3, 6)]
+    assert coalesce(changes) == [move('a', 1, 2), remove, add, move('a', 3, 6)]
+
+def test_coalesce_starts_at_the_last_replace():
+    replace = {'op': 'replace', 'version': 3}
+    assert coalesce([move('a', 1, 2), replace, move('b', 1, 4)]) == [replace, move('b', 1, 4)]
+
+def test_subscriber_skips_ops_it_already_has():
+    subscriber = Subscriber(1, 3, max_frames=4)
+    assert subscriber.offer(2, 4, [move('a', 1, 3), move('b', 1, 4)]) == 'changes'
+    assert subscriber.offer(3, 4, [move('b', 1, 4)]) is None
+    assert subscriber.get(0) == ('changes', 4, [move('b', 1, 4)])
+    assert subscriber.get(0) is None
+
+def test_subscriber_resyncs_after_a_gap():
+    subscriber = Subscriber(1, 3, max_frames=4)
+    assert subscriber.offer(5, 6, [move('a', 1, 6)]) == 'resync'
+    assert subscriber.get(0) == ('resync', 6, None)
+
+def test_slow_subscriber_gets_one_resync_instead_of_a_backlog():
+    subscriber = Subscriber(1, 0, max_frames=2)
+    for version in range(1, 6):
+        subscriber.offer(version - 1, version, [move('a', version, version)])
+    assert subscriber.get(0) == ('resync', 5, None)
+    assert subscriber.get(0) is None
+    subscriber.offer(5, 6, [move('a', 6, 6)])
+    assert subscriber.get(0) == ('changes', 6, [move('a', 6, 6)])
+
+def test_format_event():
+    frame = format_event('changes', 4, [move('a', 1, 4)])
+    assert frame.startswith('id: 4\nevent: changes\ndata: ') and frame.endswith('\n\n')
+    assert json.loads(frame.split('data: ', 1)[1]) == {'version': 4, 'changes': [move('a', 1, 4)]}
+    assert format_event('resync', 7, None) == 'event: resync\ndata: {"version": 7}\n\n'
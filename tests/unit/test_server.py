@@ -0,0 +1,25 @@
+# tests/unit/test_server.py
+import pytest
+from app import db
+from app.server import after_fork, push_limits, worker_settings
+
+def test_thread_workers_are_sized_from_cpus():
+    assert worker_settings({}, 4) == {'worker_class': 'gthread', 'workers': 4, 'threads': 4}
+    assert worker_settings({'WEB_CONCURRENCY': '2', 'SERVER_THREADS': '8'}, 4) == \
+        {'worker_class': 'gthread', 'workers': 2, 'threads': 8}
+
+def test_greenlet_workers():
+    settings = worker_settings({'SERVER_WORKER_MODEL': 'gevent', 'SERVER_WORKER_CONNECTIONS': '50'}, 2)
+    assert settings == {'worker_class': 'gevent', 'workers': 2, 'worker_connections': 50}
+    with pytest.raises(ValueError):
+        worker_settings({'SERVER_WORKER_MODEL': 'sync'}, 2)
+
+def test_live_streams_leave_threads_for_requests():
+    assert push_limits({}) == (2, 60)
+    assert push_limits({'SERVER_THREADS': '1'}) == (0, 60)  # every client polls
+    assert push_limits({'SERVER_WORKER_MODEL': 'gevent', 'SERVER_WORKER_CONNECTIONS': '400'}) == (200, 300)
+
+def test_forked_workers_get_a_fresh_pool(app):
+    pool = db.engine.pool
+    after_fork(app)
+    assert db.engine.pool is not pool
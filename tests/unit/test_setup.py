@@ -1,4 +1,5 @@
 # tests/unit/test_setup.py
+import pytest
 from app import create_app, db
 from sqlalchemy import text 
 
@@ -16,6 +17,17 @@ def test_db_connection(app):
         assert result == 1
 
 
+def test_tables_live_in_the_worker_schema(app, test_config):
+    """Under pytest-xdist each worker must use its own tables, not public's."""
+    schema = test_config.get('TEST_SCHEMA')
+    if schema is None:
+        pytest.skip('not running under pytest-xdist')
+    for table in ('device_type', 'diagram', 'job'):
+        found = db.session.execute(text(
+            "SELECT relnamespace::regnamespace::text FROM pg_class WHERE oid = to_regclass(:t)"), {'t': table}).scalar()
+        assert found == schema, table
+
+
 def test_login_manager_configured(app):
     """Test that Flask-Login is initialized."""
     assert app.login_manager.login_view == 'auth.login'
@@ -0,0 +1,42 @@
+# tests/unit/test_thumbnails.py
+import hashlib
+import io
+import os
+import pytest
+from PIL import Image
+from app.thumbnails import SIZES, ThumbnailError, ThumbnailTooLarge, digest_dir, render, store_upload
+
+def png_bytes(width=300, height=200, color=(10, 31, 68)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def test_upload_is_stored_under_its_hash_once(tmp_path):
+    data = png_bytes()
+    digest, created = store_upload(str(tmp_path), io.BytesIO(data), 10**6, 10**6, chunk_size=1024)
+    assert created and digest == hashlib.sha256(data).hexdigest()
+    assert store_upload(str(tmp_path), io.BytesIO(data), 10**6, 10**6) == (digest, False)
+    assert [n for n in os.listdir(tmp_path) if n.startswith('.upload-')] == []
+
+def test_bad_uploads_leave_nothing_behind(tmp_path):
+    with pytest.raises(ThumbnailTooLarge):
+        store_upload(str(tmp_path), io.BytesIO(png_bytes()), 100, 10**6)
+    with pytest.raises(ThumbnailError):
+        store_upload(str(tmp_path), io.BytesIO(b'not an image' * 10), 10**6, 10**6)
+    with pytest.raises(ThumbnailError):
+        store_upload(str(tmp_path), io.BytesIO(png_bytes()), 10**6, 1000)
+    assert os.listdir(tmp_path) == []
+
+def test_truncated_images_are_rejected(tmp_path):
+    buffer = io.BytesIO()
+    Image.effect_noise((300, 200), 64).convert('RGB').save(buffer, 'JPEG')
+    with pytest.raises(ThumbnailError):
+        store_upload(str(tmp_path), io.BytesIO(buffer.getvalue()[:-2000]), 10**6, 10**6)
+    assert os.listdir(tmp_path) == []
+
+def test_render_writes_each_size_once(tmp_path):
+    digest, _ = store_upload(str(tmp_path), io.BytesIO(png_bytes()), 10**6, 10**6)
+    assert sorted(render(str(tmp_path), digest)) == sorted(SIZES)
+    assert render(str(tmp_path), digest) == []
+    with Image.open(os.path.join(digest_dir(str(tmp_path), digest), 'canvas.webp')) as image:
+        assert image.format == 'WEBP' and image.size == (128, 85)
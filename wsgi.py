@@ -0,0 +1,5 @@
+# wsgi.py
+"""WSGI entry point for production servers (see gunicorn.conf.py)."""
+from app import create_app
+
+app = create_app()